@@ -1,12 +1,22 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import hashlib
-from datetime import datetime
+import hmac
+import os
+import threading
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 import db_manager
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
-from tkcalendar import DateEntry
+import cliente_api
+from executor_db import ExecutorDB
+from cache_lru import CacheLRU
+import relatorios
+
+# matplotlib e tkcalendar são pesados de importar e não são precisos para mostrar o
+# ecrã de login: são carregados na primeira vez que um gráfico ou filtro de datas é
+# necessário (ver importar_graficos / importar_calendario).
 
 # =================================================================
 # 1. CONFIGURAÇÕES DE ESTILO E VARIÁVEIS GLOBAIS
@@ -16,60 +26,219 @@ COR_PRINCIPAL = "#1e1e2f"
 COR_SECUNDARIA = "#2e2e3f"
 COR_BOTAO = "#00b894"
 COR_TEXTO = "#ffffff"
+CORES_GRAFICOS = {'fundo': COR_PRINCIPAL, 'eixos': COR_SECUNDARIA, 'texto': COR_TEXTO, 'barras': COR_BOTAO}
 FONTE = ("Segoe UI", 12)
 FONTE_TITULO = ("Segoe UI", 20, "bold")
 FONTE_SALDO = ("Segoe UI", 16, "bold")
+TAMANHO_PAGINA_HISTORICO = 200
+MAX_PAGINAS_HISTORICO = 5  # páginas mantidas no Treeview do histórico; as mais afastadas são descartadas
+IID_SEM_RESULTADOS = "sem_resultados"  # iid da linha "Sem resultados" do histórico (os das transações são números)
+CATEGORIAS = ["Alimentação", "Transporte", "Moradia", "Lazer", "Saúde", "Educação", "Compras", "Outros"]
+# Opções dos filtros do histórico -> argumentos de db_manager.pesquisar_transacoes.
+TIPOS_HISTORICO = {"Todos": None, "Depósitos": 'deposito', "Saques": 'saque'}
+ORDENS_HISTORICO = {"Mais recentes": 'data_desc', "Mais antigas": 'data_asc', "Maior valor": 'valor_desc', "Menor valor": 'valor_asc'}
+TOP_CATEGORIAS_DASHBOARD = 5
+TIPOS_RECORRENCIA = {"Depósito": 'deposito', "Saque": 'saque'}
+FREQUENCIAS_RECORRENCIA = {"Mensal": 'mensal', "Semanal": 'semanal'}
+PERIODOS_FLUXO_CAIXA = {"12 meses": 12, "3 anos": 36, "5 anos": 60, "10 anos": 120}
+DIAS_SEMANA = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+TAMANHO_CACHE_GRAFICOS = 8  # cada entrada guarda a imagem do gráfico (~2 MB a 900x600)
+
+# Importa matplotlib/tkcalendar numa thread de fundo logo após o login, para que o
+# primeiro gráfico ou filtro de datas abra sem espera. Desative com FM_PREAQUECER=0.
+PREAQUECER_IMPORTS = os.environ.get("FM_PREAQUECER", "1") != "0"
+# FM_INSTRUMENTAR=1 mede cada função do db_manager (ver instrumentacao.py); as
+# estatísticas são gravadas em FICHEIRO_ESTATISTICAS_DB ao fechar a aplicação.
+INSTRUMENTAR_DB = os.environ.get("FM_INSTRUMENTAR", "0") == "1"
+FICHEIRO_ESTATISTICAS_DB = "estatisticas_db.json"
+# FM_SERVIDOR=<endereço> (ex.: http://127.0.0.1:8765 ou unix:/tmp/fm.sock) faz a aplicação
+# usar o servidor.py nesse endereço, partilhado por vários clientes, em vez de abrir a base
+# de dados diretamente. `banco` é o cliente ou o próprio db_manager, com as mesmas funções.
+SERVIDOR_API = os.environ.get("FM_SERVIDOR")
 
 usuario_logado = None
+executor = None  # ExecutorDB criado junto com a janela principal
+widgets_dashboard = {}  # widgets do dashboard, criados uma vez em construir_dashboard()
+cache_graficos = CacheLRU(TAMANHO_CACHE_GRAFICOS)  # imagens do relatório por categoria já desenhadas
+erro_em_exibicao = []  # erro mostrado por falha_pedido neste momento
+alertas_mostrados = set()  # alertas de orçamento já avisados nesta sessão (ainda por marcar, ou marcados)
 
 # =================================================================
 # 2. DEFINIÇÃO DE TODAS AS FUNÇÕES
 # =================================================================
 
+# --- Importações Preguiçosas ---
+
+_modulos_carregados = {}
+
+def importar_graficos():
+    """Devolve (Figure, FigureCanvasTkAgg), importando o matplotlib apenas na primeira chamada."""
+    if 'graficos' not in _modulos_carregados:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        _modulos_carregados['graficos'] = (Figure, FigureCanvasTkAgg)
+    return _modulos_carregados['graficos']
+
+def importar_calendario():
+    """Devolve a classe DateEntry, importando o tkcalendar apenas na primeira chamada."""
+    if 'calendario' not in _modulos_carregados:
+        from tkcalendar import DateEntry
+        _modulos_carregados['calendario'] = DateEntry
+    return _modulos_carregados['calendario']
+
+def importar_fluxo_caixa():
+    """Devolve o módulo fluxo_caixa, importando-o (e ao NumPy) apenas na primeira chamada."""
+    if 'fluxo_caixa' not in _modulos_carregados:
+        import fluxo_caixa
+        _modulos_carregados['fluxo_caixa'] = fluxo_caixa
+    return _modulos_carregados['fluxo_caixa']
+
+def preaquecer_imports():
+    """Carrega os módulos pesados em segundo plano; só importa, não toca em widgets Tk."""
+    try:
+        importar_graficos()
+        importar_calendario()
+    except ImportError as e:
+        print(f"Pré-carregamento de módulos falhou: {e}")
+
 # --- Funções de Autenticação e Sessão ---
 
 def hash_senha(senha):
     return hashlib.sha256(senha.encode('utf-8')).hexdigest()
 
+def ler_valor(texto):
+    """Converte o texto de um campo de valor ('12,50') num Decimal exato; ValueError se for inválido."""
+    try:
+        valor = Decimal(texto.strip().replace(",", "."))
+    except InvalidOperation:
+        raise ValueError(f"valor inválido: {texto!r}") from None
+    if not valor.is_finite():
+        raise ValueError(f"valor inválido: {texto!r}")
+    return valor
+
+def formatar_reais(valor):
+    """'R$ 1.234,56'."""
+    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+def indicar_ocupado(janela_alvo, ocupado, botoes=()):
+    """Mostra o cursor de espera e bloqueia os botões enquanto um pedido à base de dados decorre."""
+    try:
+        janela_alvo.config(cursor="watch" if ocupado else "")
+        for botao in botoes:
+            botao.state(['disabled'] if ocupado else ['!disabled'])
+    except tk.TclError:
+        pass  # a janela foi fechada entretanto
+
+def falha_pedido(janela_alvo=None, botoes=(), mensagem="Não foi possível concluir o pedido.", depois=None):
+    """Callback ao_falhar para o executor: desbloqueia a janela, chama depois() e mostra o erro.
+
+    Com FM_SERVIDOR, as funções do `banco` lançam exceções quando o servidor não responde
+    (ligação recusada, tempo esgotado, ErroAPI); sem este callback, a janela ficaria ocupada.
+    """
+    def falhou(erro):
+        indicar_ocupado(janela if janela_alvo is None else janela_alvo, False, botoes)
+        if depois is not None:
+            depois()
+        if erro_em_exibicao:
+            return  # um só aviso quando vários pedidos falham ao mesmo tempo (ex.: servidor em baixo)
+        erro_em_exibicao.append(erro)
+        try:
+            pai = janela_alvo if janela_alvo is not None and janela_alvo.winfo_exists() else janela
+            messagebox.showerror("Erro", f"{mensagem}\n\n{erro}", parent=pai)
+        except tk.TclError:
+            pass
+        finally:
+            erro_em_exibicao.clear()
+    return falhou
+
+def _cadastrar(email, senha_hashed):
+    """Corre na thread de trabalho: verifica o email e cria o utilizador."""
+    if SERVIDOR_API:
+        return banco.cadastrar_usuario(email, senha_hashed)
+    if banco.buscar_usuario_por_email(email):
+        return 'existente'
+    return 'criado' if banco.adicionar_usuario(email, senha_hashed) else 'erro'
+
 def cadastrar_usuario():
     email = entry_email_cadastro.get().strip()
     senha = entry_senha_cadastro.get().strip()
     if not email or not senha:
         messagebox.showerror("Erro", "Preencha todos os campos.")
         return
-    if db_manager.buscar_usuario_por_email(email):
-        messagebox.showwarning("Erro", "Este email já está cadastrado.")
-        return
-    senha_hashed = hash_senha(senha)
-    if db_manager.adicionar_usuario(email, senha_hashed):
-        messagebox.showinfo("Sucesso", "Cadastro realizado com sucesso! Faça o login.")
-        mostrar_frame(frame_login)
-    else:
-        messagebox.showerror("Erro de Banco de Dados", "Não foi possível realizar o cadastro.")
+
+    def concluido(resultado):
+        indicar_ocupado(janela, False, [botao_cadastrar])
+        if resultado == 'existente':
+            messagebox.showwarning("Erro", "Este email já está cadastrado.")
+        elif resultado == 'criado':
+            messagebox.showinfo("Sucesso", "Cadastro realizado com sucesso! Faça o login.")
+            mostrar_frame(frame_login)
+        else:
+            messagebox.showerror("Erro de Banco de Dados", "Não foi possível realizar o cadastro.")
+
+    indicar_ocupado(janela, True, [botao_cadastrar])
+    executor.submeter(_cadastrar, email, hash_senha(senha), ao_concluir=concluido,
+                      ao_falhar=falha_pedido(janela, [botao_cadastrar], "Não foi possível realizar o cadastro."))
+
+def _autenticar(email, senha_hashed):
+    """Corre na thread de trabalho: {'id', 'email'} do utilizador se a senha confere, senão None.
+
+    Com servidor, a senha é conferida lá e o cliente fica com a sessão.
+    """
+    if SERVIDOR_API:
+        return banco.iniciar_sessao(email, senha_hashed)
+    user = banco.buscar_usuario_por_email(email)
+    if user and hmac.compare_digest(user['senha_hash'], senha_hashed):
+        return {'id': user['id'], 'email': user['email']}
+    return None
 
 def fazer_login():
-    global usuario_logado
     email = entry_email_login.get().strip()
     senha = entry_senha_login.get().strip()
     if not email or not senha:
         messagebox.showerror("Erro de Login", "Preencha todos os campos.")
         return
     senha_hashed = hash_senha(senha)
-    user = db_manager.buscar_usuario_por_email(email)
-    if user and user['senha_hash'] == senha_hashed:
-        usuario_logado = user
-        iniciar_sessao_app()
-    else:
-        messagebox.showerror("Erro de Login", "Email ou senha incorretos.")
+
+    def concluido(user):
+        global usuario_logado
+        indicar_ocupado(janela, False, [botao_entrar])
+        if user:
+            usuario_logado = user
+            iniciar_sessao_app()
+        else:
+            messagebox.showerror("Erro de Login", "Email ou senha incorretos.")
+
+    indicar_ocupado(janela, True, [botao_entrar])
+    executor.submeter(_autenticar, email, senha_hashed, ao_concluir=concluido,
+                      ao_falhar=falha_pedido(janela, [botao_entrar], "Não foi possível fazer o login."))
 
 def iniciar_sessao_app():
     label_bem_vindo.config(text=f"Bem-vindo(a), {usuario_logado['email']}")
     preencher_dashboard()
+    # Lança as transações recorrentes vencidas desde a última sessão e, se houver, atualiza o dashboard.
+    executor.submeter(banco.materializar_transacoes_recorrentes, usuario_logado['id'], ao_concluir=recorrentes_lancadas,
+                      ao_falhar=falha_pedido(mensagem="Não foi possível lançar as transações recorrentes."))
+    # Mantém os checkpoints de saldo em dia para o saldo corrido do histórico.
+    executor.submeter(banco.atualizar_checkpoints_saldo, usuario_logado['id'],
+                      ao_falhar=falha_pedido(mensagem="Não foi possível atualizar os checkpoints de saldo."))
     mostrar_frame(frame_principal)
+    if PREAQUECER_IMPORTS and len(_modulos_carregados) < 2:
+        threading.Thread(target=preaquecer_imports, daemon=True).start()
+
+def recorrentes_lancadas(resultado):
+    if resultado['sucesso'] and resultado['inseridas'] and usuario_logado:
+        preencher_dashboard()
 
 def fazer_logout():
     global usuario_logado
+    executor.cancelar('dashboard')
+    cache_graficos.limpar()
+    alertas_mostrados.clear()
     usuario_logado = None
+    if SERVIDOR_API:
+        executor.submeter(banco.encerrar_sessao,
+                          ao_falhar=falha_pedido(mensagem="Não foi possível terminar a sessão no servidor."))
     entry_email_login.delete(0, tk.END)
     entry_senha_login.delete(0, tk.END)
     mostrar_frame(frame_login)
@@ -89,20 +258,30 @@ def abrir_janela_transacao():
     entrada_valor_trans.pack(pady=5, ipady=5)
 
     tk.Label(janela_trans, text="Categoria (para saques)", font=FONTE, fg=COR_TEXTO, bg=COR_PRINCIPAL).pack(pady=(15, 5))
-    categorias = ["Alimentação", "Transporte", "Moradia", "Lazer", "Saúde", "Educação", "Compras", "Outros"]
-    combo_categorias_trans = ttk.Combobox(janela_trans, values=categorias, font=FONTE, justify="center", state="readonly")
+    combo_categorias_trans = ttk.Combobox(janela_trans, values=CATEGORIAS, font=FONTE, justify="center", state="readonly")
     combo_categorias_trans.pack(pady=5, ipady=3)
 
+    def registrar(tipo, valor, categoria, mensagem_sucesso):
+        def concluido(sucesso):
+            indicar_ocupado(janela_trans, False, botoes_trans)
+            if sucesso:
+                messagebox.showinfo("Sucesso", mensagem_sucesso, parent=janela_trans)
+                preencher_dashboard()
+                janela_trans.destroy()
+            else:
+                messagebox.showerror("Erro", "Não foi possível registar a transação.", parent=janela_trans)
+
+        indicar_ocupado(janela_trans, True, botoes_trans)
+        executor.submeter(banco.registrar_transacao, usuario_logado['id'], tipo, valor, categoria, ao_concluir=concluido,
+                          ao_falhar=falha_pedido(janela_trans, botoes_trans, "Não foi possível registar a transação."))
+
     def executar_deposito():
         try:
-            valor = float(entrada_valor_trans.get().replace(",", "."))
+            valor = ler_valor(entrada_valor_trans.get())
             if valor <= 0:
                 messagebox.showerror("Erro", "O valor deve ser positivo.", parent=janela_trans)
                 return
-            if db_manager.registrar_transacao(usuario_logado['id'], 'deposito', valor):
-                messagebox.showinfo("Sucesso", "Depósito realizado!", parent=janela_trans)
-                preencher_dashboard()
-                janela_trans.destroy()
+            registrar('deposito', valor, None, "Depósito realizado!")
         except ValueError:
             messagebox.showerror("Erro", "Valor inválido.", parent=janela_trans)
 
@@ -112,21 +291,20 @@ def abrir_janela_transacao():
             messagebox.showwarning("Atenção", "Selecione uma categoria.", parent=janela_trans)
             return
         try:
-            valor = float(entrada_valor_trans.get().replace(",", "."))
+            valor = ler_valor(entrada_valor_trans.get())
             if valor <= 0:
                 messagebox.showerror("Erro", "O valor deve ser positivo.", parent=janela_trans)
                 return
-            if db_manager.registrar_transacao(usuario_logado['id'], 'saque', valor, categoria):
-                messagebox.showinfo("Sucesso", "Saque realizado!", parent=janela_trans)
-                preencher_dashboard()
-                janela_trans.destroy()
+            registrar('saque', valor, categoria, "Saque realizado!")
         except ValueError:
             messagebox.showerror("Erro", "Valor inválido.", parent=janela_trans)
 
     frame_botoes_trans = tk.Frame(janela_trans, bg=COR_PRINCIPAL)
     frame_botoes_trans.pack(pady=30)
-    ttk.Button(frame_botoes_trans, text="Depositar", command=executar_deposito).grid(row=0, column=0, padx=10)
-    ttk.Button(frame_botoes_trans, text="Sacar", command=executar_saque).grid(row=0, column=1, padx=10)
+    botoes_trans = [ttk.Button(frame_botoes_trans, text="Depositar", command=executar_deposito),
+                    ttk.Button(frame_botoes_trans, text="Sacar", command=executar_saque)]
+    botoes_trans[0].grid(row=0, column=0, padx=10)
+    botoes_trans[1].grid(row=0, column=1, padx=10)
 
 def abrir_janela_transferencia():
     janela_transf = tk.Toplevel(janela)
@@ -148,28 +326,39 @@ def abrir_janela_transferencia():
     def executar_transferencia():
         email_destinatario = entry_email.get().strip()
         try:
-            valor = float(entry_valor.get().strip().replace(",", "."))
+            valor = ler_valor(entry_valor.get())
             if not email_destinatario or valor <= 0:
                 messagebox.showwarning("Dados Inválidos", "Preencha o email e um valor positivo.", parent=janela_transf)
                 return
             if messagebox.askyesno("Confirmar", f"Deseja transferir R$ {valor:,.2f} para {email_destinatario}?", parent=janela_transf):
-                resultado = db_manager.registrar_transferencia(usuario_logado['id'], email_destinatario, valor)
-                if resultado['sucesso']:
-                    messagebox.showinfo("Sucesso", resultado['mensagem'], parent=janela_transf)
-                    preencher_dashboard()
-                    janela_transf.destroy()
-                else:
-                    messagebox.showerror("Erro", resultado['mensagem'], parent=janela_transf)
+                indicar_ocupado(janela_transf, True, [botao_confirmar])
+                executor.submeter(banco.registrar_transferencia, usuario_logado['id'], email_destinatario, valor, ao_concluir=concluido,
+                                  ao_falhar=falha_pedido(janela_transf, [botao_confirmar], "Não foi possível fazer a transferência."))
         except ValueError:
             messagebox.showerror("Erro de Valor", "Por favor, insira um valor numérico válido.", parent=janela_transf)
 
-    ttk.Button(janela_transf, text="Confirmar Transferência", command=executar_transferencia).pack(pady=30)
+    def concluido(resultado):
+        indicar_ocupado(janela_transf, False, [botao_confirmar])
+        if resultado['sucesso']:
+            messagebox.showinfo("Sucesso", resultado['mensagem'], parent=janela_transf)
+            preencher_dashboard()
+            janela_transf.destroy()
+        else:
+            messagebox.showerror("Erro", resultado['mensagem'], parent=janela_transf)
+
+    botao_confirmar = ttk.Button(janela_transf, text="Confirmar Transferência", command=executar_transferencia)
+    botao_confirmar.pack(pady=30)
 
 def abrir_janela_edicao(transacao_id, callback_atualizacao):
-    transacao = db_manager.obter_transacao_por_id(transacao_id)
+    executor.submeter(banco.obter_transacao_por_id, transacao_id, usuario_logado['id'],
+                      ao_concluir=lambda transacao: construir_janela_edicao(transacao, callback_atualizacao),
+                      ao_falhar=falha_pedido(mensagem="Não foi possível encontrar a transação."))
+
+def construir_janela_edicao(transacao, callback_atualizacao):
     if not transacao:
         messagebox.showerror("Erro", "Não foi possível encontrar a transação.")
         return
+    transacao_id = transacao['id']
 
     janela_edit = tk.Toplevel(janela)
     janela_edit.title("Editar Transação")
@@ -184,41 +373,49 @@ def abrir_janela_edicao(transacao_id, callback_atualizacao):
     entry_valor_edit.insert(0, f"{transacao['valor']:.2f}".replace(".", ","))
 
     tk.Label(janela_edit, text="Categoria", font=FONTE, fg=COR_TEXTO, bg=COR_PRINCIPAL).pack(pady=(15, 5))
-    categorias = ["Alimentação", "Transporte", "Moradia", "Lazer", "Saúde", "Educação", "Compras", "Outros"]
-    combo_categorias_edit = ttk.Combobox(janela_edit, values=categorias, font=FONTE, justify="center", state="readonly")
+    combo_categorias_edit = ttk.Combobox(janela_edit, values=CATEGORIAS, font=FONTE, justify="center", state="readonly")
     combo_categorias_edit.pack(pady=5, ipady=3)
-    if transacao['categoria'] in categorias:
+    if transacao['categoria'] in CATEGORIAS:
         combo_categorias_edit.set(transacao['categoria'])
 
     def salvar_edicao():
+        nonlocal novo_valor, nova_categoria
         try:
-            novo_valor = float(entry_valor_edit.get().replace(",", "."))
+            novo_valor = ler_valor(entry_valor_edit.get())
             nova_categoria = combo_categorias_edit.get()
             if novo_valor <= 0 or not nova_categoria:
                 messagebox.showwarning("Dados Inválidos", "Preencha todos os campos com valores válidos.", parent=janela_edit)
                 return
 
-            resultado = db_manager.editar_transacao(transacao_id, usuario_logado['id'], novo_valor, nova_categoria)
-            if resultado['sucesso']:
-                messagebox.showinfo("Sucesso", "Transação atualizada com sucesso.", parent=janela_edit)
-                preencher_dashboard()
-                callback_atualizacao()
-                janela_edit.destroy()
-            else:
-                messagebox.showerror("Erro", "Não foi possível atualizar a transação.", parent=janela_edit)
+            indicar_ocupado(janela_edit, True, [botao_salvar])
+            executor.submeter(banco.editar_transacao, transacao_id, usuario_logado['id'], novo_valor, nova_categoria, ao_concluir=concluido,
+                              ao_falhar=falha_pedido(janela_edit, [botao_salvar], "Não foi possível atualizar a transação."))
         except ValueError:
             messagebox.showerror("Erro", "Valor inválido.", parent=janela_edit)
 
-    ttk.Button(janela_edit, text="Salvar Alterações", command=salvar_edicao).pack(pady=30)
+    def concluido(resultado):
+        indicar_ocupado(janela_edit, False, [botao_salvar])
+        if resultado['sucesso']:
+            messagebox.showinfo("Sucesso", "Transação atualizada com sucesso.", parent=janela_edit)
+            preencher_dashboard()
+            callback_atualizacao(novo_valor, nova_categoria)
+            janela_edit.destroy()
+        else:
+            messagebox.showerror("Erro", "Não foi possível atualizar a transação.", parent=janela_edit)
+
+    novo_valor, nova_categoria = None, None
+    botao_salvar = ttk.Button(janela_edit, text="Salvar Alterações", command=salvar_edicao)
+    botao_salvar.pack(pady=30)
 
 def mostrar_historico():
     janela_historico = tk.Toplevel(janela)
     janela_historico.title("Histórico de Transações")
-    janela_historico.geometry("800x600")
+    janela_historico.geometry("1000x650")
     janela_historico.configure(bg=COR_PRINCIPAL)
     janela_historico.transient(janela)
     janela_historico.grab_set()
 
+    DateEntry = importar_calendario()
     frame_filtros = tk.Frame(janela_historico, bg=COR_PRINCIPAL)
     frame_filtros.pack(pady=10, padx=20, fill='x')
 
@@ -232,6 +429,52 @@ def mostrar_historico():
     cal_fim.pack(side='left')
     cal_fim.set_date(None); cal_fim.delete(0, "end")
 
+    frame_pesquisa = tk.Frame(janela_historico, bg=COR_PRINCIPAL)
+    frame_pesquisa.pack(padx=20, fill='x')
+
+    tk.Label(frame_pesquisa, text="Tipo:", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE).pack(side='left', padx=(0, 5))
+    combo_tipo = ttk.Combobox(frame_pesquisa, values=list(TIPOS_HISTORICO), width=10, font=FONTE, state="readonly")
+    combo_tipo.pack(side='left')
+    combo_tipo.set("Todos")
+
+    # Escolha de várias categorias: um menu de caixas de seleção, preenchido com as
+    # categorias padrão e as que o utilizador já usou (por exemplo, as de transferências).
+    tk.Label(frame_pesquisa, text="Categorias:", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE).pack(side='left', padx=(20, 5))
+    botao_categorias = ttk.Menubutton(frame_pesquisa, text="Todas", width=14)
+    botao_categorias.pack(side='left')
+    menu_categorias = tk.Menu(botao_categorias, tearoff=0)
+    botao_categorias['menu'] = menu_categorias
+    categorias_marcadas = {}
+
+    def atualizar_texto_categorias():
+        marcadas = [nome for nome, variavel in categorias_marcadas.items() if variavel.get()]
+        botao_categorias.config(text="Todas" if not marcadas else marcadas[0] if len(marcadas) == 1 else f"{len(marcadas)} categorias")
+
+    def preencher_categorias(usadas):
+        for nome in sorted(set(CATEGORIAS) | set(usadas)):
+            if nome not in categorias_marcadas:
+                categorias_marcadas[nome] = tk.BooleanVar(janela_historico, value=False)
+        menu_categorias.delete(0, tk.END)
+        for nome, variavel in sorted(categorias_marcadas.items()):
+            menu_categorias.add_checkbutton(label=nome, variable=variavel, command=atualizar_texto_categorias)
+
+    preencher_categorias([])
+    chave_categorias = f"categorias{janela_historico}"
+    executor.submeter(banco.obter_categorias_usuario, usuario_logado['id'], ao_concluir=preencher_categorias, chave=chave_categorias,
+                      ao_falhar=falha_pedido(janela_historico, mensagem="Não foi possível obter as categorias."))
+
+    tk.Label(frame_pesquisa, text="Valor de:", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE).pack(side='left', padx=(20, 5))
+    entry_valor_min = ttk.Entry(frame_pesquisa, width=8, font=FONTE, justify="right")
+    entry_valor_min.pack(side='left')
+    tk.Label(frame_pesquisa, text="a", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE).pack(side='left', padx=5)
+    entry_valor_max = ttk.Entry(frame_pesquisa, width=8, font=FONTE, justify="right")
+    entry_valor_max.pack(side='left')
+
+    tk.Label(frame_pesquisa, text="Ordenar:", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE).pack(side='left', padx=(20, 5))
+    combo_ordem = ttk.Combobox(frame_pesquisa, values=list(ORDENS_HISTORICO), width=13, font=FONTE, state="readonly")
+    combo_ordem.pack(side='left')
+    combo_ordem.set("Mais recentes")
+
     style_tree = ttk.Style()
     style_tree.configure("Treeview", background=COR_SECUNDARIA, foreground=COR_TEXTO, rowheight=25, fieldbackground=COR_SECUNDARIA, font=FONTE)
     style_tree.map('Treeview', background=[('selected', COR_BOTAO)])
@@ -240,69 +483,537 @@ def mostrar_historico():
     frame_tabela = tk.Frame(janela_historico)
     frame_tabela.pack(expand=True, fill='both', padx=20, pady=10)
 
-    colunas = ('data', 'hora', 'tipo', 'categoria', 'valor')
-    tree = ttk.Treeview(frame_tabela, columns=colunas, show='headings', style="Treeview")
+    colunas = ('data', 'hora', 'tipo', 'categoria', 'valor', 'saldo')
+    tree = ttk.Treeview(frame_tabela, columns=colunas, show='headings', style="Treeview", selectmode='extended')
     
-    tree.heading('data', text='Data'); tree.heading('hora', text='Hora'); tree.heading('tipo', text='Tipo'); tree.heading('categoria', text='Categoria'); tree.heading('valor', text='Valor')
-    tree.column('data', anchor=tk.CENTER, width=100); tree.column('hora', anchor=tk.CENTER, width=100); tree.column('tipo', anchor=tk.CENTER, width=100); tree.column('categoria', anchor=tk.CENTER, width=120); tree.column('valor', anchor=tk.E, width=150)
+    tree.heading('data', text='Data'); tree.heading('hora', text='Hora'); tree.heading('tipo', text='Tipo'); tree.heading('categoria', text='Categoria'); tree.heading('valor', text='Valor'); tree.heading('saldo', text='Saldo')
+    tree.column('data', anchor=tk.CENTER, width=100); tree.column('hora', anchor=tk.CENTER, width=100); tree.column('tipo', anchor=tk.CENTER, width=100); tree.column('categoria', anchor=tk.CENTER, width=120); tree.column('valor', anchor=tk.E, width=150); tree.column('saldo', anchor=tk.E, width=150)
     tree.pack(side='left', expand=True, fill='both')
     
     scrollbar = ttk.Scrollbar(frame_tabela, orient='vertical', command=tree.yview)
-    tree.configure(yscrollcommand=scrollbar.set)
     scrollbar.pack(side='right', fill='y')
 
-    def atualizar_historico():
-        for i in tree.get_children(): tree.delete(i)
-        historico = db_manager.obter_historico(usuario_logado['id'], cal_inicio.get_date(), cal_fim.get_date())
-        if not historico:
-            tree.insert('', tk.END, values=("", "Sem resultados", "", "", ""))
+    # O histórico é carregado por páginas: a primeira ao abrir/filtrar e as seguintes
+    # apenas quando a barra de deslocamento se aproxima do fim das linhas já carregadas.
+    # Os pedidos partilham uma chave, pelo que mudar o filtro descarta a página pendente.
+    # Cada linha tem como iid o id da transação; `linhas` guarda a transação mostrada,
+    # para que exclusões e edições atualizem só as linhas afetadas, sem recarregar.
+    # Só ficam carregadas MAX_PAGINAS_HISTORICO páginas: `paginas` guarda, por ordem, o
+    # cursor com que cada uma foi pedida e os seus iids. Ao passar o limite, descarta-se a
+    # página mais afastada; as de cima têm o cursor guardado em `acima` e voltam a ser
+    # pedidas com ele quando a barra se aproxima do topo. Descartar a última página faz
+    # de `cursor` o cursor com que ela tinha sido pedida.
+    estado = {'cursor': None, 'filtros': {}, 'total': None, 'carregando': False}
+    linhas = {}
+    paginas = deque()
+    acima = []
+    chave_pedidos = f"historico{janela_historico}"
+    def ao_fechar(evento):
+        if evento.widget is janela_historico:
+            executor.cancelar(chave_pedidos)
+            executor.cancelar(chave_categorias)
+    janela_historico.bind("<Destroy>", ao_fechar)
+
+    def carregar_pagina(para_cima=False):
+        estado['carregando'] = True
+        label_estado.config(text="A carregar…")
+        cursor = acima[-1] if para_cima else estado['cursor']
+        executor.submeter(banco.pesquisar_transacoes, usuario_logado['id'], apos=cursor, contar=not para_cima,
+                          limite=TAMANHO_PAGINA_HISTORICO, chave=chave_pedidos,
+                          ao_concluir=lambda pagina: mostrar_pagina(pagina, cursor, para_cima),
+                          ao_falhar=falha_pedido(janela_historico, mensagem="Não foi possível carregar o histórico.",
+                                                 depois=pagina_falhou), **estado['filtros'])
+
+    def pagina_falhou():
+        estado['carregando'] = False
+        mostrar_total()
+
+    def mostrar_pagina(pagina, cursor, para_cima):
+        estado['carregando'] = False
+        if pagina['total'] is not None:
+            estado['total'] = pagina['total']
+        mostrar_total()
+        if para_cima:
+            acima.pop()
+        else:
+            estado['cursor'] = pagina['cursor']
+        if not pagina['transacoes']:
+            if not linhas:
+                mostrar_sem_resultados()
             return
-        for transacao in historico:
+        if tree.exists(IID_SEM_RESULTADOS):  # ex.: todas as linhas carregadas foram excluídas e chegou outra página
+            tree.delete(IID_SEM_RESULTADOS)
+        primeiro_visivel = tree.yview()[0] * len(tree.get_children())
+        iids = []
+        for transacao in pagina['transacoes']:
+            iid = str(transacao['id'])
+            if tree.exists(iid):  # numa ordem por valor, uma linha editada pode voltar a aparecer
+                continue
+            linhas[iid] = transacao
+            iids.append(iid)
             partes_data = transacao["data"].split(" ")
-            valor_formatado = f"R$ {transacao['valor']:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
             tag_cor = 'deposito' if transacao["tipo"] == 'deposito' else 'saque'
-            tree.insert('', tk.END, text=transacao['id'], values=(partes_data[0], partes_data[1], transacao["tipo"].capitalize(), transacao.get("categoria") or "", valor_formatado), tags=(tag_cor,))
+            tree.insert('', len(iids) - 1 if para_cima else tk.END, iid=iid, text=transacao['id'], values=(partes_data[0], partes_data[1], transacao["tipo"].capitalize(), transacao.get("categoria") or "", formatar_reais(transacao['valor']), formatar_reais(transacao['saldo_apos'])), tags=(tag_cor,))
+        if para_cima:
+            paginas.appendleft((cursor, iids))
+            primeiro_visivel += len(iids)
+        else:
+            paginas.append((cursor, iids))
+        if len(paginas) > MAX_PAGINAS_HISTORICO:
+            primeiro_visivel -= descartar_pagina(do_topo=not para_cima)
+        # Mantém à vista as mesmas linhas depois de inserir ou descartar linhas acima delas.
+        tree.yview_moveto(max(primeiro_visivel, 0) / max(len(tree.get_children()), 1))
+
+    def descartar_pagina(do_topo):
+        """Tira do Treeview a página mais afastada; devolve quantas linhas saíram acima das visíveis."""
+        cursor, iids = paginas.popleft() if do_topo else paginas.pop()
+        if do_topo:
+            acima.append(cursor)
+        else:
+            estado['cursor'] = cursor
+        iids = [iid for iid in iids if iid in linhas]  # as excluídas entretanto já saíram
+        for iid in iids:
+            del linhas[iid]
+        if iids:
+            tree.delete(*iids)
+        return len(iids) if do_topo else 0
+
+    def mostrar_total():
+        label_estado.config(text=f"{estado['total']} transação(ões)" if estado['total'] is not None else "")
+
+    def mostrar_sem_resultados():
+        if not tree.exists(IID_SEM_RESULTADOS):
+            tree.insert('', tk.END, iid=IID_SEM_RESULTADOS, values=("", "Sem resultados", "", "", "", ""))
+
+    def remover_linhas(iids):
+        iids = [iid for iid in iids if iid in linhas]
+        for iid in iids:
+            del linhas[iid]
+        if iids:
+            tree.delete(*iids)
+            if estado['total'] is not None:
+                estado['total'] -= len(iids)
+                mostrar_total()
+            if not linhas:
+                mostrar_sem_resultados()
+
+    def deslocar_saldos(alteracoes):
+        """Aplica às linhas carregadas as variações de saldo (posicao, variacao) de transações excluídas ou editadas.
+
+        O saldo depois de cada linha muda pela soma das variações nas posições até à dela.
+        """
+        alteracoes = sorted(alteracoes)
+        posicoes, acumuladas = [], [0]
+        for posicao, variacao in alteracoes:
+            posicoes.append(posicao)
+            acumuladas.append(acumuladas[-1] + variacao)
+        for iid, transacao in linhas.items():
+            deslocamento = acumuladas[bisect_right(posicoes, transacao['posicao'])]
+            if deslocamento:
+                transacao['saldo_apos'] += deslocamento
+                tree.set(iid, 'saldo', formatar_reais(transacao['saldo_apos']))
+
+    def corresponde_filtros(transacao):
+        """Se a transação (depois de editada) ainda cumpre os filtros de categoria e de valor."""
+        filtros = estado['filtros']
+        if filtros.get('categorias') and transacao.get('categoria') not in filtros['categorias']:
+            return False
+        if filtros.get('valor_min') is not None and transacao['valor'] < filtros['valor_min']:
+            return False
+        return filtros.get('valor_max') is None or transacao['valor'] <= filtros['valor_max']
+
+    def ao_deslocar(primeiro, ultimo):
+        scrollbar.set(primeiro, ultimo)
+        if estado['carregando']:
+            return
+        if estado['cursor'] and float(ultimo) >= 0.9:
+            carregar_pagina()
+        elif acima and float(primeiro) <= 0.1:
+            carregar_pagina(para_cima=True)
+
+    tree.configure(yscrollcommand=ao_deslocar)
+
+    def atualizar_historico():
+        try:
+            valor_min = ler_valor(entry_valor_min.get()) if entry_valor_min.get().strip() else None
+            valor_max = ler_valor(entry_valor_max.get()) if entry_valor_max.get().strip() else None
+        except ValueError:
+            messagebox.showerror("Erro", "Valor inválido no filtro.", parent=janela_historico)
+            return
+        tree.delete(*tree.get_children())
+        linhas.clear()
+        paginas.clear()
+        acima.clear()
+        estado['cursor'] = None
+        estado['total'] = None
+        estado['filtros'] = {
+            'data_inicio': cal_inicio.get_date(), 'data_fim': cal_fim.get_date(),
+            'tipo': TIPOS_HISTORICO[combo_tipo.get()],
+            'categorias': [nome for nome, variavel in categorias_marcadas.items() if variavel.get()],
+            'valor_min': valor_min, 'valor_max': valor_max,
+            'ordem': ORDENS_HISTORICO[combo_ordem.get()],
+        }
+        carregar_pagina()
 
     tree.tag_configure('deposito', foreground='#2ecc71'); tree.tag_configure('saque', foreground='#e74c3c')
     
     def limpar_filtros():
         cal_inicio.set_date(None); cal_inicio.delete(0, "end")
         cal_fim.set_date(None); cal_fim.delete(0, "end")
+        combo_tipo.set("Todos"); combo_ordem.set("Mais recentes")
+        entry_valor_min.delete(0, "end"); entry_valor_max.delete(0, "end")
+        for variavel in categorias_marcadas.values():
+            variavel.set(False)
+        atualizar_texto_categorias()
         atualizar_historico()
 
     menu_contexto = tk.Menu(janela_historico, tearoff=0)
     def mostrar_menu(event):
         item_selecionado = tree.identify_row(event.y)
         if item_selecionado:
-            tree.selection_set(item_selecionado)
+            if item_selecionado not in tree.selection():  # mantém a seleção múltipla ao clicar numa das linhas
+                tree.selection_set(item_selecionado)
             menu_contexto.tk_popup(event.x_root, event.y_root)
 
-    def acao_excluir():
-        if not tree.selection(): return
-        item_selecionado = tree.selection()[0]
-        transacao_id = tree.item(item_selecionado, 'text')
-        if messagebox.askyesno("Confirmar Exclusão", "Tem certeza que deseja excluir esta transação?", parent=janela_historico):
-            if db_manager.excluir_transacao(transacao_id, usuario_logado['id']):
-                messagebox.showinfo("Sucesso", "Transação excluída.", parent=janela_historico)
-                atualizar_historico()
-                preencher_dashboard()
-            else:
-                messagebox.showerror("Erro", "Não foi possível excluir a transação.", parent=janela_historico)
+    def selecionadas():
+        """Ids das transações selecionadas (ignora a linha 'Sem resultados')."""
+        return [linhas[iid]['id'] for iid in tree.selection() if iid in linhas]
+
+    def acao_excluir(event=None):
+        ids = selecionadas()
+        if not ids: return
+        pergunta = "Tem certeza que deseja excluir esta transação?" if len(ids) == 1 else f"Tem certeza que deseja excluir estas {len(ids)} transações?"
+        if messagebox.askyesno("Confirmar Exclusão", pergunta, parent=janela_historico):
+            executor.submeter(banco.excluir_transacoes, ids, usuario_logado['id'], ao_concluir=exclusao_concluida,
+                              ao_falhar=falha_pedido(janela_historico, mensagem="Não foi possível excluir as transações."))
+
+    def exclusao_concluida(resultado):
+        if not resultado['sucesso'] or not resultado['removidas']:
+            messagebox.showerror("Erro", "Não foi possível excluir as transações.", parent=janela_historico)
+            return
+        remover_linhas([str(removida['id']) for removida in resultado['removidas']])
+        deslocar_saldos([(removida['posicao'], -removida['variacao']) for removida in resultado['removidas']])
+        preencher_dashboard()
+        quantidade = len(resultado['removidas'])
+        messagebox.showinfo("Sucesso", "Transação excluída." if quantidade == 1 else f"{quantidade} transações excluídas.", parent=janela_historico)
 
     def acao_editar():
-        if not tree.selection(): return
-        item_selecionado = tree.selection()[0]
-        transacao_id = tree.item(item_selecionado, 'text')
-        abrir_janela_edicao(transacao_id, atualizar_historico)
+        ids = selecionadas()
+        if len(ids) > 1:
+            acao_recategorizar()
+        elif ids:
+            abrir_janela_edicao(ids[0], lambda novo_valor, nova_categoria: edicao_concluida(str(ids[0]), novo_valor, nova_categoria))
+
+    def edicao_concluida(iid, novo_valor, nova_categoria):
+        transacao = linhas.get(iid)
+        if transacao is None:
+            return
+        sinal = 1 if transacao['tipo'] == 'deposito' else -1
+        deslocar_saldos([(transacao['posicao'], sinal * (novo_valor - transacao['valor']))])
+        transacao['valor'], transacao['categoria'] = novo_valor, nova_categoria
+        if corresponde_filtros(transacao):
+            tree.set(iid, 'valor', formatar_reais(novo_valor))
+            tree.set(iid, 'categoria', nova_categoria)
+        else:
+            remover_linhas([iid])
+
+    def acao_recategorizar():
+        ids = selecionadas()
+        if not ids: return
+        janela_categoria = tk.Toplevel(janela_historico)
+        janela_categoria.title("Alterar Categoria")
+        janela_categoria.geometry("400x200")
+        janela_categoria.configure(bg=COR_PRINCIPAL)
+        janela_categoria.transient(janela_historico)
+        janela_categoria.grab_set()
+
+        tk.Label(janela_categoria, text=f"Nova categoria para {len(ids)} transação(ões)", font=FONTE, fg=COR_TEXTO, bg=COR_PRINCIPAL).pack(pady=(20, 5))
+        combo_nova = ttk.Combobox(janela_categoria, values=CATEGORIAS, font=FONTE, justify="center", state="readonly")
+        combo_nova.pack(pady=5, ipady=3)
+
+        def confirmar():
+            nova_categoria = combo_nova.get()
+            if not nova_categoria:
+                messagebox.showwarning("Dados Inválidos", "Escolha uma categoria.", parent=janela_categoria)
+                return
+            indicar_ocupado(janela_categoria, True, [botao_confirmar])
+            executor.submeter(banco.recategorizar_transacoes, ids, usuario_logado['id'], nova_categoria,
+                              ao_concluir=lambda resultado: recategorizacao_concluida(resultado, nova_categoria),
+                              ao_falhar=falha_pedido(janela_categoria, [botao_confirmar], "Não foi possível alterar a categoria."))
+
+        def recategorizacao_concluida(resultado, nova_categoria):
+            indicar_ocupado(janela_categoria, False, [botao_confirmar])
+            if not resultado['sucesso']:
+                messagebox.showerror("Erro", "Não foi possível alterar a categoria.", parent=janela_categoria)
+                return
+            fora_do_filtro = []
+            for transacao_id in resultado['alteradas']:
+                iid = str(transacao_id)
+                if iid not in linhas:
+                    continue
+                linhas[iid]['categoria'] = nova_categoria
+                if corresponde_filtros(linhas[iid]):
+                    tree.set(iid, 'categoria', nova_categoria)
+                else:
+                    fora_do_filtro.append(iid)
+            remover_linhas(fora_do_filtro)
+            preencher_dashboard()
+            janela_categoria.destroy()
+
+        botao_confirmar = ttk.Button(janela_categoria, text="Confirmar", command=confirmar)
+        botao_confirmar.pack(pady=30)
 
     menu_contexto.add_command(label="✏️ Editar Transação", command=acao_editar)
-    menu_contexto.add_command(label="❌ Excluir Transação", command=acao_excluir)
+    menu_contexto.add_command(label="🏷️ Alterar Categoria", command=acao_recategorizar)
+    menu_contexto.add_command(label="❌ Excluir Transação(ões)", command=acao_excluir)
     tree.bind("<Button-3>", mostrar_menu)
+    tree.bind("<Delete>", acao_excluir)
         
     ttk.Button(frame_filtros, text="Filtrar", command=atualizar_historico).pack(side='left', padx=(20, 5))
     ttk.Button(frame_filtros, text="Limpar Filtro", command=limpar_filtros).pack(side='left', padx=5)
+    label_estado = tk.Label(frame_filtros, text="", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE)
+    label_estado.pack(side='left', padx=10)
     atualizar_historico()
 
+def abrir_janela_recorrentes():
+    janela_rec = tk.Toplevel(janela)
+    janela_rec.title("Transações Recorrentes")
+    janela_rec.geometry("900x500")
+    janela_rec.configure(bg=COR_PRINCIPAL)
+    janela_rec.transient(janela)
+    janela_rec.grab_set()
+
+    frame_nova = tk.Frame(janela_rec, bg=COR_PRINCIPAL)
+    frame_nova.pack(pady=10, padx=20, fill='x')
+    tk.Label(frame_nova, text="Tipo:", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE).pack(side='left', padx=(0, 5))
+    combo_tipo = ttk.Combobox(frame_nova, values=list(TIPOS_RECORRENCIA), width=9, font=FONTE, state="readonly")
+    combo_tipo.pack(side='left')
+    combo_tipo.set("Saque")
+    tk.Label(frame_nova, text="Valor:", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE).pack(side='left', padx=(15, 5))
+    entry_valor = ttk.Entry(frame_nova, width=9, font=FONTE, justify="right")
+    entry_valor.pack(side='left')
+    tk.Label(frame_nova, text="Categoria:", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE).pack(side='left', padx=(15, 5))
+    combo_categoria = ttk.Combobox(frame_nova, values=CATEGORIAS, width=11, font=FONTE, state="readonly")
+    combo_categoria.pack(side='left')
+    combo_frequencia = ttk.Combobox(frame_nova, values=list(FREQUENCIAS_RECORRENCIA), width=8, font=FONTE, state="readonly")
+    combo_frequencia.pack(side='left', padx=(15, 5))
+    combo_frequencia.set("Mensal")
+    tk.Label(frame_nova, text="Dia:", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE).pack(side='left', padx=(10, 5))
+    combo_dia = ttk.Combobox(frame_nova, width=9, font=FONTE, state="readonly")
+    combo_dia.pack(side='left')
+
+    def ao_mudar_frequencia(evento=None):
+        semanal = combo_frequencia.get() == "Semanal"
+        combo_dia.config(values=DIAS_SEMANA if semanal else [str(dia) for dia in range(1, 32)])
+        combo_dia.set(DIAS_SEMANA[0] if semanal else "1")
+    combo_frequencia.bind("<<ComboboxSelected>>", ao_mudar_frequencia)
+    ao_mudar_frequencia()
+
+    colunas = ('tipo', 'valor', 'categoria', 'frequencia', 'proxima', 'fim')
+    tree = ttk.Treeview(janela_rec, columns=colunas, show='headings', style="Treeview", selectmode='browse')
+    for coluna, titulo, ancora in (('tipo', 'Tipo', tk.CENTER), ('valor', 'Valor', tk.E), ('categoria', 'Categoria', tk.CENTER),
+                                   ('frequencia', 'Frequência', tk.CENTER), ('proxima', 'Próxima', tk.CENTER), ('fim', 'Até', tk.CENTER)):
+        tree.heading(coluna, text=titulo)
+        tree.column(coluna, anchor=ancora, width=130)
+    tree.tag_configure('deposito', foreground='#2ecc71'); tree.tag_configure('saque', foreground='#e74c3c')
+    tree.pack(expand=True, fill='both', padx=20, pady=10)
+
+    def descrever_frequencia(recorrente):
+        if recorrente['frequencia'] == 'semanal':
+            return f"Semanal ({DIAS_SEMANA[recorrente['dia']]})"
+        return f"Mensal (dia {recorrente['dia']})"
+
+    def data_curta(texto):
+        return f"{texto[8:10]}/{texto[5:7]}/{texto[:4]}" if texto else "—"
+
+    def mostrar_recorrentes(recorrentes):
+        tree.delete(*tree.get_children())
+        for r in recorrentes:
+            tree.insert('', 'end', iid=str(r['id']), tags=(r['tipo'],),
+                        values=(r['tipo'].capitalize(), formatar_reais(r['valor']), r['categoria'] or "—",
+                                descrever_frequencia(r), data_curta(r['proxima']), data_curta(r['data_fim'])))
+
+    def carregar():
+        executor.submeter(banco.obter_transacoes_recorrentes, usuario_logado['id'], ao_concluir=mostrar_recorrentes,
+                          chave=f"recorrentes{janela_rec}",
+                          ao_falhar=falha_pedido(janela_rec, mensagem="Não foi possível obter as transações recorrentes."))
+
+    def adicionar():
+        tipo = TIPOS_RECORRENCIA[combo_tipo.get()]
+        categoria = combo_categoria.get() or None
+        if tipo == 'saque' and not categoria:
+            messagebox.showwarning("Atenção", "Selecione uma categoria.", parent=janela_rec)
+            return
+        try:
+            valor = ler_valor(entry_valor.get())
+        except ValueError:
+            messagebox.showerror("Erro", "Valor inválido.", parent=janela_rec)
+            return
+        if valor <= 0:
+            messagebox.showerror("Erro", "O valor deve ser positivo.", parent=janela_rec)
+            return
+        frequencia = FREQUENCIAS_RECORRENCIA[combo_frequencia.get()]
+        dia = DIAS_SEMANA.index(combo_dia.get()) if frequencia == 'semanal' else int(combo_dia.get())
+        indicar_ocupado(janela_rec, True, botoes)
+        executor.submeter(banco.adicionar_transacao_recorrente, usuario_logado['id'], tipo, valor,
+                          categoria if tipo == 'saque' else None, frequencia, dia, ao_concluir=adicionada,
+                          ao_falhar=falha_pedido(janela_rec, botoes, "Não foi possível criar a transação recorrente."))
+
+    def adicionada(recorrente_id):
+        indicar_ocupado(janela_rec, False, botoes)
+        if recorrente_id is None:
+            messagebox.showerror("Erro", "Não foi possível criar a transação recorrente.", parent=janela_rec)
+            return
+        entry_valor.delete(0, tk.END)
+        lancar()  # a primeira ocorrência pode ser hoje
+
+    def excluir():
+        selecao = tree.selection()
+        if not selecao: return
+        if not messagebox.askyesno("Confirmar", "Excluir esta transação recorrente? As ocorrências já lançadas ficam no histórico.", parent=janela_rec):
+            return
+        executor.submeter(banco.excluir_transacao_recorrente, int(selecao[0]), usuario_logado['id'], ao_concluir=excluida,
+                          ao_falhar=falha_pedido(janela_rec, mensagem="Não foi possível excluir a transação recorrente."))
+
+    def excluida(sucesso):
+        if not sucesso:
+            messagebox.showerror("Erro", "Não foi possível excluir a transação recorrente.", parent=janela_rec)
+        carregar()
+
+    def lancar():
+        indicar_ocupado(janela_rec, True, botoes)
+        executor.submeter(banco.materializar_transacoes_recorrentes, usuario_logado['id'], ao_concluir=lancadas,
+                          ao_falhar=falha_pedido(janela_rec, botoes, "Não foi possível lançar as transações recorrentes."))
+
+    def lancadas(resultado):
+        indicar_ocupado(janela_rec, False, botoes)
+        if not resultado['sucesso']:
+            messagebox.showerror("Erro", "Não foi possível lançar as transações recorrentes.", parent=janela_rec)
+            return
+        if resultado['inseridas']:
+            preencher_dashboard()
+            messagebox.showinfo("Sucesso", f"{resultado['inseridas']} transação(ões) lançada(s).", parent=janela_rec)
+        carregar()
+
+    frame_botoes = tk.Frame(janela_rec, bg=COR_PRINCIPAL)
+    frame_botoes.pack(pady=(0, 15))
+    botoes = [ttk.Button(frame_botoes, text="Adicionar", command=adicionar),
+              ttk.Button(frame_botoes, text="Excluir", command=excluir),
+              ttk.Button(frame_botoes, text="Lançar Vencidas", command=lancar)]
+    for botao in botoes:
+        botao.pack(side='left', padx=10)
+    carregar()
+
+def _obter_fluxo_caixa(usuario_id, meses):
+    """Corre na thread de trabalho; com FM_SERVIDOR, as contas são feitas pelo servidor."""
+    if SERVIDOR_API:
+        return banco.obter_fluxo_caixa(usuario_id, meses=meses)
+    return importar_fluxo_caixa().obter_fluxo_caixa(usuario_id, meses=meses)
+
+def abrir_janela_fluxo_caixa():
+    janela_fluxo = tk.Toplevel(janela)
+    janela_fluxo.title("Fluxo de Caixa")
+    janela_fluxo.geometry("1000x780")
+    janela_fluxo.configure(bg=COR_PRINCIPAL)
+    janela_fluxo.transient(janela)
+    janela_fluxo.grab_set()
+
+    Figure, FigureCanvasTkAgg = importar_graficos()
+
+    frame_filtros = tk.Frame(janela_fluxo, bg=COR_PRINCIPAL)
+    frame_filtros.pack(pady=10, padx=20, fill='x')
+    tk.Label(frame_filtros, text="Período:", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE).pack(side='left', padx=(0, 5))
+    combo_periodo = ttk.Combobox(frame_filtros, values=list(PERIODOS_FLUXO_CAIXA), width=10, font=FONTE, state="readonly")
+    combo_periodo.pack(side='left')
+    combo_periodo.set("12 meses")
+    label_estado = tk.Label(frame_filtros, text="", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE)
+    label_estado.pack(side='left', padx=10)
+
+    label_medias = tk.Label(janela_fluxo, text="", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE)
+    label_medias.pack(padx=20, anchor='w')
+    label_previsao = tk.Label(janela_fluxo, text="", bg=COR_PRINCIPAL, fg="#00cec9", font=FONTE)
+    label_previsao.pack(padx=20, anchor='w')
+
+    fig = Figure(figsize=(9, 3.2), dpi=100, facecolor=COR_PRINCIPAL)
+    ax = fig.add_subplot(111)
+    fig.subplots_adjust(left=0.1, right=0.97, top=0.9, bottom=0.15)
+    canvas = FigureCanvasTkAgg(fig, master=janela_fluxo)
+    canvas.get_tk_widget().pack(fill='both', expand=True, padx=20, pady=5)
+
+    frame_tabelas = tk.Frame(janela_fluxo, bg=COR_PRINCIPAL)
+    frame_tabelas.pack(fill='both', expand=True, padx=20, pady=(5, 15))
+    colunas_meses = (('mes', 'Mês', 80), ('entradas', 'Entradas', 120), ('saidas', 'Saídas', 120),
+                     ('liquido', 'Líquido', 120), ('var_entradas', 'Δ Entradas', 90), ('var_saidas', 'Δ Saídas', 90))
+    tree_meses = ttk.Treeview(frame_tabelas, columns=[c[0] for c in colunas_meses], show='headings', height=7)
+    for coluna, titulo, largura in colunas_meses:
+        tree_meses.heading(coluna, text=titulo)
+        tree_meses.column(coluna, anchor=tk.E, width=largura)
+    tree_meses.pack(side='left', fill='both', expand=True)
+    colunas_volatilidade = (('categoria', 'Categoria', 110), ('media', 'Média/mês', 100), ('desvio', 'Desvio', 100), ('coeficiente', 'Variação', 70))
+    tree_volatilidade = ttk.Treeview(frame_tabelas, columns=[c[0] for c in colunas_volatilidade], show='headings', height=7)
+    for coluna, titulo, largura in colunas_volatilidade:
+        tree_volatilidade.heading(coluna, text=titulo)
+        tree_volatilidade.column(coluna, anchor=tk.E, width=largura)
+    tree_volatilidade.pack(side='left', fill='both', padx=(15, 0))
+
+    chave_pedidos = f"fluxo{janela_fluxo}"
+    janela_fluxo.bind("<Destroy>", lambda e: executor.cancelar(chave_pedidos) if e.widget is janela_fluxo else None)
+
+    def percentagem(variacao):
+        return "—" if variacao is None else f"{variacao:+.1f}%".replace(".", ",")
+
+    def desenhar(fluxo):
+        ax.clear()
+        ax.set_facecolor(COR_SECUNDARIA)
+        ax.tick_params(colors=COR_TEXTO)
+        for lado in ax.spines.values():
+            lado.set_color(COR_TEXTO)
+        ax.grid(color='gray', linestyle='--', linewidth=0.5, alpha=0.5)
+        ax.set_title("Saldo diário e previsão", color=COR_TEXTO)
+        inicio = datetime.fromisoformat(fluxo['inicio'])
+        dias = [inicio + timedelta(days=posicao) for posicao in range(len(fluxo['saldo']))]
+        previsao = fluxo['previsao']
+        dias_previsao = [dias[-1] + timedelta(days=posicao) for posicao in range(1, len(previsao['saldo']) + 1)]
+        ax.plot(dias, fluxo['saldo'], color=COR_BOTAO, linewidth=1.5)
+        ax.plot(dias_previsao, previsao['saldo'], color="#00cec9", linestyle='--', linewidth=1.5)
+        ax.fill_between(dias_previsao, [s - d for s, d in zip(previsao['saldo'], previsao['desvio'])],
+                        [s + d for s, d in zip(previsao['saldo'], previsao['desvio'])], color="#00cec9", alpha=0.2)
+        fig.autofmt_xdate()
+        canvas.draw()
+
+    def mostrar(fluxo):
+        label_estado.config(text="")
+        if fluxo is None:
+            messagebox.showerror("Erro", "Não foi possível calcular o fluxo de caixa.", parent=janela_fluxo)
+            return
+        medias = fluxo['medias']
+        label_medias.config(text="Média diária dos últimos 30 dias: "
+                                 f"entradas {formatar_reais(medias['entradas'])}, saídas {formatar_reais(medias['saidas'])}, "
+                                 f"líquido {formatar_reais(medias['liquido'])}")
+        previsao = fluxo['previsao']
+        label_previsao.config(text=f"Saldo previsto em {len(previsao['saldo'])} dias: {formatar_reais(previsao['saldo_final'])} "
+                                   f"(tendência de {formatar_reais(previsao['tendencia_diaria'])} por dia)")
+        desenhar(fluxo)
+        tree_meses.delete(*tree_meses.get_children())
+        for mes in reversed(fluxo['meses']):
+            tree_meses.insert('', 'end', values=(mes['mes'], formatar_reais(mes['entradas']), formatar_reais(mes['saidas']),
+                                                 formatar_reais(mes['liquido']), percentagem(mes['variacao_entradas']),
+                                                 percentagem(mes['variacao_saidas'])))
+        tree_volatilidade.delete(*tree_volatilidade.get_children())
+        for item in fluxo['volatilidade']:
+            tree_volatilidade.insert('', 'end', values=(item['categoria'], formatar_reais(item['media']),
+                                                        formatar_reais(item['desvio']), f"{item['coeficiente']:.0%}"))
+
+    def atualizar(evento=None):
+        label_estado.config(text="A calcular…")
+        executor.submeter(_obter_fluxo_caixa, usuario_logado['id'], PERIODOS_FLUXO_CAIXA[combo_periodo.get()],
+                          ao_concluir=mostrar, chave=chave_pedidos,
+                          ao_falhar=falha_pedido(janela_fluxo, mensagem="Não foi possível calcular o fluxo de caixa.",
+                                                 depois=lambda: label_estado.config(text="")))
+
+    combo_periodo.bind("<<ComboboxSelected>>", atualizar)
+    atualizar()
+
 def abrir_janela_relatorio():
     """Abre uma nova janela que exibe um gráfico de barras dos gastos por categoria com filtros de data."""
     janela_rel = tk.Toplevel(janela)
@@ -312,6 +1023,9 @@ def abrir_janela_relatorio():
     janela_rel.transient(janela)
     janela_rel.grab_set()
 
+    DateEntry = importar_calendario()
+    Figure, FigureCanvasTkAgg = importar_graficos()
+
     # --- Frame para os Filtros ---
     frame_filtros = tk.Frame(janela_rel, bg=COR_PRINCIPAL)
     frame_filtros.pack(pady=10, padx=20, fill='x')
@@ -333,43 +1047,46 @@ def abrir_janela_relatorio():
     fig = Figure(figsize=(8, 6), dpi=100, facecolor=COR_PRINCIPAL)
     canvas = FigureCanvasTkAgg(fig, master=frame_grafico)
     canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+    grafico = relatorios.GraficoCategorias(fig, CORES_GRAFICOS)
+
+    chave_pedidos = f"relatorio{janela_rel}"
+    janela_rel.bind("<Destroy>", lambda e: executor.cancelar(chave_pedidos) if e.widget is janela_rel else None)
 
     # --- Função para Atualizar o Gráfico ---
+    # Cada gráfico desenhado fica em cache_graficos, com a chave (utilizador, datas, versão
+    # dos dados, tamanho): voltar a um filtro já visto só repõe a imagem guardada. A versão
+    # é pedida na thread de trabalho (com FM_SERVIDOR, é um pedido ao servidor).
+    falhou = falha_pedido(janela_rel, mensagem="Não foi possível carregar o relatório.",
+                          depois=lambda: label_estado.config(text=""))
+
     def atualizar_grafico():
+        usuario_id = usuario_logado['id']
         data_inicio_val = cal_inicio.get_date()
         data_fim_val = cal_fim.get_date()
-        
-        dados_categorias = db_manager.obter_gastos_por_categoria(usuario_logado['id'], data_inicio_val, data_fim_val)
-        
-        fig.clear() # Limpa o gráfico anterior
-        ax = fig.add_subplot(111)
-        ax.set_facecolor(COR_SECUNDARIA)
+        label_estado.config(text="A carregar…")
+        executor.submeter(banco.versao_dados, usuario_id, chave=chave_pedidos, ao_falhar=falhou,
+                          ao_concluir=lambda versao: mostrar_grafico(
+                              (usuario_id, data_inicio_val, data_fim_val, versao, canvas.get_width_height())))
+
+    def mostrar_grafico(chave):
+        usuario_id, data_inicio_val, data_fim_val = chave[:3]
+        em_cache = cache_graficos.obter(chave)
+        if em_cache is not None:
+            dados_categorias, imagem = em_cache
+            grafico.atualizar(dados_categorias)  # para que um redesenho posterior (ex.: redimensionar) seja igual
+            canvas.restore_region(imagem)
+            canvas.blit(fig.bbox)
+            label_estado.config(text="")
+            return
+        executor.submeter(banco.obter_gastos_por_categoria, usuario_id, data_inicio_val, data_fim_val,
+                          ao_concluir=lambda dados: desenhar_grafico(chave, dados), chave=chave_pedidos, ao_falhar=falhou)
 
-        if not dados_categorias:
-            ax.text(0.5, 0.5, "Sem dados para o período selecionado.", color=COR_TEXTO, ha='center', va='center', fontsize=14)
-            ax.tick_params(axis='x', colors=COR_SECUNDARIA)
-            ax.tick_params(axis='y', colors=COR_SECUNDARIA)
-        else:
-            labels = [item['categoria'] for item in dados_categorias]
-            sizes = [item['total'] for item in dados_categorias]
-            labels.reverse(); sizes.reverse()
-
-            ax.tick_params(axis='x', colors=COR_TEXTO); ax.tick_params(axis='y', colors=COR_TEXTO)
-            ax.spines['bottom'].set_color(COR_TEXTO); ax.spines['top'].set_color(COR_SECUNDARIA)
-            ax.spines['right'].set_color(COR_SECUNDARIA); ax.spines['left'].set_color(COR_TEXTO)
-            
-            bars = ax.barh(labels, sizes, color=COR_BOTAO, height=0.6)
-            for bar in bars:
-                width = bar.get_width()
-                label_text = f" R$ {width:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-                ax.text(width, bar.get_y() + bar.get_height()/2.0, label_text, va='center', ha='left', color=COR_TEXTO, fontweight='bold')
-            
-            ax.set_xlabel('Valor Gasto (R$)', color=COR_TEXTO, fontsize=12)
-            ax.grid(axis='x', color='gray', linestyle='--', linewidth=0.5, alpha=0.5)
-
-        ax.set_title('Gastos Totais por Categoria', color=COR_TEXTO, fontsize=16, pad=20)
-        fig.tight_layout()
+    def desenhar_grafico(chave, dados_categorias):
+        label_estado.config(text="")
+        grafico.atualizar(dados_categorias)
         canvas.draw()
+        if chave[-1] == canvas.get_width_height():
+            cache_graficos.guardar(chave, (dados_categorias, canvas.copy_from_bbox(fig.bbox)))
 
     def limpar_filtros():
         cal_inicio.set_date(None); cal_inicio.delete(0, "end")
@@ -378,45 +1095,28 @@ def abrir_janela_relatorio():
 
     ttk.Button(frame_filtros, text="Filtrar", command=atualizar_grafico).pack(side='left', padx=(20, 5))
     ttk.Button(frame_filtros, text="Limpar Filtro", command=limpar_filtros).pack(side='left', padx=5)
+    label_estado = tk.Label(frame_filtros, text="", bg=COR_PRINCIPAL, fg=COR_TEXTO, font=FONTE)
+    label_estado.pack(side='left', padx=10)
 
     # Carrega o gráfico com todos os dados na primeira vez
     atualizar_grafico()
     
-def preencher_dashboard():
-    user_id = usuario_logado['id']
-    for widget in frame_principal.winfo_children():
-        if widget != label_bem_vindo: widget.destroy()
-
-    resumo = db_manager.obter_resumo_mensal(user_id)
+def construir_dashboard():
+    """Cria os widgets do dashboard uma única vez; preencher_dashboard() apenas atualiza o conteúdo."""
     frame_resumo = tk.Frame(frame_principal, bg=COR_SECUNDARIA); frame_resumo.grid(row=1, column=0, padx=20, pady=10, sticky="nsew")
     tk.Label(frame_resumo, text="Resumo do Mês", font=FONTE_SALDO, fg=COR_TEXTO, bg=COR_SECUNDARIA).pack(pady=(10,5))
-    entradas_str = f"R$ {resumo['entradas']:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    tk.Label(frame_resumo, text=f"Entradas: {entradas_str}", font=FONTE, fg="#2ecc71", bg=COR_SECUNDARIA).pack(pady=2)
-    saidas_str = f"R$ {resumo['saidas']:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    tk.Label(frame_resumo, text=f"Saídas: {saidas_str}", font=FONTE, fg="#e74c3c", bg=COR_SECUNDARIA).pack(pady=(2,10))
+    widgets_dashboard['entradas'] = tk.Label(frame_resumo, font=FONTE, fg="#2ecc71", bg=COR_SECUNDARIA); widgets_dashboard['entradas'].pack(pady=2)
+    widgets_dashboard['saidas'] = tk.Label(frame_resumo, font=FONTE, fg="#e74c3c", bg=COR_SECUNDARIA); widgets_dashboard['saidas'].pack(pady=(2,10))
 
-    saldo_atual = db_manager.obter_saldo(user_id)
     frame_saldo = tk.Frame(frame_principal, bg=COR_SECUNDARIA); frame_saldo.grid(row=1, column=1, padx=20, pady=10, sticky="nsew")
     tk.Label(frame_saldo, text="Saldo Atual", font=FONTE_SALDO, fg=COR_TEXTO, bg=COR_SECUNDARIA).pack(pady=(10,5))
-    saldo_str = f"R$ {saldo_atual:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    tk.Label(frame_saldo, text=saldo_str, font=FONTE_SALDO, fg="#00cec9", bg=COR_SECUNDARIA).pack(pady=(2,10))
+    widgets_dashboard['saldo'] = tk.Label(frame_saldo, font=FONTE_SALDO, fg="#00cec9", bg=COR_SECUNDARIA); widgets_dashboard['saldo'].pack(pady=(2,10))
 
-    top_categorias = db_manager.obter_top_categorias(user_id)
     frame_grafico = tk.Frame(frame_principal, bg=COR_SECUNDARIA); frame_grafico.grid(row=2, column=0, padx=20, pady=10, sticky="nsew")
     tk.Label(frame_grafico, text="Top Despesas do Mês", font=FONTE_SALDO, fg=COR_TEXTO, bg=COR_SECUNDARIA).pack(pady=10)
-    if top_categorias:
-        fig = Figure(figsize=(5, 3), dpi=80, facecolor=COR_SECUNDARIA); ax = fig.add_subplot(111); ax.set_facecolor(COR_SECUNDARIA)
-        labels = [item['categoria'] for item in top_categorias]; sizes = [item['total'] for item in top_categorias]
-        labels.reverse(); sizes.reverse()
-        ax.barh(labels, sizes, color=COR_BOTAO, height=0.5)
-        ax.tick_params(axis='x', colors=COR_TEXTO); ax.tick_params(axis='y', colors=COR_TEXTO)
-        ax.spines['bottom'].set_color(COR_TEXTO); ax.spines['left'].set_color(COR_TEXTO); ax.spines['top'].set_color(COR_SECUNDARIA); ax.spines['right'].set_color(COR_SECUNDARIA)
-        fig.tight_layout(pad=0.5)
-        canvas = FigureCanvasTkAgg(fig, master=frame_grafico); canvas.draw(); canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1, padx=10, pady=5)
-    else:
-        tk.Label(frame_grafico, text="Nenhuma despesa no mês.", font=FONTE, fg=COR_TEXTO, bg=COR_SECUNDARIA).pack(expand=True)
-
-    ultimas_transacoes = db_manager.obter_ultimas_transacoes(user_id)
+    widgets_dashboard['frame_grafico'] = frame_grafico
+    widgets_dashboard['sem_despesas'] = tk.Label(frame_grafico, text="Nenhuma despesa no mês.", font=FONTE, fg=COR_TEXTO, bg=COR_SECUNDARIA)
+
     frame_ultimas = tk.Frame(frame_principal, bg=COR_SECUNDARIA); frame_ultimas.grid(row=2, column=1, padx=20, pady=10, sticky="nsew")
     tk.Label(frame_ultimas, text="Últimas Transações", font=FONTE_SALDO, fg=COR_TEXTO, bg=COR_SECUNDARIA).pack(pady=10)
     style_tree = ttk.Style(); style_tree.configure("Dashboard.Treeview", background=COR_SECUNDARIA, foreground=COR_TEXTO, rowheight=25, fieldbackground=COR_SECUNDARIA, font=FONTE)
@@ -424,20 +1124,101 @@ def preencher_dashboard():
     tree = ttk.Treeview(frame_ultimas, columns=('data', 'tipo', 'valor'), show='headings', style="Dashboard.Treeview", height=5)
     tree.heading('data', text='Data'); tree.heading('tipo', text='Tipo'); tree.heading('valor', text='Valor')
     tree.column('data', width=100, anchor='center'); tree.column('tipo', width=100, anchor='center'); tree.column('valor', width=120, anchor='e')
-    for t in ultimas_transacoes:
-        valor_f = f"R$ {t['valor']:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-        tag = 'deposito' if t['tipo'] == 'deposito' else 'saque'
-        tree.insert('', 'end', values=(t['data'], t['tipo'].capitalize(), valor_f), tags=(tag,))
     tree.tag_configure('deposito', foreground='#2ecc71'); tree.tag_configure('saque', foreground='#e74c3c')
     tree.pack(fill='x', expand=True, padx=10, pady=5)
+    widgets_dashboard['ultimas'] = tree
 
     frame_acoes = tk.Frame(frame_principal, bg=COR_PRINCIPAL); frame_acoes.grid(row=3, column=0, columnspan=2, pady=20)
     ttk.Button(frame_acoes, text="Nova Transação", command=abrir_janela_transacao).pack(side='left', padx=10)
     ttk.Button(frame_acoes, text="Transferir", command=abrir_janela_transferencia).pack(side='left', padx=10)
     ttk.Button(frame_acoes, text="Histórico Completo", command=mostrar_historico).pack(side='left', padx=10)
+    ttk.Button(frame_acoes, text="Recorrentes", command=abrir_janela_recorrentes).pack(side='left', padx=10)
     ttk.Button(frame_acoes, text="Relatórios", command=abrir_janela_relatorio).pack(side='left', padx=10)
+    ttk.Button(frame_acoes, text="Fluxo de Caixa", command=abrir_janela_fluxo_caixa).pack(side='left', padx=10)
     ttk.Button(frame_acoes, text="Sair", command=fazer_logout).pack(side='left', padx=10)
 
+def criar_grafico_dashboard():
+    """Cria a figura do dashboard (e importa o matplotlib) só quando há despesas para mostrar."""
+    Figure, FigureCanvasTkAgg = importar_graficos()
+    fig = Figure(figsize=(5, 3), dpi=80, facecolor=COR_SECUNDARIA); ax = fig.add_subplot(111); ax.set_facecolor(COR_SECUNDARIA)
+    ax.tick_params(axis='x', colors=COR_TEXTO); ax.tick_params(axis='y', colors=COR_TEXTO)
+    ax.spines['bottom'].set_color(COR_TEXTO); ax.spines['left'].set_color(COR_TEXTO); ax.spines['top'].set_color(COR_SECUNDARIA); ax.spines['right'].set_color(COR_SECUNDARIA)
+    fig.subplots_adjust(left=0.3, right=0.95, top=0.95, bottom=0.12)
+    # Barras criadas uma vez; a cada atualização mudam apenas largura, visibilidade e rótulos.
+    widgets_dashboard['barras'] = list(ax.barh(range(TOP_CATEGORIAS_DASHBOARD), [0] * TOP_CATEGORIAS_DASHBOARD, color=COR_BOTAO, height=0.5))
+    widgets_dashboard['ax'] = ax
+    widgets_dashboard['canvas'] = FigureCanvasTkAgg(fig, master=widgets_dashboard['frame_grafico'])
+
+def atualizar_grafico_dashboard(top_categorias):
+    sem_despesas = widgets_dashboard['sem_despesas']
+    if not top_categorias:
+        if 'canvas' in widgets_dashboard:
+            widgets_dashboard['canvas'].get_tk_widget().pack_forget()
+        sem_despesas.pack(expand=True)
+        return
+    if 'canvas' not in widgets_dashboard:
+        criar_grafico_dashboard()
+    canvas = widgets_dashboard['canvas']
+    sem_despesas.pack_forget()
+    canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1, padx=10, pady=5)
+
+    labels = [item['categoria'] for item in top_categorias]; sizes = [float(item['total']) for item in top_categorias]
+    labels.reverse(); sizes.reverse()
+    for posicao, barra in enumerate(widgets_dashboard['barras']):
+        barra.set_visible(posicao < len(sizes))
+        barra.set_width(sizes[posicao] if posicao < len(sizes) else 0)
+    ax = widgets_dashboard['ax']
+    ax.set_yticks(range(len(labels)), labels)
+    ax.set_ylim(-0.5, len(labels) - 0.5)
+    ax.set_xlim(0, max(sizes) * 1.05)
+    canvas.draw_idle()
+
+def preencher_dashboard():
+    if not widgets_dashboard:
+        construir_dashboard()
+    executor.submeter(banco.obter_snapshot_dashboard, usuario_logado['id'], limite_top=TOP_CATEGORIAS_DASHBOARD,
+                      ao_concluir=mostrar_dados_dashboard, chave='dashboard',
+                      ao_falhar=falha_pedido(mensagem="Não foi possível atualizar o dashboard."))
+
+def mostrar_dados_dashboard(dados):
+    entradas_str = f"R$ {dados['resumo']['entradas']:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    widgets_dashboard['entradas'].config(text=f"Entradas: {entradas_str}")
+    saidas_str = f"R$ {dados['resumo']['saidas']:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    widgets_dashboard['saidas'].config(text=f"Saídas: {saidas_str}")
+    saldo_str = f"R$ {dados['saldo']:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    widgets_dashboard['saldo'].config(text=saldo_str)
+
+    atualizar_grafico_dashboard(dados['top_categorias'])
+
+    tree = widgets_dashboard['ultimas']
+    tree.delete(*tree.get_children())
+    for t in dados['ultimas_transacoes']:
+        valor_f = f"R$ {t['valor']:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        tag = 'deposito' if t['tipo'] == 'deposito' else 'saque'
+        tree.insert('', 'end', values=(t['data'], t['tipo'].capitalize(), valor_f), tags=(tag,))
+
+    if dados['alertas']:
+        mostrar_alertas_orcamento(dados['alertas'])
+
+def mostrar_alertas_orcamento(alertas):
+    """Avisa dos orçamentos que chegaram a um limiar desde o último aviso e marca esses alertas como vistos.
+
+    Um dashboard atualizado antes de a marcação chegar à base de dados traz os mesmos
+    alertas outra vez; os já avisados nesta sessão não se repetem.
+    """
+    alertas = [alerta for alerta in alertas if _chave_alerta(alerta) not in alertas_mostrados]
+    if not alertas:
+        return
+    alertas_mostrados.update(_chave_alerta(alerta) for alerta in alertas)
+    executor.submeter(banco.marcar_alertas_vistos, usuario_logado['id'], alertas,
+                      ao_falhar=falha_pedido(mensagem="Não foi possível marcar os alertas como vistos."))
+    linhas = [f"• {alerta['categoria']} ({alerta['mes']:02d}/{alerta['ano']}): {alerta['limiar']}% atingido — "
+              f"{formatar_reais(alerta['gasto'])} de {formatar_reais(alerta['orcamento'])}" for alerta in alertas]
+    messagebox.showwarning("Alerta de Orçamento", "\n".join(linhas))
+
+def _chave_alerta(alerta):
+    return (alerta['ano'], alerta['mes'], alerta['categoria'], alerta['limiar'], alerta['data_alerta'])
+
 def mostrar_frame(frame_para_mostrar):
     frame_login.pack_forget()
     frame_cadastro.pack_forget()
@@ -467,7 +1248,8 @@ entry_email_login.pack(pady=5, ipady=5)
 tk.Label(frame_login, text="Senha", font=FONTE, fg=COR_TEXTO, bg=COR_PRINCIPAL).pack(pady=(10,0))
 entry_senha_login = ttk.Entry(frame_login, font=FONTE, justify="center", show="*", width=40)
 entry_senha_login.pack(pady=5, ipady=5)
-ttk.Button(frame_login, text="Entrar", command=fazer_login, width=20).pack(pady=20)
+botao_entrar = ttk.Button(frame_login, text="Entrar", command=fazer_login, width=20)
+botao_entrar.pack(pady=20)
 ttk.Button(frame_login, text="Não tenho conta", command=lambda: mostrar_frame(frame_cadastro)).pack()
 
 frame_cadastro = tk.Frame(janela, bg=COR_PRINCIPAL)
@@ -478,7 +1260,8 @@ entry_email_cadastro.pack(pady=5, ipady=5)
 tk.Label(frame_cadastro, text="Senha", font=FONTE, fg=COR_TEXTO, bg=COR_PRINCIPAL).pack(pady=(10,0))
 entry_senha_cadastro = ttk.Entry(frame_cadastro, font=FONTE, justify="center", show="*", width=40)
 entry_senha_cadastro.pack(pady=5, ipady=5)
-ttk.Button(frame_cadastro, text="Cadastrar", command=cadastrar_usuario, width=20).pack(pady=20)
+botao_cadastrar = ttk.Button(frame_cadastro, text="Cadastrar", command=cadastrar_usuario, width=20)
+botao_cadastrar.pack(pady=20)
 ttk.Button(frame_cadastro, text="Já tenho conta", command=lambda: mostrar_frame(frame_login)).pack()
 
 frame_principal = tk.Frame(janela, bg=COR_PRINCIPAL)
@@ -492,6 +1275,17 @@ label_bem_vindo.grid(row=0, column=0, columnspan=2, padx=20, pady=(20, 10), stic
 # =================================================================
 # 4. INICIALIZAÇÃO DA APLICAÇÃO
 # =================================================================
-db_manager.inicializar_banco() 
+if INSTRUMENTAR_DB:
+    import instrumentacao
+    instrumentacao.ativar()
+if SERVIDOR_API:
+    banco = cliente_api.ClienteAPI(SERVIDOR_API)
+else:
+    banco = db_manager
+    banco.inicializar_banco()
+executor = ExecutorDB(janela)
 mostrar_frame(frame_login)
-janela.mainloop()
\ No newline at end of file
+janela.mainloop()
+executor.encerrar()
+if INSTRUMENTAR_DB:
+    instrumentacao.despejar_estatisticas(FICHEIRO_ESTATISTICAS_DB)
\ No newline at end of file
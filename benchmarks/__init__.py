@@ -0,0 +1,8 @@
+"""Benchmarks do FinancialManager.
+
+Correm a partir da raiz do repositório, sempre sobre bases de dados temporárias:
+    python -m benchmarks.bench_ingestao
+    python -m benchmarks.bench_funcoes --escalas 10000,100000
+
+benchmarks.gerador cria as bases de dados sintéticas usadas pelos benchmarks.
+"""
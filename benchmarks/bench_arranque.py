@@ -0,0 +1,88 @@
+"""Tempo de arranque: do lançamento do processo até o ecrã de login estar desenhado.
+
+A aplicação corre num subprocesso, numa pasta temporária (para não tocar na base de
+dados real), com o mainloop substituído por um que desenha a janela uma vez e termina.
+Também mostra os módulos mais caros de importar até esse ponto (python -X importtime).
+
+Uso:
+    python -m benchmarks.bench_arranque [--execucoes 5] [--top 15] [--limite-ms 1500]
+
+Com --limite-ms o processo termina com código 1 se a mediana ultrapassar o limite,
+o que permite apanhar regressões numa pipeline de CI. Requer um ecrã (ou Xvfb).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ARRANQUE = f"""
+import sys, tkinter
+sys.path.insert(0, {RAIZ!r})
+
+def _mainloop(self, n=0):
+    self.update()
+    print("ECRA_LOGIN_PRONTO", flush=True)
+    self.destroy()
+
+tkinter.Misc.mainloop = _mainloop
+import runpy
+runpy.run_path({os.path.join(RAIZ, 'app.py')!r}, run_name="__main__")
+"""
+
+
+def _executar(argumentos_extra, diretorio):
+    """Corre a aplicação até ao ecrã de login; devolve (segundos, stderr)."""
+    inicio = time.perf_counter()
+    processo = subprocess.run([sys.executable, *argumentos_extra, "-c", ARRANQUE], cwd=diretorio,
+                              capture_output=True, text=True, env={**os.environ, "FM_PREAQUECER": "0"})
+    duracao = time.perf_counter() - inicio
+    if "ECRA_LOGIN_PRONTO" not in processo.stdout:
+        raise RuntimeError(f"A aplicação não chegou ao ecrã de login:\n{processo.stderr}")
+    return duracao, processo.stderr
+
+
+def _custos_importacao(stderr):
+    """Lê a saída de -X importtime e devolve [(cumulativo_us, proprio_us, modulo)] de nível superior."""
+    custos = []
+    for linha in stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        proprio, cumulativo, modulo = linha[len("import time:"):].split("|")
+        if modulo.startswith("  "):  # importado por outro módulo; já contado no cumulativo do pai
+            continue
+        custos.append((int(cumulativo), int(proprio), modulo.strip()))
+    return sorted(custos, reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--execucoes", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="quantos módulos mostrar")
+    parser.add_argument("--limite-ms", type=float, default=None, help="falha se a mediana exceder este valor")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        _executar([], diretorio)  # aquece a cache de bytecode e do sistema de ficheiros
+        tempos = [_executar([], diretorio)[0] * 1000 for _ in range(args.execucoes)]
+        _, stderr = _executar(["-X", "importtime"], diretorio)
+
+    print(f"Tempo até ao ecrã de login ({args.execucoes} execuções):")
+    print(f"  mediana {statistics.median(tempos):8.1f} ms   mínimo {min(tempos):8.1f} ms   máximo {max(tempos):8.1f} ms")
+    print(f"\nMódulos de nível superior mais caros (-X importtime):")
+    print(f"  {'cumulativo':>12} {'próprio':>10}  módulo")
+    for cumulativo, proprio, modulo in _custos_importacao(stderr)[:args.top]:
+        print(f"  {cumulativo / 1000:>9.1f} ms {proprio / 1000:>7.1f} ms  {modulo}")
+
+    if args.limite_ms is not None and statistics.median(tempos) > args.limite_ms:
+        print(f"\nRegressão: mediana acima do limite de {args.limite_ms:.0f} ms.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Consultas analíticas em SQL vs. sobre o snapshot colunar (snapshot_colunar) a várias escalas.
+
+Usa as bases de dados de benchmarks.bench_funcoes (geradas em --pasta-dados se ainda
+não existirem). Para cada escala mede a exportação completa do snapshot, uma
+atualização sem transações novas (só a verificação com o agregado mensal) e o p50 de
+cada consulta feita das duas formas: diretamente na base de dados e sobre as colunas
+mapeadas em memória.
+
+Uso:
+    python -m benchmarks.bench_colunar [--escalas 100000,1000000] [--usuarios 100] [--repeticoes 20]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import db_manager
+import snapshot_colunar
+from benchmarks.bench_funcoes import _base_da_escala, _percentil
+
+
+def _consultas(snapshot):
+    """nome -> (consulta SQL, consulta sobre o snapshot)."""
+    conn = db_manager.obter_conexao()
+
+    def sql(query, params=()):
+        return lambda: conn.execute(query, params).fetchall()
+
+    return {
+        'gastos por categoria (todos)': (
+            sql("SELECT categoria, SUM(valor) FROM transacoes WHERE tipo = 'saque' AND categoria IS NOT NULL GROUP BY categoria"),
+            lambda: snapshot.gastos_por_categoria()),
+        'gastos por categoria (1 utilizador)': (
+            sql("SELECT categoria, SUM(valor) FROM transacoes WHERE usuario_id = ? AND tipo = 'saque' "
+                "AND categoria IS NOT NULL GROUP BY categoria", (1,)),
+            lambda: snapshot.gastos_por_categoria(usuario_id=1)),
+        'totais por mês e categoria': (
+            sql("SELECT substr(data_transacao, 1, 7), categoria, SUM(valor), COUNT(*) FROM transacoes "
+                "WHERE tipo = 'saque' GROUP BY 1, 2"),
+            lambda: snapshot.totais_por_periodo('mes')),
+        'totais por dia (1 ano)': (
+            sql("SELECT substr(data_transacao, 1, 10), SUM(valor), COUNT(*) FROM transacoes "
+                "WHERE tipo = 'saque' AND data_transacao >= ? GROUP BY 1", (f"{time.localtime().tm_year - 1}",)),
+            lambda: snapshot.totais_por_periodo('dia', inicio=f"{time.localtime().tm_year - 1}-01-01", por_categoria=False)),
+        'estatísticas por utilizador': (
+            sql("SELECT usuario_id, COUNT(*), SUM(valor), AVG(valor), MAX(valor) FROM transacoes "
+                "WHERE tipo = 'saque' GROUP BY usuario_id"),
+            lambda: snapshot.estatisticas_por_usuario()),
+    }
+
+
+def _p50_ms(funcao, repeticoes):
+    funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return _percentil(sorted(tempos), 50) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escalas", type=lambda texto: [int(e) for e in texto.split(",")], default=[100_000, 1_000_000],
+                        help="números totais de transações, separados por vírgulas")
+    parser.add_argument("--usuarios", type=int, default=100)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--pasta-dados", default=os.path.join(tempfile.gettempdir(), "financial_manager_bench"),
+                        help="onde guardar as bases de dados geradas")
+    args = parser.parse_args(argv)
+    os.makedirs(args.pasta_dados, exist_ok=True)
+
+    for escala in args.escalas:
+        db_manager.DB_FILE = _base_da_escala(args.pasta_dados, escala, args.usuarios)
+        db_manager.fechar_conexoes()
+        with tempfile.TemporaryDirectory() as pasta:
+            inicio = time.perf_counter()
+            resultado = snapshot_colunar.atualizar_snapshot(pasta)
+            exportacao = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            snapshot_colunar.atualizar_snapshot(pasta)
+            atualizacao = time.perf_counter() - inicio
+            snapshot = snapshot_colunar.abrir_snapshot(pasta)
+
+            print(f"\n=== {escala:,} transações ===")
+            print(f"exportação completa: {exportacao:.2f} s ({resultado['linhas'] / exportacao:,.0f} linhas/s); "
+                  f"atualização sem novas: {atualizacao * 1000:.1f} ms")
+            print(f"{'consulta':<38} {'SQL ms':>9} {'colunar ms':>11} {'ganho':>7}")
+            for nome, (sql, colunar) in _consultas(snapshot).items():
+                ms_sql, ms_colunar = _p50_ms(sql, args.repeticoes), _p50_ms(colunar, args.repeticoes)
+                print(f"{nome:<38} {ms_sql:>9.2f} {ms_colunar:>11.2f} {ms_sql / ms_colunar:>6.1f}x")
+            del snapshot
+        db_manager.fechar_conexoes()
+
+
+if __name__ == "__main__":
+    main()
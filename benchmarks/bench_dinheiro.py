@@ -0,0 +1,94 @@
+"""Agregação de valores monetários: colunas REAL (formato antigo) vs. INTEGER em centavos.
+
+O mesmo livro de transações sintético é gravado em duas tabelas que só diferem no tipo
+da coluna `valor`, e as agregações usadas pelos relatórios são cronometradas em ambas.
+No fim mostra também o erro acumulado por um saldo em float ao fim de N atualizações.
+
+Uso:
+    python -m benchmarks.bench_dinheiro [--linhas 1000000] [--usuarios 50] [--repeticoes 5]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from decimal import Decimal
+
+from benchmarks.bench_ingestao import CATEGORIAS
+
+CONSULTAS = {
+    "soma total": "SELECT SUM(valor) FROM {tabela}",
+    "gastos por categoria (1 utilizador)": """
+        SELECT categoria, SUM(valor) FROM {tabela} INDEXED BY idx_{tabela}
+        WHERE usuario_id = 7 AND tipo = 'saque' GROUP BY categoria""",
+    "totais mensais (todos)": """
+        SELECT usuario_id, substr(data_transacao, 1, 7), tipo, SUM(valor), COUNT(*)
+        FROM {tabela} GROUP BY 1, 2, 3""",
+}
+
+
+def _livro_sintetico(quantidade, usuarios, semente=42):
+    """Gera (usuario_id, tipo, centavos, categoria, data) para o livro de teste."""
+    gerador = random.Random(semente)
+    for i in range(quantidade):
+        tipo = 'deposito' if gerador.random() < 0.2 else 'saque'
+        yield (gerador.randint(1, usuarios), tipo, gerador.randint(100, 50_000),
+               gerador.choice(CATEGORIAS) if tipo == 'saque' else None,
+               f"20{20 + i * 5 // quantidade}-{gerador.randint(1, 12):02d}-{gerador.randint(1, 28):02d} 12:00:00")
+
+
+def _criar_tabelas(conn, linhas):
+    for tabela, tipo in (("real", "REAL"), ("centavos", "INTEGER")):
+        conn.execute(f"""CREATE TABLE {tabela} (id INTEGER PRIMARY KEY, usuario_id INTEGER, tipo TEXT,
+                         valor {tipo}, categoria TEXT, data_transacao TEXT)""")
+        conn.execute(f"CREATE INDEX idx_{tabela} ON {tabela} (usuario_id, tipo, categoria, data_transacao, valor)")
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO real (usuario_id, tipo, valor, categoria, data_transacao) VALUES (?, ?, ? / 100.0, ?, ?)", linhas)
+    conn.execute("INSERT INTO centavos SELECT id, usuario_id, tipo, CAST(ROUND(valor * 100) AS INTEGER), categoria, data_transacao FROM real")
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+
+
+def _melhor_tempo(conn, query, repeticoes):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        conn.execute(query).fetchall()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--usuarios", type=int, default=50)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        conn = sqlite3.connect(os.path.join(diretorio, "dinheiro.db"), isolation_level=None)
+        conn.execute("PRAGMA cache_size = -262144")  # mede a agregação, não o disco
+        print(f"A gerar {args.linhas:,} transações...")
+        _criar_tabelas(conn, _livro_sintetico(args.linhas, args.usuarios))
+
+        print(f"\n{'consulta':<38} {'REAL':>10} {'centavos':>10} {'ganho':>8}")
+        for nome, query in CONSULTAS.items():
+            tempo_real = _melhor_tempo(conn, query.format(tabela="real"), args.repeticoes)
+            tempo_centavos = _melhor_tempo(conn, query.format(tabela="centavos"), args.repeticoes)
+            print(f"{nome:<38} {tempo_real * 1000:>7.1f} ms {tempo_centavos * 1000:>7.1f} ms "
+                  f"{tempo_real / tempo_centavos:>7.2f}x")
+
+        # Saldo acumulado com `saldo = saldo + ?`, como fazia registrar_transacao com colunas REAL.
+        saldo_float, saldo_centavos = 0.0, 0
+        for valor, centavos in conn.execute("SELECT r.valor, c.valor FROM real r JOIN centavos c USING (id)"):
+            saldo_float += valor
+            saldo_centavos += centavos
+        exato = Decimal(saldo_centavos).scaleb(-2)
+        print(f"\nSaldo após {args.linhas:,} atualizações: float {saldo_float!r}  exato {exato}  "
+              f"erro {abs(Decimal(repr(saldo_float)) - exato)}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
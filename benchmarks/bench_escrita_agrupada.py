@@ -0,0 +1,99 @@
+"""Débito e latência de registrar_transacao com e sem escrita agrupada (group commit).
+
+Várias threads registam transações em simultâneo, cada uma à espera da confirmação da
+anterior, como pedidos concorrentes de um servidor. Cada cenário corre numa base de
+dados nova e é medido com synchronous=FULL (cada confirmação no disco) e NORMAL.
+
+Uso:
+    python -m benchmarks.bench_escrita_agrupada [--threads 8] [--escritas 300] [--max-lote 256] [--espera-ms 0]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import db_manager
+from benchmarks.bench_funcoes import _percentil
+from escrita_agrupada import EscritorAgrupado
+
+
+def _preparar_base(caminho, threads):
+    db_manager.DB_FILE = caminho
+    db_manager.inicializar_banco()
+    ids = []
+    for indice in range(threads):
+        db_manager.adicionar_usuario(f"escrita{indice}@exemplo.com", "-")
+        ids.append(db_manager.buscar_usuario_por_email(f"escrita{indice}@exemplo.com")['id'])
+    return ids
+
+
+def _correr(ids, escritas, escrever):
+    """Cada thread faz `escritas` chamadas a escrever(usuario_id); devolve (segundos, latências)."""
+    latencias = [[] for _ in ids]
+    barreira = threading.Barrier(len(ids) + 1)
+
+    def trabalhar(posicao, usuario_id):
+        barreira.wait()
+        for _ in range(escritas):
+            inicio = time.perf_counter()
+            escrever(usuario_id)
+            latencias[posicao].append(time.perf_counter() - inicio)
+
+    threads = [threading.Thread(target=trabalhar, args=(posicao, usuario_id)) for posicao, usuario_id in enumerate(ids)]
+    for thread in threads:
+        thread.start()
+    barreira.wait()
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - inicio, sorted(l for lista in latencias for l in lista)
+
+
+def _direto(sincronizacao):
+    configuradas = set()
+
+    def escrever(usuario_id):
+        conn = db_manager.obter_conexao()
+        if id(conn) not in configuradas:
+            conn.execute(f"PRAGMA synchronous = {sincronizacao}")
+            configuradas.add(id(conn))
+        if not db_manager.registrar_transacao(usuario_id, 'saque', 1.25, "Outros"):
+            raise RuntimeError("escrita falhou")
+    return escrever
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--escritas", type=int, default=300, help="escritas por thread")
+    parser.add_argument("--max-lote", type=int, default=256)
+    parser.add_argument("--espera-ms", type=float, default=0)
+    args = parser.parse_args(argv)
+
+    print(f"{args.threads} threads x {args.escritas} escritas")
+    print(f"{'cenário':<30} {'escritas/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'lotes':>7}")
+    with tempfile.TemporaryDirectory() as diretorio:
+        for sincronizacao in ("FULL", "NORMAL"):
+            for agrupada in (False, True):
+                db_manager.fechar_conexoes()
+                ids = _preparar_base(os.path.join(diretorio, f"{sincronizacao}_{agrupada}.db"), args.threads)
+                escritor = None
+                if agrupada:
+                    escritor = EscritorAgrupado(args.max_lote, args.espera_ms, sincronizacao)
+                    escrever = lambda u: escritor.registrar_transacao(u, 'saque', 1.25, "Outros").result()
+                else:
+                    escrever = _direto(sincronizacao)
+                segundos, latencias = _correr(ids, args.escritas, escrever)
+                lotes = "-"
+                if escritor is not None:
+                    escritor.encerrar()
+                    lotes = escritor.lotes
+                nome = f"{'agrupada' if agrupada else 'direta'} (synchronous={sincronizacao})"
+                print(f"{nome:<30} {len(latencias) / segundos:>11,.0f} {_percentil(latencias, 50) * 1000:>8.2f} "
+                      f"{_percentil(latencias, 99) * 1000:>8.2f} {lotes:>7}")
+        db_manager.fechar_conexoes()
+
+
+if __name__ == "__main__":
+    main()
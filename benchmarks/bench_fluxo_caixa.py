@@ -0,0 +1,78 @@
+"""Tempo de fluxo_caixa.obter_fluxo_caixa com históricos de vários anos: leitura (SQL) e cálculo (NumPy).
+
+Usa a base de dados de benchmarks.bench_funcoes da escala pedida (gerada em
+--pasta-dados se ainda não existir); com 1 000 000 de transações e 100 utilizadores,
+cada utilizador tem cerca de 9 anos de histórico. Para cada período (--meses) mede o
+p50 da consulta das séries diárias, do cálculo vetorizado das estatísticas sobre as
+linhas já lidas e da função completa sem cache, em --usuarios-amostra utilizadores.
+
+Uso:
+    python -m benchmarks.bench_fluxo_caixa [--escala 1000000] [--meses 12,36,60,108] [--repeticoes 10]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+import db_manager
+import fluxo_caixa
+from benchmarks.bench_funcoes import _base_da_escala, _percentil
+
+
+def _medir(funcao, repeticoes):
+    """p50 em ms (depois de uma execução de aquecimento) e o último resultado."""
+    resultado = funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return _percentil(sorted(tempos), 50) * 1000, resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escala", type=int, default=1_000_000, help="número total de transações")
+    parser.add_argument("--usuarios", type=int, default=100)
+    parser.add_argument("--usuarios-amostra", type=int, default=5, help="utilizadores medidos")
+    parser.add_argument("--meses", type=lambda texto: [int(m) for m in texto.split(",")], default=[12, 36, 60, 108],
+                        help="períodos analisados, em meses, separados por vírgulas")
+    parser.add_argument("--repeticoes", type=int, default=10)
+    parser.add_argument("--pasta-dados", default=os.path.join(tempfile.gettempdir(), "financial_manager_bench"),
+                        help="onde guardar as bases de dados geradas")
+    args = parser.parse_args(argv)
+    os.makedirs(args.pasta_dados, exist_ok=True)
+
+    db_manager.DB_FILE = _base_da_escala(args.pasta_dados, args.escala, args.usuarios)
+    db_manager.fechar_conexoes()
+    db_manager.inicializar_banco()
+    conn = db_manager.obter_conexao()
+    hoje = date.today()
+    amostra = range(1, min(args.usuarios, args.usuarios_amostra) + 1)
+
+    print(f"{args.escala:,} transações, {args.usuarios} utilizadores; p50 por utilizador ({len(amostra)} utilizadores)")
+    print(f"{'meses':>6} {'linhas':>8} {'dias':>6} {'SQL ms':>8} {'NumPy ms':>9} {'total ms':>9}")
+    for meses in args.meses:
+        ano, mes = divmod(hoje.year * 12 + hoje.month - 1 - (meses - 1), 12)
+        inicio = date(ano, mes + 1, 1)
+        medidas = []
+        for usuario_id in amostra:
+            ms_sql, linhas = _medir(lambda: fluxo_caixa._ler_linhas(conn, usuario_id, inicio.isoformat()),
+                                    args.repeticoes)
+            saldo = conn.execute("SELECT saldo FROM usuarios WHERE id = ?", (usuario_id,)).fetchone()[0]
+            ms_calculo, resultado = _medir(lambda: fluxo_caixa._calcular(
+                linhas, saldo, inicio, hoje, meses, fluxo_caixa.JANELA_MEDIA, fluxo_caixa.DIAS_PREVISAO,
+                fluxo_caixa.JANELA_TENDENCIA), args.repeticoes)
+
+            def sem_cache():
+                db_manager.limpar_cache_resultados()
+                return fluxo_caixa.obter_fluxo_caixa(usuario_id, meses=meses)
+            ms_total, _ = _medir(sem_cache, args.repeticoes)
+            medidas.append((len(linhas), len(resultado['saldo']), ms_sql, ms_calculo, ms_total))
+        linhas, dias, ms_sql, ms_calculo, ms_total = (sorted(coluna)[len(coluna) // 2] for coluna in zip(*medidas))
+        print(f"{meses:>6} {linhas:>8,} {dias:>6,} {ms_sql:>8.2f} {ms_calculo:>9.2f} {ms_total:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Latência de cada função do db_manager a várias escalas, com baselines para comparação.
+
+Para cada escala (número total de transações) é gerada uma base de dados com
+benchmarks.gerador, guardada em --pasta-dados para ser reutilizada nas execuções
+seguintes. Cada função é chamada --chamadas vezes com utilizadores escolhidos de forma
+determinística; as funções de escrita correm sobre uma cópia da base de dados.
+Reporta p50/p99 da latência e linhas (ou operações) por segundo. As leituras passam pela
+cache de resultados do db_manager, como na aplicação; --sem-cache mede só as consultas.
+
+Uso:
+    python -m benchmarks.bench_funcoes [--escalas 10000,100000,1000000] [--usuarios 100]
+                                       [--sem-cache] [--guardar-baseline nome] [--comparar nome] [--tolerancia 1.25]
+
+Com --comparar, o processo termina com código 1 se o p50 de alguma função piorar mais
+do que a tolerância em relação à baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+
+import db_manager
+from benchmarks import gerador
+
+PASTA_BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+def _percentil(amostras, p):
+    """Percentil pelo método do rank mais próximo (amostras já ordenadas)."""
+    indice = max(0, min(len(amostras) - 1, round(p / 100 * len(amostras)) - 1))
+    return amostras[indice]
+
+
+def _linhas(resultado):
+    """Quantas linhas uma função devolveu, para o cálculo de linhas por segundo."""
+    if isinstance(resultado, list):
+        return len(resultado)
+    if isinstance(resultado, dict) and 'transacoes' in resultado:
+        return len(resultado['transacoes'])
+    return 1
+
+
+def _leituras(ano, mes):
+    """Funções de leitura: nome -> função(usuario_id, gerador)."""
+    return {
+        'buscar_usuario_por_email': lambda u, g: db_manager.buscar_usuario_por_email(gerador.email_do_utilizador(u)),
+        'obter_saldo': lambda u, g: db_manager.obter_saldo(u),
+        'obter_historico': lambda u, g: db_manager.obter_historico(u),
+        'obter_historico (1 mês)': lambda u, g: db_manager.obter_historico(u, date(ano, mes, 1), date.today()),
+        'obter_pagina_historico': lambda u, g: db_manager.obter_pagina_historico(u),
+        'obter_gastos_por_categoria': lambda u, g: db_manager.obter_gastos_por_categoria(u),
+        'obter_resumo_mensal': lambda u, g: db_manager.obter_resumo_mensal(u),
+        'obter_top_categorias': lambda u, g: db_manager.obter_top_categorias(u),
+        'obter_ultimas_transacoes': lambda u, g: db_manager.obter_ultimas_transacoes(u),
+        'obter_snapshot_dashboard': lambda u, g: db_manager.obter_snapshot_dashboard(u),
+        'obter_orcamentos_do_mes': lambda u, g: db_manager.obter_orcamentos_do_mes(u, mes, ano),
+        'obter_gastos_vs_orcamentos': lambda u, g: db_manager.obter_gastos_vs_orcamentos(u, mes, ano),
+    }
+
+
+def _escritas(ano, mes, usuarios):
+    def editar(u, g):
+        ultima = db_manager.obter_pagina_historico(u, limite=1)['transacoes'][0]
+        return db_manager.editar_transacao(ultima['id'], u, round(g.uniform(1, 100), 2), "Outros")
+
+    def excluir(u, g):
+        ultima = db_manager.obter_pagina_historico(u, limite=1)['transacoes'][0]
+        return db_manager.excluir_transacao(ultima['id'], u)
+
+    return {
+        'registrar_transacao': lambda u, g: db_manager.registrar_transacao(u, 'saque', round(g.uniform(1, 100), 2), "Outros"),
+        'registrar_transferencia': lambda u, g: db_manager.registrar_transferencia(
+            u, gerador.email_do_utilizador(u % usuarios + 1), 0.01),
+        'editar_transacao': editar,
+        'excluir_transacao': excluir,
+        'definir_ou_atualizar_orcamento': lambda u, g: db_manager.definir_ou_atualizar_orcamento(
+            u, "Lazer", round(g.uniform(100, 500), 2), mes, ano),
+    }
+
+
+def _medir(funcao, usuarios, chamadas, semente=7):
+    gerador_aleatorio = random.Random(semente)
+    funcao(1, gerador_aleatorio)  # aquece a cache de instruções e de páginas
+    tempos, linhas = [], 0
+    for _ in range(chamadas):
+        usuario_id = gerador_aleatorio.randint(1, usuarios)
+        inicio = time.perf_counter()
+        resultado = funcao(usuario_id, gerador_aleatorio)
+        tempos.append(time.perf_counter() - inicio)
+        linhas += _linhas(resultado)
+    tempos.sort()
+    return {
+        'p50_ms': _percentil(tempos, 50) * 1000,
+        'p99_ms': _percentil(tempos, 99) * 1000,
+        'linhas_por_s': linhas / sum(tempos),
+    }
+
+
+def _base_da_escala(pasta, escala, usuarios):
+    caminho = os.path.join(pasta, f"bench_{escala}_{usuarios}_{date.today():%Y%m}.db")
+    if not os.path.exists(caminho):
+        print(f"A gerar {caminho} ({escala:,} transações)...")
+        if os.path.exists(caminho + ".tmp"):
+            os.remove(caminho + ".tmp")  # resto de uma geração interrompida
+        gerador.gerar_base(caminho + ".tmp", usuarios, max(1, escala // usuarios), fim=date.today())
+        db_manager.fechar_conexoes()
+        os.replace(caminho + ".tmp", caminho)
+    return caminho
+
+
+def _executar(args):
+    resultados = {}
+    hoje = date.today()
+    for escala in args.escalas:
+        caminho = _base_da_escala(args.pasta_dados, escala, args.usuarios)
+        resultados[str(escala)] = {}
+
+        db_manager.DB_FILE = caminho
+        for nome, funcao in _leituras(hoje.year, hoje.month).items():
+            resultados[str(escala)][nome] = _medir(funcao, args.usuarios, args.chamadas)
+
+        with tempfile.TemporaryDirectory() as diretorio:
+            db_manager.DB_FILE = os.path.join(diretorio, "escrita.db")
+            db_manager.fechar_conexoes()
+            shutil.copyfile(caminho, db_manager.DB_FILE)
+            for nome, funcao in _escritas(hoje.year, hoje.month, args.usuarios).items():
+                resultados[str(escala)][nome] = _medir(funcao, args.usuarios, args.chamadas)
+            db_manager.fechar_conexoes()
+    return resultados
+
+
+def _imprimir(resultados, baseline=None):
+    for escala, funcoes in resultados.items():
+        print(f"\n=== {int(escala):,} transações ===")
+        print(f"{'função':<32} {'p50 ms':>9} {'p99 ms':>9} {'linhas/s':>12}" + ("  vs. baseline (p50)" if baseline else ""))
+        for nome, medida in funcoes.items():
+            linha = f"{nome:<32} {medida['p50_ms']:>9.3f} {medida['p99_ms']:>9.3f} {medida['linhas_por_s']:>12,.0f}"
+            anterior = (baseline or {}).get(escala, {}).get(nome)
+            if anterior:
+                linha += f"  {medida['p50_ms'] / anterior['p50_ms']:>6.2f}x"
+            print(linha)
+
+
+def _regressoes(resultados, baseline, tolerancia):
+    regressoes = []
+    for escala, funcoes in resultados.items():
+        for nome, medida in funcoes.items():
+            anterior = baseline.get(escala, {}).get(nome)
+            if anterior and medida['p50_ms'] > anterior['p50_ms'] * tolerancia:
+                regressoes.append(f"{nome} @ {int(escala):,}: {anterior['p50_ms']:.3f} -> {medida['p50_ms']:.3f} ms")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escalas", type=lambda texto: [int(e) for e in texto.split(",")], default=[10_000, 100_000, 1_000_000],
+                        help="números totais de transações, separados por vírgulas")
+    parser.add_argument("--usuarios", type=int, default=100)
+    parser.add_argument("--chamadas", type=int, default=200, help="chamadas por função e por escala")
+    parser.add_argument("--pasta-dados", default=os.path.join(tempfile.gettempdir(), "financial_manager_bench"),
+                        help="onde guardar as bases de dados geradas")
+    parser.add_argument("--sem-cache", action="store_true", help="desliga a cache de resultados do db_manager")
+    parser.add_argument("--guardar-baseline", metavar="NOME", default=None)
+    parser.add_argument("--comparar", metavar="NOME", default=None)
+    parser.add_argument("--tolerancia", type=float, default=1.25, help="razão de p50 a partir da qual há regressão")
+    args = parser.parse_args(argv)
+    os.makedirs(args.pasta_dados, exist_ok=True)
+    if args.sem_cache:
+        db_manager._cache_resultados.capacidade = 0
+
+    baseline = None
+    if args.comparar:
+        with open(os.path.join(PASTA_BASELINES, f"{args.comparar}.json"), encoding="utf-8") as ficheiro:
+            baseline = json.load(ficheiro)['resultados']
+
+    resultados = _executar(args)
+    _imprimir(resultados, baseline)
+
+    if args.guardar_baseline:
+        os.makedirs(PASTA_BASELINES, exist_ok=True)
+        caminho = os.path.join(PASTA_BASELINES, f"{args.guardar_baseline}.json")
+        with open(caminho, "w", encoding="utf-8") as ficheiro:
+            json.dump({
+                'data': date.today().isoformat(),
+                'python': platform.python_version(),
+                'sqlite': db_manager.sqlite3.sqlite_version,
+                'maquina': platform.platform(),
+                'usuarios': args.usuarios,
+                'resultados': resultados,
+            }, ficheiro, indent=2, ensure_ascii=False)
+        print(f"\nBaseline guardada em {caminho}")
+
+    if baseline:
+        regressoes = _regressoes(resultados, baseline, args.tolerancia)
+        if regressoes:
+            print(f"\nRegressões acima de {args.tolerancia:.2f}x:")
+            for regressao in regressoes:
+                print(f"  {regressao}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Débito de escrita: registrar_transacao linha a linha vs. registrar_transacoes_em_lote vs. importador CSV.
+
+Uso:
+    python -m benchmarks.bench_ingestao [--linhas 200000] [--linhas-unitarias 2000]
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import db_manager
+import importador
+
+CATEGORIAS = ["Alimentação", "Transporte", "Moradia", "Lazer", "Saúde", "Educação", "Compras", "Outros"]
+
+
+def _transacoes_sinteticas(usuario_id, quantidade, semente=42):
+    gerador = random.Random(semente)
+    inicio = datetime(2020, 1, 1)
+    for i in range(quantidade):
+        tipo = 'deposito' if gerador.random() < 0.2 else 'saque'
+        yield {
+            'usuario_id': usuario_id,
+            'tipo': tipo,
+            'valor': round(gerador.uniform(1, 500), 2),
+            'categoria': gerador.choice(CATEGORIAS) if tipo == 'saque' else None,
+            'data_transacao': inicio + timedelta(minutes=37 * i),
+        }
+
+
+def _preparar_base(diretorio, nome):
+    db_manager.DB_FILE = os.path.join(diretorio, nome)
+    db_manager.inicializar_banco()
+    db_manager.adicionar_usuario(f"bench@{nome}", "x")
+    return db_manager.buscar_usuario_por_email(f"bench@{nome}")['id']
+
+
+def _relatar(nome, linhas, segundos):
+    print(f"{nome:<32} {linhas:>9} linhas  {segundos:8.3f} s  {linhas / segundos:>12,.0f} linhas/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", type=int, default=200_000)
+    parser.add_argument("--linhas-unitarias", type=int, default=2_000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        usuario_id = _preparar_base(diretorio, "unitario.db")
+        inicio = time.perf_counter()
+        for t in _transacoes_sinteticas(usuario_id, args.linhas_unitarias):
+            db_manager.registrar_transacao(usuario_id, t['tipo'], t['valor'], t['categoria'])
+        _relatar("registrar_transacao (1 a 1)", args.linhas_unitarias, time.perf_counter() - inicio)
+
+        usuario_id = _preparar_base(diretorio, "lote.db")
+        inicio = time.perf_counter()
+        db_manager.registrar_transacoes_em_lote(_transacoes_sinteticas(usuario_id, args.linhas))
+        _relatar("registrar_transacoes_em_lote", args.linhas, time.perf_counter() - inicio)
+
+        caminho_csv = os.path.join(diretorio, "extrato.csv")
+        with open(caminho_csv, "w", newline="", encoding="utf-8") as ficheiro:
+            escritor = csv.writer(ficheiro)
+            escritor.writerow(["data", "valor", "tipo", "categoria", "id"])
+            for i, t in enumerate(_transacoes_sinteticas(0, args.linhas)):
+                escritor.writerow([t['data_transacao'].strftime('%Y-%m-%d %H:%M:%S'), f"{t['valor']:.2f}",
+                                   t['tipo'], t['categoria'] or "", i])
+        usuario_id = _preparar_base(diretorio, "csv.db")
+        inicio = time.perf_counter()
+        resultado = importador.importar_csv(caminho_csv, usuario_id)
+        _relatar("importador.importar_csv", resultado['inseridas'], time.perf_counter() - inicio)
+
+        db_manager.fechar_conexoes()
+
+
+if __name__ == "__main__":
+    main()
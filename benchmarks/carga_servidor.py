@@ -0,0 +1,167 @@
+"""Gerador de carga para o servidor de API (servidor.py): pedidos por segundo e latência de cauda.
+
+Abre --clientes ligações ao servidor e, em cada uma, mantém até --profundidade pedidos
+em pipeline durante --duracao segundos. Cada pedido é uma leitura (o dashboard ou a
+primeira página do histórico de um utilizador aleatório) ou, com probabilidade
+--escritas, o registo de um saque. A latência de um pedido vai do envio até à chegada
+da sua resposta.
+
+Sem --endereco, copia uma base de dados de benchmarks.bench_funcoes para uma pasta
+temporária e arranca nela um servidor num subprocesso, numa porta livre. Com
+--endereco, usa um servidor já a correr, cujos utilizadores 1..--usuarios devem existir
+com os emails e a senha de benchmarks.gerador (as escritas ficam nessa base de dados).
+Cada utilizador inicia sessão antes da medição; os pedidos levam o token dela.
+
+Uso:
+    python -m benchmarks.carga_servidor [--endereco http://127.0.0.1:8765] [--clientes 16] [--profundidades 1,8]
+                                        [--duracao 5] [--escritas 0.1] [--usuarios 100] [--escala 100000] [--leitores 4]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.bench_funcoes import _base_da_escala, _percentil
+from benchmarks.gerador import SENHA, email_do_utilizador
+from cliente_api import ClienteAPI
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _pedido(token, operacao, *args, **kwargs):
+    corpo = json.dumps({"args": list(args), "kwargs": kwargs}).encode("utf-8")
+    return (f"POST /{operacao} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+            f"Authorization: Bearer {token}\r\nContent-Length: {len(corpo)}\r\n\r\n").encode("latin-1") + corpo
+
+
+def _pedidos(endereco, usuarios):
+    """Pedidos já codificados: (leituras, escritas), um de cada tipo por utilizador, cada um na sessão do seu."""
+    cliente = ClienteAPI(endereco)
+    senha_hash = hashlib.sha256(SENHA.encode('utf-8')).hexdigest()
+    leituras, escritas = [], []
+    try:
+        for indice in range(1, usuarios + 1):
+            sessao = cliente.chamar("iniciar_sessao", email_do_utilizador(indice), senha_hash)
+            if sessao is None:
+                raise RuntimeError(f"Não foi possível iniciar sessão como {email_do_utilizador(indice)}.")
+            token, usuario_id = sessao['token'], sessao['usuario']['id']
+            leituras.append(_pedido(token, "obter_snapshot_dashboard", usuario_id))
+            leituras.append(_pedido(token, "pesquisar_transacoes", usuario_id, limite=50, contar=False))
+            escritas.append(_pedido(token, "registrar_transacao", usuario_id, "saque", {"$decimal": "0.01"}, "Outros"))
+    finally:
+        cliente.fechar()
+    return leituras, escritas
+
+
+async def _abrir(endereco):
+    if endereco.startswith("unix:"):
+        return await asyncio.open_unix_connection(endereco[len("unix:"):])
+    partes = urlsplit(endereco if "//" in endereco else f"http://{endereco}")
+    return await asyncio.open_connection(partes.hostname, partes.port)
+
+
+async def _ler_resposta(leitor):
+    """Lê uma resposta e devolve o código de estado."""
+    estado = int((await leitor.readline()).split()[1])
+    tamanho = 0
+    while True:
+        linha = await leitor.readline()
+        if linha in (b"\r\n", b""):
+            break
+        nome, _, valor = linha.partition(b":")
+        if nome.strip().lower() == b"content-length":
+            tamanho = int(valor)
+    await leitor.readexactly(tamanho)
+    return estado
+
+
+async def _cliente(endereco, profundidade, fim, pedidos, fracao_escritas, semente, latencias, erros):
+    leitor, escritor = await _abrir(endereco)
+    leituras, escritas = pedidos
+    aleatorio = random.Random(semente)
+    vagas = asyncio.Semaphore(profundidade)
+    envios = asyncio.Queue()
+
+    async def enviar():
+        while time.perf_counter() < fim:
+            await vagas.acquire()
+            escritor.write(aleatorio.choice(escritas if aleatorio.random() < fracao_escritas else leituras))
+            await envios.put(time.perf_counter())
+            await escritor.drain()
+        await envios.put(None)
+
+    async def receber():
+        while (enviado := await envios.get()) is not None:
+            if await _ler_resposta(leitor) != 200:
+                erros.append(1)
+            latencias.append(time.perf_counter() - enviado)
+            vagas.release()
+
+    await asyncio.gather(enviar(), receber())
+    escritor.close()
+
+
+async def _carga(endereco, clientes, profundidade, duracao, pedidos, fracao_escritas):
+    latencias, erros = [], []
+    inicio = time.perf_counter()
+    await asyncio.gather(*(_cliente(endereco, profundidade, inicio + duracao, pedidos, fracao_escritas, indice,
+                                    latencias, erros) for indice in range(clientes)))
+    return time.perf_counter() - inicio, sorted(latencias), len(erros)
+
+
+def _arrancar_servidor(caminho, leitores):
+    processo = subprocess.Popen([sys.executable, "-m", "servidor", "--db", caminho, "--porta", "0", "--leitores", str(leitores)],
+                                cwd=RAIZ, stdout=subprocess.PIPE, text=True)
+    linha = processo.stdout.readline()  # "A servir <db> em <endereço>"
+    if not linha:
+        raise RuntimeError("O servidor não arrancou.")
+    return processo, linha.split()[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endereco", default=None, help="servidor já a correr (por omissão, arranca um)")
+    parser.add_argument("--clientes", type=int, default=16, help="ligações simultâneas")
+    parser.add_argument("--profundidades", type=lambda texto: [int(p) for p in texto.split(",")], default=[1, 8],
+                        help="pedidos em pipeline por ligação, separados por vírgulas")
+    parser.add_argument("--duracao", type=float, default=5, help="segundos por cenário")
+    parser.add_argument("--escritas", type=float, default=0.1, help="fração dos pedidos que são escritas")
+    parser.add_argument("--usuarios", type=int, default=100)
+    parser.add_argument("--escala", type=int, default=100_000, help="transações da base de dados gerada")
+    parser.add_argument("--leitores", type=int, default=4, help="threads de leitura do servidor arrancado")
+    parser.add_argument("--pasta-dados", default=os.path.join(tempfile.gettempdir(), "financial_manager_bench"),
+                        help="onde guardar as bases de dados geradas")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        processo, endereco = None, args.endereco
+        if endereco is None:
+            os.makedirs(args.pasta_dados, exist_ok=True)
+            caminho = os.path.join(pasta, "carga.db")
+            shutil.copy(_base_da_escala(args.pasta_dados, args.escala, args.usuarios), caminho)
+            processo, endereco = _arrancar_servidor(caminho, args.leitores)
+        try:
+            pedidos = _pedidos(endereco, args.usuarios)
+            print(f"{endereco}: {args.clientes} ligações, {args.escritas:.0%} escritas, {args.duracao:g} s por cenário")
+            print(f"{'pipeline':>8} {'pedidos/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} {'erros':>6}")
+            for profundidade in args.profundidades:
+                segundos, latencias, erros = asyncio.run(
+                    _carga(endereco, args.clientes, profundidade, args.duracao, pedidos, args.escritas))
+                print(f"{profundidade:>8} {len(latencias) / segundos:>10,.0f} {_percentil(latencias, 50) * 1000:>8.2f} "
+                      f"{_percentil(latencias, 99) * 1000:>8.2f} {_percentil(latencias, 99.9) * 1000:>9.2f} {erros:>6}")
+        finally:
+            if processo is not None:
+                processo.terminate()
+                processo.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Gerador determinístico de bases de dados de teste para o FinancialManager.
+
+Cria N utilizadores com M transações cada, distribuídas de forma uniforme pelos dias
+até à data `fim` (por omissão, hoje, para que o mês atual do dashboard tenha dados) e
+intercaladas entre utilizadores por ordem cronológica, como numa utilização real. Os
+valores seguem uma distribuição log-normal por categoria, os depósitos concentram-se no
+início do mês (salário) e cada utilizador tem orçamentos para os últimos 12 meses.
+A mesma semente e a mesma data `fim` produzem sempre a mesma base de dados.
+
+Todos os utilizadores têm a senha "senha123", para poderem ser usados na aplicação.
+
+Uso:
+    python -m benchmarks.gerador teste.db [--usuarios 100] [--transacoes 1000] [--semente 42] [--fim 2025-12-31]
+"""
+import argparse
+import hashlib
+import math
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+import db_manager
+
+SENHA = "senha123"
+
+# categoria: (peso, mediana do valor em reais, dispersão log-normal)
+PERFIL_GASTOS = {
+    "Alimentação": (30, 45, 0.6),
+    "Transporte": (20, 25, 0.5),
+    "Compras": (15, 120, 0.9),
+    "Lazer": (12, 70, 0.7),
+    "Outros": (8, 50, 0.8),
+    "Saúde": (6, 110, 0.8),
+    "Educação": (4, 300, 0.5),
+    "Moradia": (5, 900, 0.3),
+}
+PROPORCAO_DEPOSITOS = 0.12
+MESES_ORCAMENTO = 12
+
+
+def email_do_utilizador(indice):
+    return f"utilizador{indice}@exemplo.com"
+
+
+def _transacoes(ids_usuarios, por_usuario, fim, gerador):
+    """Gera as transações dia a dia, intercalando os utilizadores."""
+    categorias = list(PERFIL_GASTOS)
+    pesos = [PERFIL_GASTOS[c][0] for c in categorias]
+    # Cerca de 3 transações por dia e por utilizador, com um mínimo de 60 dias.
+    dias = max(60, math.ceil(por_usuario / 3))
+    inicio = fim - timedelta(days=dias - 1)
+    salarios = {usuario_id: gerador.lognormvariate(math.log(4000), 0.5) for usuario_id in ids_usuarios}
+    for dia in range(dias):
+        data = datetime.combine(inicio + timedelta(days=dia), datetime.min.time())
+        quantidade = (dia + 1) * por_usuario // dias - dia * por_usuario // dias
+        for usuario_id in ids_usuarios:
+            for _ in range(quantidade):
+                momento = data + timedelta(seconds=gerador.randint(7 * 3600, 23 * 3600))
+                if gerador.random() < PROPORCAO_DEPOSITOS:
+                    base = salarios[usuario_id] if data.day <= 7 else salarios[usuario_id] * 0.1
+                    valor, tipo, categoria = gerador.lognormvariate(math.log(base), 0.2), 'deposito', None
+                else:
+                    categoria = gerador.choices(categorias, pesos)[0]
+                    _, mediana, dispersao = PERFIL_GASTOS[categoria]
+                    valor, tipo = gerador.lognormvariate(math.log(mediana), dispersao), 'saque'
+                yield {
+                    'usuario_id': usuario_id,
+                    'tipo': tipo,
+                    'valor': round(max(valor, 0.01), 2),
+                    'categoria': categoria,
+                    'data_transacao': momento,
+                }
+
+
+def _orcamentos(conn, ids_usuarios, fim, gerador):
+    linhas = []
+    for usuario_id in ids_usuarios:
+        ano, mes = fim.year, fim.month
+        for _ in range(MESES_ORCAMENTO):
+            for categoria in gerador.sample(list(PERFIL_GASTOS), 5):
+                _, mediana, _ = PERFIL_GASTOS[categoria]
+                linhas.append((usuario_id, categoria, db_manager._para_centavos(round(mediana * gerador.uniform(5, 40), 2)), mes, ano))
+            ano, mes = (ano - 1, 12) if mes == 1 else (ano, mes - 1)
+    conn.executemany("INSERT OR REPLACE INTO orcamentos (usuario_id, categoria, valor, mes, ano) VALUES (?, ?, ?, ?, ?)", linhas)
+
+
+def gerar_base(caminho, usuarios=100, transacoes_por_usuario=1000, semente=42, fim=None):
+    """Preenche a base de dados em `caminho` (que deve ser nova). Devolve a lista de ids de utilizador."""
+    fim = fim or date.today()
+    gerador = random.Random(semente)
+    db_manager.DB_FILE = caminho
+    db_manager.inicializar_banco()
+    conn = db_manager.obter_conexao()
+
+    senha_hash = hashlib.sha256(SENHA.encode('utf-8')).hexdigest()
+    conn.execute("BEGIN TRANSACTION")
+    conn.executemany("INSERT OR IGNORE INTO usuarios (email, senha_hash) VALUES (?, ?)",
+                     ((email_do_utilizador(i), senha_hash) for i in range(1, usuarios + 1)))
+    ids_usuarios = [conn.execute("SELECT id FROM usuarios WHERE email = ?", (email_do_utilizador(i),)).fetchone()[0]
+                    for i in range(1, usuarios + 1)]
+    _orcamentos(conn, ids_usuarios, fim, gerador)
+    conn.commit()
+
+    resultado = db_manager.registrar_transacoes_em_lote(_transacoes(ids_usuarios, transacoes_por_usuario, fim, gerador))
+    if not resultado['sucesso']:
+        raise RuntimeError(resultado['mensagem'])
+    db_manager.atualizar_checkpoints_saldo()
+    conn.execute("ANALYZE")
+    return ids_usuarios
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("ficheiro", help="base de dados a criar")
+    parser.add_argument("--usuarios", type=int, default=100)
+    parser.add_argument("--transacoes", type=int, default=1000, help="transações por utilizador")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--fim", type=date.fromisoformat, default=None, help="data da última transação (AAAA-MM-DD)")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.ficheiro):
+        print(f"O ficheiro já existe: {args.ficheiro}")
+        return 1
+    gerar_base(args.ficheiro, args.usuarios, args.transacoes, args.semente, args.fim)
+    print(f"{args.ficheiro}: {args.usuarios} utilizadores x {args.transacoes} transações (senha: {SENHA})")
+    db_manager.fechar_conexoes()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Teste de stress das transferências: vários processos a transferir em simultâneo na mesma base de dados.
+
+Cria uma base de dados temporária com --usuarios utilizadores, cada um com um depósito
+inicial, e lança --processos processos que fazem --transferencias transferências cada,
+entre pares de utilizadores e com valores aleatórios. Enquanto correm, o processo
+principal lê repetidamente a soma dos saldos, que nunca pode mudar. No fim verifica
+ainda que nenhum saldo é negativo, que cada saldo é igual ao que as transações do
+utilizador dão e que o agregado mensal está consistente.
+
+Com --busy-timeout-ms baixo, os conflitos de bloqueio chegam à aplicação e exercitam as
+repetições com espera aleatória de db_manager._iniciar_escrita.
+
+Uso:
+    python -m benchmarks.stress_transferencias [--processos 8] [--transferencias 500] [--usuarios 20]
+                                               [--busy-timeout-ms 5000] [--semente 42]
+
+Termina com código 1 se alguma verificação falhar.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import db_manager
+from benchmarks import gerador
+
+DEPOSITO_INICIAL = 1000
+
+
+def _preparar_base(caminho, usuarios):
+    db_manager.DB_FILE = caminho
+    db_manager.inicializar_banco()
+    for indice in range(1, usuarios + 1):
+        db_manager.adicionar_usuario(gerador.email_do_utilizador(indice), "-")
+        usuario = db_manager.buscar_usuario_por_email(gerador.email_do_utilizador(indice))
+        db_manager.registrar_transacao(usuario['id'], 'deposito', DEPOSITO_INICIAL)
+    db_manager.fechar_conexoes()
+
+
+def _trabalhador(caminho, usuarios, transferencias, semente, busy_timeout_ms):
+    """Corre num processo do conjunto; devolve as contagens de resultados."""
+    db_manager.DB_FILE = caminho
+    db_manager.obter_conexao().execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    gerador_aleatorio = random.Random(semente)
+    contagens = {'sucesso': 0, 'recusadas': 0, 'erros': 0, 'repeticoes': 0}
+    for _ in range(transferencias):
+        remetente, destinatario = gerador_aleatorio.sample(range(1, usuarios + 1), 2)
+        valor = round(gerador_aleatorio.uniform(0.01, 200), 2)
+        resultado = db_manager.registrar_transferencia(remetente, gerador.email_do_utilizador(destinatario), valor)
+        if resultado['sucesso']:
+            contagens['sucesso'] += 1
+        elif 'repeticoes' in resultado:
+            contagens['recusadas'] += 1  # saldo insuficiente
+        else:
+            contagens['erros'] += 1
+        contagens['repeticoes'] += resultado.get('repeticoes', 0)
+    contagens['escritas'] = db_manager.estatisticas_escritas().get('registrar_transferencia', {})
+    db_manager.fechar_conexoes()
+    return contagens
+
+
+def _soma_saldos(conn):
+    return conn.execute("SELECT SUM(saldo) FROM usuarios").fetchone()[0]
+
+
+def _verificar_final(conn, soma_esperada, sucessos):
+    falhas = []
+    soma = _soma_saldos(conn)
+    if soma != soma_esperada:
+        falhas.append(f"soma dos saldos {soma} != {soma_esperada}")
+    negativos = conn.execute("SELECT COUNT(*) FROM usuarios WHERE saldo < 0").fetchone()[0]
+    if negativos:
+        falhas.append(f"{negativos} utilizadores com saldo negativo")
+    divergentes = conn.execute("""
+        SELECT COUNT(*) FROM usuarios u
+        WHERE u.saldo != (SELECT COALESCE(SUM(CASE WHEN tipo = 'deposito' THEN valor ELSE -valor END), 0)
+                          FROM transacoes t WHERE t.usuario_id = u.id)
+    """).fetchone()[0]
+    if divergentes:
+        falhas.append(f"{divergentes} saldos diferentes da soma das transações")
+    registadas = conn.execute("SELECT COUNT(*) FROM transacoes WHERE categoria LIKE 'Transferência%'").fetchone()[0]
+    if registadas != 2 * sucessos:
+        falhas.append(f"{registadas} transações de transferência para {sucessos} transferências")
+    if db_manager.verificar_resumo_mensal():
+        falhas.append("agregado mensal inconsistente")
+    return falhas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processos", type=int, default=8)
+    parser.add_argument("--transferencias", type=int, default=500, help="transferências por processo")
+    parser.add_argument("--usuarios", type=int, default=20)
+    parser.add_argument("--busy-timeout-ms", type=int, default=5000, help="busy_timeout das conexões dos processos")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, "stress.db")
+        _preparar_base(caminho, args.usuarios)
+        conn = db_manager.obter_conexao()
+        soma_inicial = _soma_saldos(conn)
+        somas_lidas, somas_erradas = 0, 0
+
+        inicio = time.perf_counter()
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=args.processos, mp_context=contexto) as conjunto:
+            pendentes = {conjunto.submit(_trabalhador, caminho, args.usuarios, args.transferencias,
+                                         args.semente + indice, args.busy_timeout_ms)
+                         for indice in range(args.processos)}
+            resultados = []
+            while pendentes:
+                concluidos, pendentes = wait(pendentes, timeout=0.01, return_when=FIRST_COMPLETED)
+                resultados.extend(futuro.result() for futuro in concluidos)
+                somas_lidas += 1
+                somas_erradas += _soma_saldos(conn) != soma_inicial
+        duracao = time.perf_counter() - inicio
+
+        total = {chave: sum(r[chave] for r in resultados) for chave in ('sucesso', 'recusadas', 'erros', 'repeticoes')}
+        max_repeticoes = max((r['escritas'].get('max_repeticoes', 0) for r in resultados), default=0)
+        print(f"{args.processos} processos x {args.transferencias} transferências em {duracao:.1f} s "
+              f"({args.processos * args.transferencias / duracao:,.0f}/s)")
+        print(f"  concluídas: {total['sucesso']}, recusadas por saldo: {total['recusadas']}, erros: {total['erros']}")
+        print(f"  repetições por base de dados ocupada: {total['repeticoes']} (máx. {max_repeticoes} numa transferência)")
+        print(f"  soma dos saldos lida {somas_lidas} vezes durante o teste")
+
+        falhas = _verificar_final(conn, soma_inicial, total['sucesso'])
+        if somas_erradas:
+            falhas.append(f"a soma dos saldos mudou em {somas_erradas} leituras durante o teste")
+        db_manager.fechar_conexoes()
+
+    for falha in falhas:
+        print(f"FALHA: {falha}")
+    if not falhas:
+        print("OK: o dinheiro total manteve-se constante.")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""Cache LRU de tamanho limitado, segura para várias threads."""
+import threading
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """Guarda até `capacidade` entradas; ao exceder, descarta a usada há mais tempo."""
+
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave, padrao=None):
+        with self._lock:
+            if chave in self._entradas:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return self._entradas[chave]
+            self.falhas += 1
+            return padrao
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._entradas[chave] = valor
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
@@ -0,0 +1,188 @@
+"""Cliente do servidor de API (servidor.py), com as mesmas funções do db_manager.
+
+Com FM_SERVIDOR definido, a aplicação usa um ClienteAPI em vez de abrir a base de dados
+diretamente. Cada chamada é um pedido POST /<operação> com {"args": [...], "kwargs": {...}}
+em JSON; a resposta traz {"resultado": ...} ou {"erro": ..., "tipo": ...}. Decimal, datas
+e tuplos não existem em JSON e vão marcados (ver codificar/descodificar); as linhas
+sqlite3.Row chegam como dicionários, com o mesmo acesso por nome de coluna.
+
+Endereços: "http://127.0.0.1:8765", "127.0.0.1:8765" ou "unix:/caminho/do/socket".
+
+As operações são sempre do utilizador da sessão aberta com iniciar_sessao: o servidor
+ignora o usuario_id indicado (e recusa um diferente do da sessão).
+
+Uso:
+    banco = ClienteAPI("http://127.0.0.1:8765")
+    usuario = banco.iniciar_sessao(email, senha_hash)
+    banco.registrar_transacao(usuario['id'], 'saque', Decimal("12.50"), "Lazer")
+"""
+import http.client
+import json
+import socket
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+
+# Operações que o servidor expõe. Só as de leitura são repetidas quando uma ligação
+# persistente cai a meio de um pedido: uma escrita pode já ter sido feita no servidor.
+OPERACOES_LEITURA = frozenset({
+    "iniciar_sessao", "versao_dados", "obter_saldo", "obter_historico", "obter_pagina_historico",
+    "pesquisar_transacoes", "obter_gastos_por_categoria", "obter_categorias_usuario", "obter_resumo_mensal",
+    "obter_top_categorias", "obter_ultimas_transacoes", "obter_snapshot_dashboard", "obter_transacao_por_id",
+    "obter_orcamentos_do_mes", "obter_gastos_vs_orcamentos", "obter_alertas_orcamento",
+    "obter_transacoes_recorrentes", "obter_fluxo_caixa",
+})
+OPERACOES_ESCRITA = frozenset({
+    "cadastrar_usuario", "encerrar_sessao", "registrar_transacao", "registrar_transferencia", "registrar_transacoes_em_lote",
+    "editar_transacao", "excluir_transacao", "excluir_transacoes", "recategorizar_transacoes",
+    "definir_ou_atualizar_orcamento", "excluir_orcamento", "marcar_alertas_vistos", "atualizar_checkpoints_saldo",
+    "adicionar_transacao_recorrente", "excluir_transacao_recorrente", "materializar_transacoes_recorrentes",
+})
+
+_TIPOS_JSON = frozenset({str, int, float, bool, type(None)})
+
+
+class ErroAPI(Exception):
+    """O servidor não conseguiu executar a operação (operação desconhecida ou erro interno)."""
+
+
+def codificar(valor):
+    """Converte `valor` em algo que json.dumps aceita, marcando os tipos que o JSON não tem."""
+    tipo = type(valor)  # comparação exata de tipos: bem mais rápida do que isinstance em cadeia
+    if tipo in _TIPOS_JSON:
+        return valor
+    if tipo is dict:
+        return {chave: codificar(item) for chave, item in valor.items()}
+    if tipo is list:
+        return [codificar(item) for item in valor]
+    if tipo is Decimal:
+        return {"$decimal": str(valor)}
+    if tipo is tuple:
+        return {"$tuplo": [codificar(item) for item in valor]}
+    if tipo is sqlite3.Row:
+        return {chave: codificar(valor[chave]) for chave in valor.keys()}
+    if tipo is datetime:
+        return {"$datahora": valor.isoformat()}
+    if tipo is date:
+        return {"$data": valor.isoformat()}
+    raise TypeError(f"Tipo não suportado pela API: {tipo.__name__}")
+
+
+def descodificar(valor):
+    """Inverso de codificar."""
+    if isinstance(valor, list):
+        return [descodificar(item) for item in valor]
+    if isinstance(valor, dict):
+        if len(valor) == 1:
+            (marca, conteudo), = valor.items()
+            if marca == "$decimal":
+                return Decimal(conteudo)
+            if marca == "$datahora":
+                return datetime.fromisoformat(conteudo)
+            if marca == "$data":
+                return date.fromisoformat(conteudo)
+            if marca == "$tuplo":
+                return tuple(descodificar(item) for item in conteudo)
+        return {chave: descodificar(item) for chave, item in valor.items()}
+    return valor
+
+
+class _LigacaoUnix(http.client.HTTPConnection):
+    def __init__(self, caminho, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self._caminho = caminho
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._caminho)
+
+
+class ClienteAPI:
+    """Chama as operações do db_manager no servidor; seguro entre threads (uma ligação persistente por thread)."""
+
+    def __init__(self, endereco, tempo_limite=30):
+        self.endereco = endereco
+        self.tempo_limite = tempo_limite
+        if endereco.startswith("unix:"):
+            self._nova_ligacao = lambda: _LigacaoUnix(endereco[len("unix:"):], tempo_limite)
+        else:
+            partes = urlsplit(endereco if "//" in endereco else f"http://{endereco}")
+            self._nova_ligacao = lambda: http.client.HTTPConnection(partes.hostname, partes.port, timeout=tempo_limite)
+        self._local = threading.local()
+        self._token = None
+
+    def iniciar_sessao(self, email, senha_hash):
+        """Confere a senha no servidor; devolve {'id', 'email'} do utilizador (e guarda a sessão), ou None."""
+        sessao = self.chamar("iniciar_sessao", email, senha_hash)
+        if sessao is None:
+            return None
+        self._token = sessao['token']
+        return sessao['usuario']
+
+    def encerrar_sessao(self):
+        if self._token is not None:
+            try:
+                self.chamar("encerrar_sessao")
+            finally:
+                self._token = None
+
+    def __getattr__(self, nome):
+        if nome.startswith("_"):
+            raise AttributeError(nome)
+
+        def operacao(*args, **kwargs):
+            return self.chamar(nome, *args, **kwargs)
+        operacao.__name__ = nome
+        setattr(self, nome, operacao)  # as chamadas seguintes não passam por __getattr__
+        return operacao
+
+    def chamar(self, operacao, *args, **kwargs):
+        corpo = json.dumps({"args": codificar(list(args)), "kwargs": codificar(kwargs)}).encode("utf-8")
+        estado, resposta = self._pedir(f"/{operacao}", corpo, repetivel=operacao in OPERACOES_LEITURA)
+        if estado == 200:
+            return descodificar(resposta["resultado"])
+        if resposta.get("tipo") in ("ValueError", "TypeError", "PermissionError"):
+            raise {"ValueError": ValueError, "TypeError": TypeError,
+                   "PermissionError": PermissionError}[resposta["tipo"]](resposta["erro"])
+        raise ErroAPI(f"{operacao}: {resposta.get('erro', estado)}")
+
+    def _pedir(self, caminho, corpo, repetivel=False):
+        ligacao = getattr(self._local, "ligacao", None)
+        reutilizada = ligacao is not None
+        if ligacao is None:
+            ligacao = self._local.ligacao = self._nova_ligacao()
+        enviado = False
+        try:
+            cabecalhos = {"Content-Type": "application/json"}
+            if self._token is not None:
+                cabecalhos["Authorization"] = f"Bearer {self._token}"
+            ligacao.request("POST", caminho, corpo, cabecalhos)
+            enviado = True
+            resposta = ligacao.getresponse()
+            dados = resposta.read()
+            estado = resposta.status
+            conteudo = json.loads(dados)
+        except BaseException as e:
+            # Uma ligação que falhou a meio (tempo esgotado, ligação cortada, resposta
+            # ilegível) fica num estado inutilizável: descarta-se, e o pedido seguinte
+            # desta thread abre uma nova.
+            ligacao.close()
+            self._local.ligacao = None
+            # Uma ligação persistente pode ter sido fechada do outro lado (ex.: o servidor
+            # reiniciou). Repete-se uma vez numa ligação nova só se o pedido não chegou a
+            # sair ou se é uma leitura: uma escrita pode ter sido feita antes de a ligação cair.
+            if (reutilizada and isinstance(e, (ConnectionError, http.client.BadStatusLine))
+                    and (repetivel or not enviado)):
+                return self._pedir(caminho, corpo, repetivel)
+            raise
+        return estado, conteudo
+
+    def fechar(self):
+        ligacao = getattr(self._local, "ligacao", None)
+        if ligacao is not None:
+            ligacao.close()
+            self._local.ligacao = None
@@ -1,70 +1,1288 @@
 import sqlite3
 import os
-from datetime import datetime
+import atexit
+import calendar
+import functools
+import json
+import random
+import threading
+import time
+from datetime import datetime, date, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from cache_lru import CacheLRU
 
 # --- Configurações da Base de Dados ---
 DB_FILE = "financial_manager.db"
 
+# Afinação aplicada uma única vez, no momento em que cada conexão é aberta.
+PRAGMAS_CONEXAO = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -32000",       # ~32 MB de cache de páginas por conexão
+    "PRAGMA mmap_size = 268435456",     # até 256 MB do ficheiro mapeados em memória
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+CACHE_INSTRUCOES = 256  # instruções preparadas mantidas em cache por conexão
+
+# Os valores monetários são guardados como INTEGER em centavos, o que torna exatos os
+# saldos acumulados e as somas. Nas consultas, uma coluna com o alias "nome [centavos]"
+# é devolvida como Decimal em reais pelo conversor registado abaixo.
+def _de_centavos(centavos):
+    return Decimal(int(centavos)).scaleb(-2)
+
+sqlite3.register_converter("centavos", _de_centavos)
+ZERO_REAIS = Decimal("0.00")
+
+# Cada thread reutiliza a sua própria conexão persistente; todas ficam registadas
+# para poderem ser fechadas em conjunto (no fim do programa ou ao trocar de DB_FILE).
+_local = threading.local()
+_conexoes_abertas = []
+_lock_conexoes = threading.Lock()
+_geracao_conexoes = 0
+_rastreio_sql = None  # trace callback ligado pela instrumentação (instrumentacao.py)
+
+# Versão dos dados de cada utilizador neste processo, incrementada depois de cada escrita
+# confirmada que o afeta. Serve de carimbo às caches de resultados: uma entrada guardada
+# com uma versão antiga deixa simplesmente de ser encontrada.
+_versoes_dados = {}
+_lock_versoes = threading.Lock()
+
+# Escritas: cada transação de escrita pede o bloqueio logo no início (BEGIN IMMEDIATE).
+# Uma transação diferida que lê e só depois escreve falha com "database is locked" sem
+# esperar pelo busy_timeout se outra conexão escrever entretanto, e o que leu pode já estar
+# desatualizado. Se o bloqueio continuar ocupado depois do busy_timeout, o pedido é
+# repetido após uma espera aleatória que cresce exponencialmente.
+MAX_REPETICOES_ESCRITA = 4
+ESPERA_BASE_ESCRITA_S = 0.02
+ESPERA_MAX_ESCRITA_S = 1.0
+_estatisticas_escritas = {}
+_lock_estatisticas_escritas = threading.Lock()
+
+# Cache de resultados das leituras do dashboard, relatórios e orçamentos (ver _em_cache).
+TAMANHO_CACHE_RESULTADOS = 512
+_cache_resultados = CacheLRU(TAMANHO_CACHE_RESULTADOS)
+_AUSENTE = object()
+
 def criar_conexao():
-    """Cria e retorna uma conexão com a base de dados SQLite."""
+    """Cria e retorna uma nova conexão com a base de dados SQLite, já afinada."""
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = sqlite3.connect(DB_FILE, isolation_level=None, check_same_thread=False,
+                               cached_statements=CACHE_INSTRUCOES, detect_types=sqlite3.PARSE_COLNAMES)
         conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS_CONEXAO:
+            conn.execute(pragma)
+        if _rastreio_sql is not None:
+            conn.set_trace_callback(_rastreio_sql)
         return conn
     except sqlite3.Error as e:
         print(f"Erro ao conectar ao SQLite: {e}")
         return None
 
+def obter_conexao():
+    """Devolve a conexão persistente da thread atual, abrindo-a na primeira utilização."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.geracao == _geracao_conexoes and _local.db_file == DB_FILE:
+        return conn
+    conn = criar_conexao()
+    if conn is None: return None
+    with _lock_conexoes:
+        _conexoes_abertas.append(conn)
+        _local.conn, _local.geracao, _local.db_file = conn, _geracao_conexoes, DB_FILE
+    return conn
+
+def fechar_conexoes():
+    """Fecha todas as conexões persistentes; a próxima chamada em cada thread abre uma nova."""
+    global _geracao_conexoes
+    with _lock_conexoes:
+        _geracao_conexoes += 1
+        for conn in _conexoes_abertas:
+            try:
+                conn.execute("PRAGMA optimize")  # atualiza as estatísticas usadas pelo planeador
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _conexoes_abertas.clear()
+    _cache_resultados.limpar()
+
+atexit.register(fechar_conexoes)
+
+def versao_dados(usuario_id):
+    """Carimbo dos dados do utilizador; muda sempre que uma escrita deste processo os altera."""
+    return _versoes_dados.get(usuario_id, 0)
+
+def _dados_alterados(*usuarios_ids):
+    with _lock_versoes:
+        for usuario_id in usuarios_ids:
+            _versoes_dados[usuario_id] = _versoes_dados.get(usuario_id, 0) + 1
+
+def _base_ocupada(erro):
+    """Verdadeiro para erros transitórios de bloqueio (SQLITE_BUSY/SQLITE_LOCKED e os seus códigos estendidos)."""
+    return (isinstance(erro, sqlite3.OperationalError)
+            and erro.sqlite_errorcode & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED))
+
+def _iniciar_escrita(conn, operacao):
+    """Abre uma transação de escrita em `conn`, repetindo com espera aleatória enquanto a base de dados estiver ocupada.
+
+    Devolve o número de repetições; ao fim de MAX_REPETICOES_ESCRITA propaga o erro.
+    """
+    repeticoes = 0
+    while True:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            break
+        except sqlite3.OperationalError as e:
+            if not _base_ocupada(e) or repeticoes >= MAX_REPETICOES_ESCRITA:
+                _registar_escrita(operacao, repeticoes, desistiu=True)
+                raise
+            repeticoes += 1
+            time.sleep(random.uniform(0, min(ESPERA_MAX_ESCRITA_S, ESPERA_BASE_ESCRITA_S * 2 ** repeticoes)))
+    _registar_escrita(operacao, repeticoes)
+    return repeticoes
+
+def _registar_escrita(operacao, repeticoes, desistiu=False):
+    with _lock_estatisticas_escritas:
+        estatistica = _estatisticas_escritas.setdefault(operacao, {'transacoes': 0, 'repeticoes': 0, 'max_repeticoes': 0, 'desistencias': 0})
+        estatistica['transacoes'] += 1
+        estatistica['repeticoes'] += repeticoes
+        estatistica['max_repeticoes'] = max(estatistica['max_repeticoes'], repeticoes)
+        estatistica['desistencias'] += desistiu
+
+def estatisticas_escritas():
+    """Por operação de escrita: transações, repetições por base de dados ocupada e desistências."""
+    with _lock_estatisticas_escritas:
+        return {operacao: dict(estatistica) for operacao, estatistica in _estatisticas_escritas.items()}
+
+def _copia(resultado):
+    """Cópia das listas e dicionários de um resultado, para quem o recebe não alterar a cache."""
+    if isinstance(resultado, list):
+        return [_copia(item) for item in resultado]
+    if isinstance(resultado, dict):
+        return {chave: _copia(valor) for chave, valor in resultado.items()}
+    return resultado
+
+def _leitura_falhou(padrao):
+    """Devolve `padrao`, marcando a leitura em curso como falhada para não ir para a cache."""
+    _local.leitura_falhou = True
+    return padrao
+
+def _em_cache(funcao):
+    """Memoriza funcao(usuario_id, ...) por função, utilizador e argumentos.
+
+    A chave inclui a versão dos dados do utilizador (ver versao_dados), a base de dados e
+    o mês atual, pelo que uma escrita que o afete ou a mudança de mês invalidam as
+    entradas antigas; estas acabam por sair pela política LRU. Escritas feitas por outros
+    processos não são vistas: use limpar_cache_resultados() nesse caso.
+    """
+    @functools.wraps(funcao)
+    def com_cache(usuario_id, *args, **kwargs):
+        chave = (funcao.__name__, usuario_id, versao_dados(usuario_id), DB_FILE, _mes_atual(),
+                 args, tuple(sorted(kwargs.items())))
+        resultado = _cache_resultados.obter(chave, _AUSENTE)
+        if resultado is _AUSENTE:
+            _local.leitura_falhou = False
+            resultado = funcao(usuario_id, *args, **kwargs)
+            if not _local.leitura_falhou:
+                _cache_resultados.guardar(chave, resultado)
+        return _copia(resultado)
+    return com_cache
+
+def estatisticas_cache():
+    """Acertos, falhas e ocupação da cache de resultados."""
+    return {'acertos': _cache_resultados.acertos, 'falhas': _cache_resultados.falhas,
+            'entradas': len(_cache_resultados), 'capacidade': _cache_resultados.capacidade}
+
+def limpar_cache_resultados():
+    _cache_resultados.limpar()
+
+def definir_rastreio_sql(callback):
+    """Liga (ou desliga, com None) um trace callback em todas as conexões, atuais e futuras."""
+    global _rastreio_sql
+    with _lock_conexoes:
+        _rastreio_sql = callback
+        for conn in _conexoes_abertas:
+            conn.set_trace_callback(callback)
+
+# Índices secundários. Todas as consultas filtram por intervalo sobre a coluna
+# data_transacao em bruto, para que estes índices possam ser usados.
+INDICES = (
+    "CREATE INDEX IF NOT EXISTS idx_transacoes_usuario_data ON transacoes (usuario_id, data_transacao)",
+    "CREATE INDEX IF NOT EXISTS idx_transacoes_usuario_tipo_categoria ON transacoes (usuario_id, tipo, categoria, data_transacao, valor)",
+    # Identificador de origem (ex.: FITID de um extrato OFX) usado para ignorar importações repetidas.
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_transacoes_usuario_externo ON transacoes (usuario_id, id_externo) WHERE id_externo IS NOT NULL",
+)
+
+# Definição das tabelas; {nome} permite criar a cópia usada na migração para centavos.
+SQL_TABELA_USUARIOS = """
+    CREATE TABLE IF NOT EXISTS {nome} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT NOT NULL UNIQUE,
+        senha_hash TEXT NOT NULL,
+        saldo INTEGER NOT NULL DEFAULT 0,
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+SQL_TABELA_TRANSACOES = """
+    CREATE TABLE IF NOT EXISTS {nome} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        tipo TEXT NOT NULL CHECK(tipo IN ('deposito', 'saque')),
+        valor INTEGER NOT NULL,
+        categoria TEXT,
+        data_transacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        id_externo TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+    )
+"""
+
+SQL_TABELA_ORCAMENTOS = """
+    CREATE TABLE IF NOT EXISTS {nome} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        categoria TEXT NOT NULL,
+        valor INTEGER NOT NULL,
+        mes INTEGER NOT NULL,
+        ano INTEGER NOT NULL,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE,
+        UNIQUE (usuario_id, categoria, mes, ano)
+    )
+"""
+
+# Alertas de orçamento: um por orçamento e limiar (percentagem de LIMIARES_ALERTA_ORCAMENTO),
+# registado na escrita que fez o gasto do mês chegar ao limiar e apagado se o gasto voltar
+# a ficar abaixo dele. `gasto` e `orcamento` são os valores no momento do alerta.
+SQL_TABELA_ALERTAS_ORCAMENTO = """
+    CREATE TABLE IF NOT EXISTS {nome} (
+        usuario_id INTEGER NOT NULL,
+        ano INTEGER NOT NULL,
+        mes INTEGER NOT NULL,
+        categoria TEXT NOT NULL,
+        limiar INTEGER NOT NULL,
+        gasto INTEGER NOT NULL,
+        orcamento INTEGER NOT NULL,
+        data_alerta TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        visto INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (usuario_id, ano, mes, categoria, limiar),
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+"""
+LIMIARES_ALERTA_ORCAMENTO = (80, 100)
+
+# Transações recorrentes (salário, renda, assinaturas). `dia` é o dia do mês (1-31, o
+# último dia nos meses mais curtos) na frequência 'mensal' e o dia da semana (0 = segunda)
+# na 'semanal'. `proxima` é a próxima ocorrência ainda por lançar, avançada na mesma
+# transação que lança as ocorrências vencidas (ver materializar_transacoes_recorrentes).
+SQL_TABELA_RECORRENTES = """
+    CREATE TABLE IF NOT EXISTS {nome} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        tipo TEXT NOT NULL CHECK(tipo IN ('deposito', 'saque')),
+        valor INTEGER NOT NULL,
+        categoria TEXT,
+        frequencia TEXT NOT NULL CHECK(frequencia IN ('mensal', 'semanal')),
+        dia INTEGER NOT NULL,
+        data_inicio DATE NOT NULL,
+        data_fim DATE,
+        proxima DATE NOT NULL,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+    )
+"""
+INDICES_RECORRENTES = (
+    "CREATE INDEX IF NOT EXISTS idx_recorrentes_usuario_proxima ON transacoes_recorrentes (usuario_id, proxima)",
+    "CREATE INDEX IF NOT EXISTS idx_recorrentes_proxima ON transacoes_recorrentes (proxima)",
+)
+FREQUENCIAS_RECORRENCIA = ('mensal', 'semanal')
+
+# Agregado mensal mantido na mesma transação de cada escrita em `transacoes`.
+# A categoria vazia ('') representa transações sem categoria (os depósitos).
+SQL_TABELA_RESUMO = """
+    CREATE TABLE IF NOT EXISTS {nome} (
+        usuario_id INTEGER NOT NULL,
+        ano INTEGER NOT NULL,
+        mes INTEGER NOT NULL,
+        tipo TEXT NOT NULL,
+        categoria TEXT NOT NULL DEFAULT '',
+        total INTEGER NOT NULL DEFAULT 0,
+        quantidade INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (usuario_id, ano, mes, tipo, categoria)
+    ) WITHOUT ROWID
+"""
+
+# Saldo de referência de um utilizador: `saldo` é a soma das suas transações até à
+# posição (data_transacao, transacao_id), inclusive, na ordem do histórico. Criados de
+# INTERVALO_CHECKPOINT em INTERVALO_CHECKPOINT transações por atualizar_checkpoints_saldo;
+# uma escrita numa posição anterior apaga os checkpoints que deixam de estar certos.
+SQL_TABELA_CHECKPOINTS = """
+    CREATE TABLE IF NOT EXISTS {nome} (
+        usuario_id INTEGER NOT NULL,
+        data_transacao TIMESTAMP NOT NULL,
+        transacao_id INTEGER NOT NULL,
+        saldo INTEGER NOT NULL,
+        PRIMARY KEY (usuario_id, data_transacao, transacao_id),
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+"""
+INTERVALO_CHECKPOINT = 100
+VARIACAO_SALDO = "CASE WHEN tipo = 'deposito' THEN valor ELSE -valor END"
+
+# Arquivo de dados frios: as transações antigas vão para ficheiros SQLite ao lado de
+# DB_FILE, um por ano até MAX_FICHEIROS_ARQUIVO; a partir daí, os anos mais antigos
+# partilham um ficheiro. `arquivos` tem uma linha por ano, com o ficheiro onde está. Cada
+# ficheiro é escrito por lotes numerados; `lote` é o último lote publicado do ficheiro
+# (igual em todos os seus anos), e as consultas só veem as linhas dos lotes publicados
+# (ver arquivar_transacoes). data_min/data_max delimitam as datas publicadas do ano.
+SQL_TABELA_ARQUIVOS = """
+    CREATE TABLE IF NOT EXISTS {nome} (
+        ano INTEGER PRIMARY KEY,
+        ficheiro TEXT NOT NULL,
+        lote INTEGER NOT NULL DEFAULT 0,
+        data_min TIMESTAMP,
+        data_max TIMESTAMP
+    )
+"""
+# Tabela `transacoes` de cada ficheiro de arquivo (sem chaves estrangeiras: os
+# utilizadores ficam na base de dados principal).
+SQL_TABELA_TRANSACOES_ARQUIVO = """
+    CREATE TABLE IF NOT EXISTS transacoes (
+        id INTEGER PRIMARY KEY,
+        usuario_id INTEGER NOT NULL,
+        tipo TEXT NOT NULL,
+        valor INTEGER NOT NULL,
+        categoria TEXT,
+        data_transacao TIMESTAMP,
+        id_externo TEXT,
+        lote INTEGER NOT NULL
+    )
+"""
+INDICES_ARQUIVO = (
+    "CREATE INDEX IF NOT EXISTS idx_arquivo_usuario_data ON transacoes (usuario_id, data_transacao, lote)",
+    "CREATE INDEX IF NOT EXISTS idx_arquivo_usuario_tipo_categoria ON transacoes (usuario_id, tipo, categoria, data_transacao, valor, lote)",
+)
+COLUNAS_TRANSACAO = "id, usuario_id, tipo, valor, categoria, data_transacao, id_externo"
+ARQUIVAR_APOS_DIAS = 730
+TIPOS_TRANSACAO = ('deposito', 'saque')
+# Ordens da pesquisa de transações: nome -> (coluna, sentido). O id desempata e serve de
+# segunda componente do cursor da paginação por chave.
+ORDENS_PESQUISA = {
+    'data_desc': ('data_transacao', 'DESC'),
+    'data_asc': ('data_transacao', 'ASC'),
+    'valor_desc': ('valor', 'DESC'),
+    'valor_asc': ('valor', 'ASC'),
+}
+# Uma conexão SQLite anexa no máximo 10 bases de dados (limite de compilação habitual).
+MAX_FICHEIROS_ARQUIVO = 9
+
+# Tabelas com valores monetários: (nome, definição, colunas em centavos).
+TABELAS_DINHEIRO = (
+    ('usuarios', SQL_TABELA_USUARIOS, ('saldo',)),
+    ('transacoes', SQL_TABELA_TRANSACOES, ('valor',)),
+    ('orcamentos', SQL_TABELA_ORCAMENTOS, ('valor',)),
+    ('resumo_mensal', SQL_TABELA_RESUMO, ('total',)),
+)
+
+# Durante a cópia por lotes de `transacoes`, alterações a linhas já copiadas são
+# repetidas na tabela nova. Linhas inseridas entretanto têm ids maiores e são
+# apanhadas pelos lotes seguintes.
+GATILHOS_MIGRACAO = (
+    """CREATE TRIGGER IF NOT EXISTS migracao_centavos_update AFTER UPDATE ON transacoes BEGIN
+        UPDATE transacoes_centavos
+        SET usuario_id = NEW.usuario_id, tipo = NEW.tipo, valor = CAST(ROUND(NEW.valor * 100) AS INTEGER),
+            categoria = NEW.categoria, data_transacao = NEW.data_transacao, id_externo = NEW.id_externo
+        WHERE id = OLD.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS migracao_centavos_delete AFTER DELETE ON transacoes BEGIN
+        DELETE FROM transacoes_centavos WHERE id = OLD.id;
+    END""",
+)
+
+SQL_COPIAR_LOTE_TRANSACOES = """
+    INSERT INTO transacoes_centavos (id, usuario_id, tipo, valor, categoria, data_transacao, id_externo)
+    SELECT id, usuario_id, tipo, CAST(ROUND(valor * 100) AS INTEGER), categoria, data_transacao, id_externo
+    FROM transacoes WHERE id > ? ORDER BY id LIMIT ?
+"""
+
+SQL_APLICAR_RESUMO = """
+    INSERT INTO resumo_mensal (usuario_id, ano, mes, tipo, categoria, total, quantidade)
+    SELECT usuario_id,
+           CAST(substr(data_transacao, 1, 4) AS INTEGER),
+           CAST(substr(data_transacao, 6, 2) AS INTEGER),
+           tipo, COALESCE(categoria, ''), ? * SUM(valor), ? * COUNT(*)
+    FROM {fonte}
+    WHERE {condicao}
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (usuario_id, ano, mes, tipo, categoria) DO UPDATE
+        SET total = total + excluded.total, quantidade = quantidade + excluded.quantidade
+"""
+
 # =================================================================
 # 1. FUNÇÕES DE GESTÃO DA BASE DE DADOS
 # =================================================================
 
 def inicializar_banco():
     """Cria todas as tabelas necessárias se elas não existirem."""
-    conn = criar_conexao()
+    conn = obter_conexao()
     if conn is None: return
     
     cursor = conn.cursor()
     try:
-        cursor.execute("PRAGMA foreign_keys = ON;")
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT NOT NULL UNIQUE,
-                senha_hash TEXT NOT NULL,
-                saldo REAL NOT NULL DEFAULT 0.00,
-                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS transacoes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario_id INTEGER NOT NULL,
-                tipo TEXT NOT NULL CHECK(tipo IN ('deposito', 'saque')),
-                valor REAL NOT NULL,
-                categoria TEXT,
-                data_transacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS orcamentos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario_id INTEGER NOT NULL,
-                categoria TEXT NOT NULL,
-                valor REAL NOT NULL,
-                mes INTEGER NOT NULL,
-                ano INTEGER NOT NULL,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE,
-                UNIQUE (usuario_id, categoria, mes, ano)
-            )
-        """)
+        resumo_existia = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'resumo_mensal'").fetchone() is not None
+        cursor.execute(SQL_TABELA_USUARIOS.format(nome='usuarios'))
+        cursor.execute(SQL_TABELA_TRANSACOES.format(nome='transacoes'))
+        colunas_transacoes = [coluna['name'] for coluna in cursor.execute("PRAGMA table_info(transacoes)")]
+        if 'id_externo' not in colunas_transacoes:
+            cursor.execute("ALTER TABLE transacoes ADD COLUMN id_externo TEXT")
+        cursor.execute(SQL_TABELA_ORCAMENTOS.format(nome='orcamentos'))
+        cursor.execute(SQL_TABELA_ALERTAS_ORCAMENTO.format(nome='alertas_orcamento'))
+        cursor.execute(SQL_TABELA_RECORRENTES.format(nome='transacoes_recorrentes'))
+        cursor.execute(SQL_TABELA_RESUMO.format(nome='resumo_mensal'))
+        cursor.execute(SQL_TABELA_CHECKPOINTS.format(nome='saldos_checkpoint'))
+        cursor.execute(SQL_TABELA_ARQUIVOS.format(nome='arquivos'))
+        for indice in INDICES + INDICES_RECORRENTES:
+            cursor.execute(indice)
         conn.commit()
     except sqlite3.Error as e:
         print(f"Erro ao criar tabelas: {e}")
+        return
+    if not dinheiro_em_centavos() and not migrar_para_centavos():
+        return
+    if not resumo_existia:
+        # Base de dados anterior ao agregado mensal: preenche-o a partir do histórico.
+        reconstruir_resumo_mensal()
+
+def _para_centavos(valor):
+    """Converte um valor em reais (int, float, Decimal ou texto) em centavos inteiros."""
+    try:
+        return int((Decimal(str(valor)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except InvalidOperation:
+        raise ValueError(f"Valor monetário inválido: {valor!r}") from None
+
+def _centavos_positivos(valor):
+    """Como _para_centavos, mas recusa zero e valores negativos (ValueError)."""
+    centavos = _para_centavos(valor)
+    if centavos <= 0:
+        raise ValueError(f"O valor deve ser positivo: {valor!r}")
+    return centavos
+
+def _tipo_coluna(conn, tabela, coluna):
+    """Tipo declarado de uma coluna, ou None se a tabela ou a coluna não existirem."""
+    tipos = {linha['name']: linha['type'].upper() for linha in conn.execute(f"PRAGMA table_info({tabela})")}
+    return tipos.get(coluna)
+
+def _coluna_em_centavos(conn, tabela, coluna):
+    return _tipo_coluna(conn, tabela, coluna) == 'INTEGER'
+
+def dinheiro_em_centavos():
+    """Indica se a base de dados já guarda os valores monetários em centavos."""
+    conn = obter_conexao()
+    if conn is None: return False
+    return _coluna_em_centavos(conn, 'transacoes', 'valor')
+
+def _trocar_tabela(conn, tabela, copiar=True):
+    """Substitui `tabela` pela sua versão em centavos (`<tabela>_centavos`), preservando a sequência de ids."""
+    nova = f"{tabela}_centavos"
+    if copiar:
+        colunas = [linha['name'] for linha in conn.execute(f"PRAGMA table_info({tabela})")]
+        dinheiro = dict((nome, colunas_dinheiro) for nome, _, colunas_dinheiro in TABELAS_DINHEIRO)[tabela]
+        selecao = ", ".join(f"CAST(ROUND({coluna} * 100) AS INTEGER)" if coluna in dinheiro else coluna for coluna in colunas)
+        conn.execute(f"INSERT INTO {nova} ({', '.join(colunas)}) SELECT {selecao} FROM {tabela}")
+    sequencia = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (tabela,)).fetchone()
+    conn.execute(f"DROP TABLE {tabela}")
+    conn.execute(f"ALTER TABLE {nova} RENAME TO {tabela}")
+    if sequencia:
+        atual = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (tabela,)).fetchone()
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (tabela,))
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                     (tabela, max(sequencia[0], atual[0] if atual else 0)))
+
+def migrar_para_centavos(tamanho_lote=5000, progresso=None):
+    """Converte uma base de dados com valores REAL para INTEGER em centavos.
+
+    As transações são copiadas para uma tabela nova em lotes de `tamanho_lote`, cada um
+    na sua própria transação curta, enquanto a aplicação continua a escrever na tabela
+    antiga. Só a troca final (o resto da cópia e as tabelas pequenas) bloqueia a base de
+    dados. Pode ser interrompida e retomada: continua a partir do último lote copiado.
+    `progresso(copiadas, total)` é chamado após cada lote. Devolve True em caso de sucesso.
+    """
+    conn = obter_conexao()
+    if conn is None: return False
+    try:
+        if _coluna_em_centavos(conn, 'transacoes', 'valor'):
+            return True
+        conn.execute("BEGIN IMMEDIATE")
+        if not any(linha['name'] == 'id_externo' for linha in conn.execute("PRAGMA table_info(transacoes)")):
+            conn.execute("ALTER TABLE transacoes ADD COLUMN id_externo TEXT")
+        conn.execute(SQL_TABELA_TRANSACOES.format(nome='transacoes_centavos'))
+        for gatilho in GATILHOS_MIGRACAO:
+            conn.execute(gatilho)
+        conn.commit()
+
+        ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM transacoes_centavos").fetchone()[0]
+        total = conn.execute("SELECT COUNT(*) FROM transacoes").fetchone()[0]
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            copiadas = conn.execute(SQL_COPIAR_LOTE_TRANSACOES, (ultimo_id, tamanho_lote)).rowcount
+            ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM transacoes_centavos").fetchone()[0]
+            conn.commit()
+            if progresso is not None:
+                progresso(conn.execute("SELECT COUNT(*) FROM transacoes_centavos").fetchone()[0], total)
+            if copiadas < tamanho_lote:
+                break
+
+        # Troca final. As chaves estrangeiras têm de estar desligadas para que apagar a
+        # tabela `usuarios` antiga não apague em cascata as transações.
+        conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            while conn.execute(SQL_COPIAR_LOTE_TRANSACOES, (ultimo_id, tamanho_lote)).rowcount:
+                ultimo_id = conn.execute("SELECT MAX(id) FROM transacoes_centavos").fetchone()[0]
+            _trocar_tabela(conn, 'transacoes', copiar=False)
+            for tabela, definicao, colunas in TABELAS_DINHEIRO:
+                # Tabelas que ainda não existem serão criadas já em centavos por inicializar_banco.
+                if tabela != 'transacoes' and _tipo_coluna(conn, tabela, colunas[0]) not in (None, 'INTEGER'):
+                    conn.execute(definicao.format(nome=f"{tabela}_centavos"))
+                    _trocar_tabela(conn, tabela)
+            for indice in INDICES:
+                conn.execute(indice)
+            if conn.execute("PRAGMA foreign_key_check").fetchone() is not None:
+                raise sqlite3.IntegrityError("chaves estrangeiras inválidas após a migração")
+            conn.commit()
+        finally:
+            conn.execute("PRAGMA foreign_keys = ON")
+        return True
+    except sqlite3.Error as e:
+        print(f"Erro na migração para centavos: {e}")
+        if conn.in_transaction:
+            conn.rollback()
+        return False
+
+def _aplicar_resumo(conn, condicao, params, sinal=1, usuario_id=None, fonte="transacoes"):
+    """Soma (sinal=1) ou subtrai (sinal=-1) do agregado mensal as transações que cumprem `condicao`.
+
+    Deve ser chamada dentro da transação que escreve em `transacoes`: antes de um
+    DELETE/UPDATE para retirar os valores antigos, depois de um INSERT/UPDATE para
+    acrescentar os novos.
+    """
+    conn.execute(SQL_APLICAR_RESUMO.format(condicao=condicao, fonte=fonte), (sinal, sinal, *params))
+    if sinal < 0 and usuario_id is not None:
+        conn.execute("DELETE FROM resumo_mensal WHERE usuario_id = ? AND quantidade <= 0", (usuario_id,))
+
+def _invalidar_checkpoints(conn, condicao, params):
+    """Apaga os checkpoints de saldo a partir da transação mais antiga que cumpre `condicao`.
+
+    Como _aplicar_resumo, corre dentro da transação de escrita, enquanto as linhas
+    afetadas existem (antes de um DELETE, depois de um INSERT). Um checkpoint com a
+    mesma data_transacao também é apagado, mesmo que fosse anterior pelo id.
+    """
+    inicios = conn.execute(f"SELECT usuario_id, MIN(data_transacao) FROM transacoes WHERE {condicao} GROUP BY usuario_id",
+                           params).fetchall()
+    conn.executemany("DELETE FROM saldos_checkpoint WHERE usuario_id = ? AND data_transacao >= ?",
+                     [tuple(linha) for linha in inicios])
+
+# Avaliados por orçamento, com a chave (usuario_id, ano, mes, categoria) como parâmetros.
+_SQL_LIMIARES = "(VALUES " + ", ".join(f"({limiar})" for limiar in LIMIARES_ALERTA_ORCAMENTO) + ")"
+_SQL_GASTO_ORCAMENTO = """FROM orcamentos o
+    JOIN resumo_mensal r ON r.usuario_id = o.usuario_id AND r.ano = o.ano AND r.mes = o.mes
+                        AND r.tipo = 'saque' AND r.categoria = o.categoria"""
+SQL_REGISTAR_ALERTAS = f"""
+    INSERT INTO alertas_orcamento (usuario_id, ano, mes, categoria, limiar, gasto, orcamento)
+    SELECT o.usuario_id, o.ano, o.mes, o.categoria, l.column1, r.total, o.valor
+    {_SQL_GASTO_ORCAMENTO}
+    JOIN {_SQL_LIMIARES} l
+    WHERE o.usuario_id = ? AND o.ano = ? AND o.mes = ? AND o.categoria = ?
+      AND r.total * 100 >= o.valor * l.column1
+    ON CONFLICT DO NOTHING
+"""
+SQL_LIMPAR_ALERTAS = f"""
+    DELETE FROM alertas_orcamento AS a
+    WHERE a.usuario_id = ? AND a.ano = ? AND a.mes = ? AND a.categoria = ?
+      AND NOT EXISTS (SELECT 1 {_SQL_GASTO_ORCAMENTO}
+                      WHERE o.usuario_id = a.usuario_id AND o.ano = a.ano AND o.mes = a.mes
+                        AND o.categoria = a.categoria AND r.total * 100 >= o.valor * a.limiar)
+"""
+
+def _chaves_orcamento(conn, condicao, params):
+    """Orçamentos (usuario_id, ano, mes, categoria) a que contam os saques que cumprem `condicao`.
+
+    Lidas enquanto as linhas afetadas existem (antes de um DELETE, antes e depois de um
+    UPDATE), para serem reavaliadas por _avaliar_alertas_orcamento no fim da escrita.
+    """
+    return {tuple(linha) for linha in conn.execute(f"""
+        SELECT usuario_id, CAST(substr(data_transacao, 1, 4) AS INTEGER),
+               CAST(substr(data_transacao, 6, 2) AS INTEGER), categoria
+        FROM transacoes WHERE ({condicao}) AND tipo = 'saque' AND categoria IS NOT NULL
+    """, params)}
+
+def _avaliar_alertas_orcamento(conn, chaves, so_aumentos=False):
+    """Regista os alertas dos orçamentos em `chaves` que chegaram a um limiar e apaga os que deixaram de o estar.
+
+    Corre no fim da transação de escrita, depois de o agregado mensal estar atualizado.
+    Com `so_aumentos` (inserções de saques, em que o gasto só pode subir), não procura
+    alertas a apagar.
+    """
+    chaves = [tuple(chave) for chave in chaves]
+    conn.executemany(SQL_REGISTAR_ALERTAS, chaves)
+    if not so_aumentos:
+        conn.executemany(SQL_LIMPAR_ALERTAS, chaves)
+
+def _ultimo_checkpoint(conn, usuario_id, antes_de=None):
+    query, params = _sql_checkpoint_anterior(usuario_id, antes_de)
+    return conn.execute(query, params).fetchone()
+
+def _caminho_arquivo(ficheiro):
+    """Os ficheiros de arquivo ficam na pasta de DB_FILE e são registados só pelo nome."""
+    return os.path.join(os.path.dirname(os.path.abspath(DB_FILE)), ficheiro)
+
+def _nome_ficheiro_arquivo(ano):
+    return f"{os.path.splitext(os.path.basename(DB_FILE))[0]}_arquivo_{ano}.db"
+
+def _esquema_arquivo(ficheiro):
+    """Nome com que o ficheiro de arquivo é anexado (só letras, algarismos e '_')."""
+    nome = os.path.splitext(ficheiro)[0]
+    return "arquivo_" + "".join(c if c.isascii() and c.isalnum() else "_" for c in nome)
+
+def _arquivos_necessarios(conn, inicio=None, fim=None, usuario_id=None):
+    """Ficheiros de arquivo de que precisam as consultas às transações entre `inicio` e `fim`.
+
+    Com `usuario_id`, o intervalo começa no checkpoint de saldo do utilizador anterior a
+    `inicio`, de onde parte o saldo corrido (ver _com_saldo_corrido).
+    """
+    if inicio and usuario_id is not None:
+        checkpoint = _ultimo_checkpoint(conn, usuario_id, (inicio, 0))
+        inicio = checkpoint['data_transacao'] if checkpoint else None
+    return {linha['ficheiro'] for linha in _anos_arquivados(conn, inicio, fim)}
+
+def _anexar_arquivos(conn, ficheiros):
+    """Deixa anexados a `conn` só os ficheiros de arquivo `ficheiros`.
+
+    ATTACH e DETACH não podem correr dentro de uma transação. Devolve os ficheiros anexados.
+    """
+    esquemas = {_esquema_arquivo(ficheiro): ficheiro for ficheiro in ficheiros}
+    anexados = {linha['name'] for linha in conn.execute("PRAGMA database_list")}
+    for esquema in anexados - esquemas.keys():
+        if esquema.startswith("arquivo_"):
+            conn.execute(f"DETACH DATABASE {esquema}")
+    for esquema, ficheiro in esquemas.items():
+        if esquema not in anexados:
+            conn.execute(f"ATTACH DATABASE ? AS {esquema}", (_caminho_arquivo(ficheiro),))
+    return set(ficheiros)
+
+def _iniciar_com_arquivos(conn, operacao=None, inicio=None, fim=None, usuario_id=None):
+    """Abre uma transação (de escrita, se `operacao` for dada) com os arquivos do intervalo anexados.
+
+    Sem intervalo, anexa todos os ficheiros de arquivo; com `inicio`/`fim` (e `usuario_id`,
+    se a consulta calcular o saldo corrido), só os de _arquivos_necessarios, e os
+    restantes são desanexados. As chamadas a _fonte_transacoes na transação não podem
+    pedir um intervalo maior. Se um arquivamento mudar os ficheiros necessários entre o
+    ATTACH e o início da transação, a transação é desfeita e os anexos refeitos.
+    """
+    while True:
+        anexados = _anexar_arquivos(conn, _arquivos_necessarios(conn, inicio, fim, usuario_id))
+        if operacao is None:
+            conn.execute("BEGIN TRANSACTION")
+        else:
+            _iniciar_escrita(conn, operacao)
+        if _arquivos_necessarios(conn, inicio, fim, usuario_id) <= anexados:
+            return
+        conn.rollback()
+
+def _anos_arquivados(conn, inicio=None, fim=None):
+    """Anos com transações arquivadas (publicadas) entre as datas `inicio` e `fim` (texto, inclusive)."""
+    query = "SELECT ano, ficheiro, data_max FROM arquivos WHERE data_min IS NOT NULL"
+    params = []
+    if inicio:
+        query += " AND data_max >= ?"
+        params.append(inicio)
+    if fim:
+        query += " AND data_min <= ?"
+        params.append(fim)
+    return conn.execute(query + " ORDER BY ano", params).fetchall()
+
+def _fonte_transacoes(conn, inicio=None, fim=None):
+    """Fonte das consultas a `transacoes`: só a tabela quente ou, se o intervalo lá chegar, também os arquivos.
+
+    Os arquivos entram como UNION ALL com `transacoes`, cada um limitado aos lotes
+    publicados; as condições da consulta exterior passam para dentro de cada ramo e usam
+    os índices de cada ficheiro. Deve ser chamada dentro da transação aberta por
+    _iniciar_com_arquivos.
+    """
+    ficheiros = {}  # ficheiro -> um dos seus anos (todos têm o lote publicado do ficheiro)
+    for linha in _anos_arquivados(conn, inicio, fim):
+        ficheiros.setdefault(linha['ficheiro'], linha['ano'])
+    if not ficheiros:
+        return "transacoes"
+    anexados = {linha['name'] for linha in conn.execute("PRAGMA database_list")}
+    ramos = [f"SELECT {COLUNAS_TRANSACAO} FROM main.transacoes"]
+    for ficheiro, ano in sorted(ficheiros.items()):
+        if _esquema_arquivo(ficheiro) not in anexados:
+            raise sqlite3.OperationalError(f"O arquivo {ficheiro} não está anexado: o intervalo pedido "
+                                           "é maior do que o da transação (ver _iniciar_com_arquivos).")
+        ramos.append(f"SELECT {COLUNAS_TRANSACAO} FROM {_esquema_arquivo(ficheiro)}.transacoes "
+                     f"WHERE lote <= (SELECT lote FROM main.arquivos WHERE ano = {int(ano)})")
+    return "(" + " UNION ALL ".join(ramos) + ")"
+
+def atualizar_checkpoints_saldo(usuario_id=None, intervalo=INTERVALO_CHECKPOINT):
+    """Acrescenta checkpoints de saldo de `intervalo` em `intervalo` transações, a partir do último.
+
+    Cada utilizador é tratado numa transação curta e só lê as transações posteriores ao
+    seu último checkpoint. Devolve o número de checkpoints criados, ou None em caso de erro.
+    """
+    conn = obter_conexao()
+    if conn is None: return None
+    try:
+        ids = [usuario_id] if usuario_id is not None else [linha['id'] for linha in conn.execute("SELECT id FROM usuarios")]
+        criados = 0
+        for uid in ids:
+            _iniciar_com_arquivos(conn, "atualizar_checkpoints_saldo")
+            ultimo = _ultimo_checkpoint(conn, uid)
+            desde = (ultimo['data_transacao'], ultimo['transacao_id']) if ultimo else None
+            fonte = _fonte_transacoes(conn, desde[0] if desde else None)
+            query, params = _sql_saldo_corrido(uid, ultimo['saldo'] if ultimo else 0, desde, fonte=fonte)
+            novos = [(uid, linha['data_transacao'], linha['id'], linha['saldo_apos'])
+                     for linha in conn.execute(f"SELECT * FROM ({query}) WHERE n % ? = 0", (*params, intervalo))]
+            conn.executemany("INSERT INTO saldos_checkpoint (usuario_id, data_transacao, transacao_id, saldo) VALUES (?, ?, ?, ?)", novos)
+            conn.commit()
+            criados += len(novos)
+        return criados
+    except sqlite3.Error as e:
+        print(f"Erro ao atualizar checkpoints de saldo: {e}")
+        conn.rollback()
+        return None
+
+def verificar_saldos(usuario_id=None):
+    """Confere `usuarios.saldo` com o último checkpoint mais as transações posteriores.
+
+    Só lê as transações depois do último checkpoint de cada utilizador. Devolve a lista
+    de divergências {'usuario_id', 'registado', 'calculado', 'linhas_lidas'} (vazia se
+    todos os saldos estiverem certos), ou None em caso de erro.
+    """
+    conn = obter_conexao()
+    if conn is None: return None
+    try:
+        _iniciar_com_arquivos(conn)  # leitura consistente dos saldos e das transações
+        query = "SELECT id, saldo FROM usuarios" + ("" if usuario_id is None else " WHERE id = ?")
+        usuarios = conn.execute(query, () if usuario_id is None else (usuario_id,)).fetchall()
+        divergencias = []
+        for usuario in usuarios:
+            ultimo = _ultimo_checkpoint(conn, usuario['id'])
+            desde = (ultimo['data_transacao'], ultimo['transacao_id']) if ultimo else None
+            fonte = _fonte_transacoes(conn, desde[0] if desde else None)
+            query, params = _sql_variacao_saldo(usuario['id'], desde, fonte=fonte)
+            variacao, linhas_lidas = conn.execute(query, params).fetchone()
+            calculado = (ultimo['saldo'] if ultimo else 0) + variacao
+            if calculado != usuario['saldo']:
+                divergencias.append({'usuario_id': usuario['id'], 'registado': _de_centavos(usuario['saldo']),
+                                     'calculado': _de_centavos(calculado), 'linhas_lidas': linhas_lidas})
+        conn.commit()
+        return divergencias
+    except sqlite3.Error as e:
+        print(f"Erro ao verificar saldos: {e}")
+        conn.rollback()
+        return None
+
+def reconstruir_resumo_mensal(usuario_id=None):
+    """Recalcula o agregado mensal a partir de `transacoes` e dos arquivos (de um utilizador ou de todos)."""
+    conn = obter_conexao()
+    if conn is None: return False
+    try:
+        _iniciar_com_arquivos(conn, "reconstruir_resumo_mensal")
+        fonte = _fonte_transacoes(conn)
+        if usuario_id is None:
+            conn.execute("DELETE FROM resumo_mensal")
+            _aplicar_resumo(conn, "1", (), fonte=fonte)
+        else:
+            conn.execute("DELETE FROM resumo_mensal WHERE usuario_id = ?", (usuario_id,))
+            _aplicar_resumo(conn, "usuario_id = ?", (usuario_id,), fonte=fonte)
+        filtro, params = ("", ()) if usuario_id is None else ("WHERE usuario_id = ?", (usuario_id,))
+        _avaliar_alertas_orcamento(conn, conn.execute(f"SELECT usuario_id, ano, mes, categoria FROM orcamentos {filtro}",
+                                                      params).fetchall())
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print(f"Erro ao reconstruir resumo mensal: {e}")
+        conn.rollback()
+        return False
+
+def verificar_resumo_mensal(usuario_id=None):
+    """Compara o agregado mensal com um recálculo a partir de `transacoes` e dos arquivos.
+
+    Devolve a lista de divergências (vazia se o agregado estiver consistente), ou None em caso de erro.
+    """
+    conn = obter_conexao()
+    if conn is None: return None
+    filtro, params = ("", ()) if usuario_id is None else ("WHERE usuario_id = ?", (usuario_id,))
+    try:
+        _iniciar_com_arquivos(conn)  # leitura consistente das duas tabelas
+        esperado = {}
+        for linha in conn.execute(f"""
+                SELECT usuario_id, CAST(substr(data_transacao, 1, 4) AS INTEGER) as ano,
+                       CAST(substr(data_transacao, 6, 2) AS INTEGER) as mes,
+                       tipo, COALESCE(categoria, '') as categoria, SUM(valor) as total, COUNT(*) as quantidade
+                FROM {_fonte_transacoes(conn)} {filtro}
+                GROUP BY 1, 2, 3, 4, 5""", params):
+            esperado[tuple(linha)[:5]] = (linha['total'], linha['quantidade'])
+        registado = {}
+        for linha in conn.execute(f"SELECT * FROM resumo_mensal {filtro}", params):
+            registado[tuple(linha)[:5]] = (linha['total'], linha['quantidade'])
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"Erro ao verificar resumo mensal: {e}")
+        conn.rollback()
+        return None
+
+    divergencias = []
+    for chave in sorted(esperado.keys() | registado.keys()):
+        valor_esperado = esperado.get(chave, (0, 0))
+        valor_registado = registado.get(chave, (0, 0))
+        if valor_esperado != valor_registado:
+            divergencias.append({
+                'usuario_id': chave[0], 'ano': chave[1], 'mes': chave[2], 'tipo': chave[3], 'categoria': chave[4],
+                'esperado': valor_esperado, 'registado': valor_registado,
+            })
+    return divergencias
+
+def _lote_arquivo(conn, ficheiro):
+    """Último lote publicado do ficheiro de arquivo (0 se ainda não tem nenhum)."""
+    return conn.execute("SELECT COALESCE(MAX(lote), 0) FROM arquivos WHERE ficheiro = ?", (ficheiro,)).fetchone()[0]
+
+def _abrir_arquivo(conn, ficheiro):
+    """Abre (criando se preciso) o ficheiro de arquivo `ficheiro`, sem lotes por publicar.
+
+    Um lote copiado para o ficheiro mas não publicado em `arquivos` (por uma interrupção
+    entre as duas confirmações) é apagado aqui; as suas linhas continuam em `transacoes`
+    (ou no ficheiro de onde estavam a ser copiadas, ver _fundir_arquivos).
+    """
+    arquivo = sqlite3.connect(_caminho_arquivo(ficheiro), isolation_level=None)
+    arquivo.execute("PRAGMA journal_mode = WAL")
+    arquivo.execute("PRAGMA synchronous = FULL")  # cada lote tem de estar no disco antes de sair de `transacoes`
+    arquivo.execute(SQL_TABELA_TRANSACOES_ARQUIVO)
+    for indice in INDICES_ARQUIVO:
+        arquivo.execute(indice)
+    arquivo.execute("DELETE FROM transacoes WHERE lote > ?", (_lote_arquivo(conn, ficheiro),))
+    return arquivo
+
+def _fundir_arquivos(conn, arquivos, destino, origem):
+    """Copia as transações publicadas do ficheiro `origem` para `destino` e passa os anos de `origem` para lá.
+
+    A cópia é um lote novo de `destino`, publicado pela transação principal em curso; o
+    ficheiro `origem` só pode ser apagado depois de ela ser confirmada.
+    """
+    lote = _lote_arquivo(conn, destino) + 1
+    arquivos.pop(origem).close()
+    arquivo = arquivos[destino]
+    arquivo.execute("ATTACH DATABASE ? AS origem", (_caminho_arquivo(origem),))
+    try:
+        arquivo.execute("BEGIN")
+        arquivo.execute(f"""
+            INSERT INTO transacoes ({COLUNAS_TRANSACAO}, lote)
+            SELECT {COLUNAS_TRANSACAO}, ? FROM origem.transacoes WHERE lote <= ?""", (lote, _lote_arquivo(conn, origem)))
+        arquivo.commit()
     finally:
-        conn.close()
+        if arquivo.in_transaction:
+            arquivo.rollback()
+        arquivo.execute("DETACH DATABASE origem")
+    conn.execute("UPDATE arquivos SET ficheiro = ?, lote = ? WHERE ficheiro IN (?, ?)", (destino, lote, destino, origem))
+
+def _ficheiro_do_ano(conn, arquivos, ano, a_apagar):
+    """Ficheiro de arquivo de `ano`, registando o ano em `arquivos` (a tabela) se for novo.
+
+    Um ano novo tem ficheiro próprio enquanto houver menos de MAX_FICHEIROS_ARQUIVO; a
+    partir daí, se for mais antigo do que todos, junta-se ao ficheiro mais antigo e, se
+    não, os dois ficheiros mais antigos fundem-se num só para lhe dar lugar. Os ficheiros
+    fundidos entram em `a_apagar`. `arquivos` tem as conexões abertas, por ficheiro.
+    """
+    registo = conn.execute("SELECT ficheiro FROM arquivos WHERE ano = ?", (ano,)).fetchone()
+    if registo:
+        return registo['ficheiro']
+    ficheiros = conn.execute("SELECT ficheiro, MIN(ano) AS primeiro FROM arquivos GROUP BY ficheiro ORDER BY primeiro").fetchall()
+    if len(ficheiros) >= MAX_FICHEIROS_ARQUIVO and ano < ficheiros[0]['primeiro']:
+        ficheiro = ficheiros[0]['ficheiro']
+    else:
+        if len(ficheiros) >= MAX_FICHEIROS_ARQUIVO:
+            _fundir_arquivos(conn, arquivos, ficheiros[0]['ficheiro'], ficheiros[1]['ficheiro'])
+            a_apagar.append(ficheiros[1]['ficheiro'])
+        ficheiro = _nome_ficheiro_arquivo(ano)
+        arquivos[ficheiro] = _abrir_arquivo(conn, ficheiro)
+    conn.execute("INSERT INTO arquivos (ano, ficheiro, lote) VALUES (?, ?, ?)", (ano, ficheiro, _lote_arquivo(conn, ficheiro)))
+    return ficheiro
+
+def _apagar_arquivos(ficheiros):
+    """Apaga do disco ficheiros de arquivo já fundidos noutros (e os seus -wal/-shm)."""
+    for ficheiro in ficheiros:
+        for sufixo in ("", "-wal", "-shm"):
+            try:
+                os.remove(_caminho_arquivo(ficheiro) + sufixo)
+            except OSError:
+                pass  # já não existe, ou está aberto noutro processo (Windows): fica só a ocupar espaço
+    ficheiros.clear()
+
+def arquivar_transacoes(dias=ARQUIVAR_APOS_DIAS, tamanho_lote=5000, progresso=None):
+    """Move as transações com mais de `dias` dias para os ficheiros de arquivo, um por ano (ver `arquivos`).
+
+    Por cada lote, a base de dados principal fica bloqueada para escrita desde a leitura
+    das linhas até ao fim: as linhas são copiadas e confirmadas no ficheiro do seu ano e
+    só depois, na mesma transação principal, apagadas de `transacoes` e publicadas
+    (`arquivos.lote`). Saldos, agregado mensal e checkpoints não mudam; as transações
+    arquivadas deixam de poder ser editadas ou excluídas. `progresso(movidas)` é chamado
+    após cada lote. Devolve o número de transações arquivadas, ou None em caso de erro.
+    """
+    if atualizar_checkpoints_saldo() is None:
+        return None
+    conn = obter_conexao()
+    if conn is None: return None
+    corte = (date.today() - timedelta(days=dias)).strftime('%Y-%m-%d')
+    arquivos = {}
+    a_apagar = []
+    movidas, ultimo_id = 0, 0
+    try:
+        # BEGIN IMMEDIATE também reserva as bases de dados anexadas, e as conexões de
+        # cada ficheiro não conseguiriam escrever neles.
+        _anexar_arquivos(conn, ())
+        for linha in conn.execute("SELECT DISTINCT ficheiro FROM arquivos").fetchall():
+            arquivos[linha['ficheiro']] = _abrir_arquivo(conn, linha['ficheiro'])
+        while True:
+            _iniciar_escrita(conn, "arquivar_transacoes")
+            linhas = conn.execute(f"""
+                SELECT {COLUNAS_TRANSACAO} FROM transacoes
+                WHERE id > ? AND data_transacao < ? ORDER BY id LIMIT ?""", (ultimo_id, corte, tamanho_lote)).fetchall()
+            if not linhas:
+                conn.commit()
+                break
+            por_ano = {}
+            for linha in linhas:
+                por_ano.setdefault(int(linha['data_transacao'][:4]), []).append(tuple(linha))
+            for ano, grupo in sorted(por_ano.items()):
+                ficheiro = _ficheiro_do_ano(conn, arquivos, ano, a_apagar)
+                lote = _lote_arquivo(conn, ficheiro) + 1
+                arquivo = arquivos[ficheiro]
+                arquivo.execute("BEGIN")
+                arquivo.executemany(f"INSERT INTO transacoes ({COLUNAS_TRANSACAO}, lote) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                    [linha + (lote,) for linha in grupo])
+                arquivo.commit()
+                datas = [linha[5] for linha in grupo]
+                conn.execute("UPDATE arquivos SET lote = ? WHERE ficheiro = ?", (lote, ficheiro))
+                conn.execute("""
+                    UPDATE arquivos SET data_min = MIN(COALESCE(data_min, ?), ?), data_max = MAX(COALESCE(data_max, ?), ?)
+                    WHERE ano = ?""", (min(datas), min(datas), max(datas), max(datas), ano))
+            conn.execute("DELETE FROM transacoes WHERE id > ? AND id <= ? AND data_transacao < ?",
+                         (ultimo_id, linhas[-1]['id'], corte))
+            conn.commit()
+            _apagar_arquivos(a_apagar)
+            ultimo_id = linhas[-1]['id']
+            movidas += len(linhas)
+            if progresso:
+                progresso(movidas)
+        return movidas
+    except sqlite3.Error as e:
+        print(f"Erro ao arquivar transações: {e}")
+        conn.rollback()
+        return None
+    finally:
+        for arquivo in arquivos.values():
+            if arquivo.in_transaction:
+                arquivo.rollback()
+            arquivo.close()
+
+def compactar_banco():
+    """Devolve ao sistema o espaço livre da base de dados principal (por exemplo, depois de arquivar).
+
+    VACUUM reescreve o ficheiro inteiro e bloqueia as escritas enquanto corre.
+    """
+    conn = obter_conexao()
+    if conn is None: return False
+    try:
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return True
+    except sqlite3.Error as e:
+        print(f"Erro ao compactar a base de dados: {e}")
+        return False
+
+def _texto_data(valor):
+    """Normaliza uma data (date, datetime ou 'AAAA-MM-DD') para 'AAAA-MM-DD'."""
+    if isinstance(valor, (date, datetime)):
+        return valor.strftime('%Y-%m-%d')
+    return str(valor)[:10]
+
+def _limites_data(data_inicio=None, data_fim=None):
+    """Converte o intervalo de dias [data_inicio, data_fim] em limites semiabertos [inicio, fim)."""
+    inicio = _texto_data(data_inicio) if data_inicio else None
+    fim = None
+    if data_fim:
+        dia_seguinte = datetime.strptime(_texto_data(data_fim), '%Y-%m-%d') + timedelta(days=1)
+        fim = dia_seguinte.strftime('%Y-%m-%d')
+    return inicio, fim
+
+def _texto_data_hora(valor):
+    """Normaliza uma data/hora para o formato guardado em data_transacao ('AAAA-MM-DD HH:MM:SS')."""
+    if valor is None:
+        return None
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valor, date):
+        return valor.strftime('%Y-%m-%d 00:00:00')
+    texto = str(valor)
+    return texto if len(texto) > 10 else texto + ' 00:00:00'
+
+def _formatar_transacao(linha, com_hora=True):
+    """Converte uma linha de `transacoes` num dicionário com 'data' no formato 'DD/MM/AAAA[ HH:MM:SS]'.
+
+    A data é cortada diretamente do texto guardado, sem strptime/strftime por linha.
+    """
+    transacao = dict(linha)
+    bruto = transacao.pop('data_transacao')
+    data = f"{bruto[8:10]}/{bruto[5:7]}/{bruto[:4]}"
+    transacao['data'] = f"{data} {bruto[11:19]}" if com_hora else data
+    return transacao
+
+def _limites_mes(ano, mes):
+    """Devolve os limites semiabertos [primeiro dia do mês, primeiro dia do mês seguinte)."""
+    seguinte_ano, seguinte_mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return f"{ano:04d}-{mes:02d}-01", f"{seguinte_ano:04d}-{seguinte_mes:02d}-01"
+
+def _mes_atual():
+    hoje = datetime.now()
+    return hoje.year, hoje.month
+
+# --- Construtores de consultas (partilhados pelas funções e pela verificação de planos) ---
+
+def _sql_historico(usuario_id, data_inicio=None, data_fim=None, fonte="transacoes"):
+    query = f'SELECT id, tipo, valor AS "valor [centavos]", categoria, data_transacao FROM {fonte} WHERE usuario_id = ?'
+    params = [usuario_id]
+    inicio, fim = _limites_data(data_inicio, data_fim)
+    if inicio:
+        query += " AND data_transacao >= ?"
+        params.append(inicio)
+    if fim:
+        query += " AND data_transacao < ?"
+        params.append(fim)
+    query += " ORDER BY data_transacao DESC"
+    return query, params
+
+def _filtros_pesquisa(usuario_id, filtros):
+    """Condição WHERE e parâmetros dos filtros de pesquisar_transacoes (valores já em centavos)."""
+    condicao = "usuario_id = ?"
+    params = [usuario_id]
+    if filtros.get('tipo') or filtros.get('categorias'):
+        # tipo é a segunda coluna de idx_transacoes_usuario_tipo_categoria: com os dois tipos
+        # em IN, o índice também serve quando só as categorias são filtradas.
+        tipos = [filtros['tipo']] if filtros.get('tipo') else list(TIPOS_TRANSACAO)
+        condicao += f" AND tipo IN ({', '.join('?' * len(tipos))})"
+        params.extend(tipos)
+    if filtros.get('categorias'):
+        condicao += f" AND categoria IN ({', '.join('?' * len(filtros['categorias']))})"
+        params.extend(filtros['categorias'])
+    if filtros.get('valor_min') is not None:
+        condicao += " AND valor >= ?"
+        params.append(filtros['valor_min'])
+    if filtros.get('valor_max') is not None:
+        condicao += " AND valor <= ?"
+        params.append(filtros['valor_max'])
+    inicio, fim = _limites_data(filtros.get('data_inicio'), filtros.get('data_fim'))
+    if inicio:
+        condicao += " AND data_transacao >= ?"
+        params.append(inicio)
+    if fim:
+        condicao += " AND data_transacao < ?"
+        params.append(fim)
+    return condicao, params
+
+def _sql_pesquisa(usuario_id, filtros=None, ordem='data_desc', apos=None, limite=200, fonte="transacoes"):
+    condicao, params = _filtros_pesquisa(usuario_id, filtros or {})
+    coluna, sentido = ORDENS_PESQUISA[ordem]
+    if apos:
+        # (coluna, id) depois de `apos` na ordem pedida, escrito de forma a delimitar o intervalo no índice.
+        operador = "<" if sentido == "DESC" else ">"
+        condicao += f" AND {coluna} {operador}= ? AND ({coluna} {operador} ? OR id {operador} ?)"
+        params.extend((apos[0], apos[0], apos[1]))
+    query = (f'SELECT id, tipo, valor AS "valor [centavos]", categoria, data_transacao FROM {fonte} WHERE {condicao} '
+             f'ORDER BY {coluna} {sentido}, id {sentido} LIMIT ?')
+    return query, params + [limite]
+
+def _sql_contagem_pesquisa(usuario_id, filtros=None, fonte="transacoes"):
+    condicao, params = _filtros_pesquisa(usuario_id, filtros or {})
+    return f"SELECT COUNT(*) FROM {fonte} WHERE {condicao}", params
+
+def _sql_checkpoint_anterior(usuario_id, antes_de=None):
+    """Último checkpoint de saldo do utilizador, ou o último estritamente antes da posição `antes_de`."""
+    query = "SELECT saldo, data_transacao, transacao_id FROM saldos_checkpoint WHERE usuario_id = ?"
+    params = [usuario_id]
+    if antes_de:
+        query += " AND data_transacao <= ? AND (data_transacao < ? OR transacao_id < ?)"
+        params.extend((antes_de[0], antes_de[0], antes_de[1]))
+    query += " ORDER BY data_transacao DESC, transacao_id DESC LIMIT 1"
+    return query, params
+
+def _sql_saldo_corrido(usuario_id, saldo_inicial, desde=None, ate=None, fonte="transacoes"):
+    """Saldo depois de cada transação em (desde, ate], por ordem do histórico, a partir de `saldo_inicial`.
+
+    `desde` e `ate` são posições (data_transacao, id); devolve também o número de ordem `n`.
+    """
+    query = f"""
+        SELECT id, data_transacao, ROW_NUMBER() OVER janela AS n, ? + SUM({VARIACAO_SALDO}) OVER janela AS saldo_apos
+        FROM {fonte} WHERE usuario_id = ?"""
+    params = [saldo_inicial, usuario_id]
+    if desde:
+        query += " AND data_transacao >= ? AND (data_transacao > ? OR id > ?)"
+        params.extend((desde[0], desde[0], desde[1]))
+    if ate:
+        query += " AND data_transacao <= ? AND (data_transacao < ? OR id <= ?)"
+        params.extend((ate[0], ate[0], ate[1]))
+    query += " WINDOW janela AS (ORDER BY data_transacao, id ROWS UNBOUNDED PRECEDING)"
+    return query, params
+
+def _sql_variacao_saldo(usuario_id, desde=None, ate=None, fonte="transacoes"):
+    """Soma das variações de saldo (e número de transações) nas posições (desde, ate]."""
+    query = f"SELECT COALESCE(SUM({VARIACAO_SALDO}), 0), COUNT(*) FROM {fonte} WHERE usuario_id = ?"
+    params = [usuario_id]
+    if desde:
+        query += " AND data_transacao >= ? AND (data_transacao > ? OR id > ?)"
+        params.extend((desde[0], desde[0], desde[1]))
+    if ate:
+        query += " AND data_transacao <= ? AND (data_transacao < ? OR id <= ?)"
+        params.extend((ate[0], ate[0], ate[1]))
+    return query, params
+
+def _sql_variacoes(usuario_id, desde=None, ate=None, fonte="transacoes"):
+    """Variação de saldo de cada transação nas posições (desde, ate], por ordem do histórico."""
+    query = f"SELECT id, {VARIACAO_SALDO} FROM {fonte} WHERE usuario_id = ?"
+    params = [usuario_id]
+    if desde:
+        query += " AND data_transacao >= ? AND (data_transacao > ? OR id > ?)"
+        params.extend((desde[0], desde[0], desde[1]))
+    if ate:
+        query += " AND data_transacao <= ? AND (data_transacao < ? OR id <= ?)"
+        params.extend((ate[0], ate[0], ate[1]))
+    return query + " ORDER BY data_transacao, id", params
+
+def _sql_gastos_por_categoria(usuario_id, data_inicio=None, data_fim=None, fonte="transacoes"):
+    query = f'SELECT categoria, SUM(valor) as "total [centavos]" FROM {fonte} WHERE usuario_id = ? AND tipo = \'saque\' AND categoria IS NOT NULL'
+    params = [usuario_id]
+    inicio, fim = _limites_data(data_inicio, data_fim)
+    if inicio:
+        query += " AND data_transacao >= ?"
+        params.append(inicio)
+    if fim:
+        query += " AND data_transacao < ?"
+        params.append(fim)
+    query += " GROUP BY categoria HAVING SUM(valor) > 0 ORDER BY SUM(valor) DESC"
+    return query, params
+
+def _sql_resumo_mensal(usuario_id, ano, mes):
+    query = """
+        SELECT
+            SUM(CASE WHEN tipo = 'deposito' THEN total ELSE 0 END) as "total_entradas [centavos]",
+            SUM(CASE WHEN tipo = 'saque' THEN total ELSE 0 END) as "total_saidas [centavos]"
+        FROM resumo_mensal
+        WHERE usuario_id = ? AND ano = ? AND mes = ?
+    """
+    return query, [usuario_id, ano, mes]
+
+def _sql_top_categorias(usuario_id, ano, mes, limite=5):
+    query = """
+        SELECT categoria, total as "total [centavos]"
+        FROM resumo_mensal
+        WHERE usuario_id = ? AND ano = ? AND mes = ? AND tipo = 'saque' AND categoria <> ''
+        ORDER BY total DESC LIMIT ?
+    """
+    return query, [usuario_id, ano, mes, limite]
+
+def _sql_ultimas_transacoes(usuario_id, limite=4):
+    query = 'SELECT tipo, valor AS "valor [centavos]", categoria, data_transacao FROM transacoes WHERE usuario_id = ? ORDER BY data_transacao DESC LIMIT ?'
+    return query, [usuario_id, limite]
+
+def _sql_gastos_vs_orcamentos(usuario_id, mes, ano):
+    query = """
+        SELECT
+            o.categoria, o.valor as "orcamento [centavos]", COALESCE(r.total, 0) as "gasto [centavos]"
+        FROM orcamentos o
+        LEFT JOIN resumo_mensal r ON r.usuario_id = o.usuario_id
+                        AND r.ano = o.ano
+                        AND r.mes = o.mes
+                        AND r.tipo = 'saque'
+                        AND r.categoria = o.categoria
+        WHERE o.usuario_id = ? AND o.mes = ? AND o.ano = ?
+        ORDER BY o.categoria
+    """
+    return query, [usuario_id, mes, ano]
+
+def _sql_alertas_orcamento(usuario_id, apenas_novos=True):
+    query = """
+        SELECT categoria, mes, ano, limiar, gasto AS "gasto [centavos]", orcamento AS "orcamento [centavos]", data_alerta
+        FROM alertas_orcamento WHERE usuario_id = ?
+    """
+    if apenas_novos:
+        query += " AND visto = 0"
+    return query + " ORDER BY ano DESC, mes DESC, categoria, limiar", [usuario_id]
+
+def _sql_fluxo_diario(usuario_id, inicio, fonte="transacoes"):
+    """Total de cada dia desde `inicio`, por tipo (1 = saque) e categoria ('' sem categoria), para fluxo_caixa.
+
+    As linhas vêm agrupadas por tipo e categoria, e fluxo_caixa conta com essa ordem.
+    """
+    query = f"""
+        SELECT substr(data_transacao, 1, 10) AS dia, tipo = 'saque' AS saque, COALESCE(categoria, '') AS nome_categoria, SUM(valor)
+        FROM {fonte} WHERE usuario_id = ? AND data_transacao >= ?
+        GROUP BY tipo, categoria, dia ORDER BY tipo, categoria, dia
+    """
+    return query, [usuario_id, inicio]
+
+def _sql_recorrentes(usuario_id):
+    return ('SELECT id, tipo, valor AS "valor [centavos]", categoria, frequencia, dia, data_inicio, data_fim, proxima '
+            'FROM transacoes_recorrentes WHERE usuario_id = ? ORDER BY proxima, id', [usuario_id])
+
+def _sql_recorrentes_vencidas(ate, usuario_id=None):
+    filtro, params = ("usuario_id = ? AND ", [usuario_id]) if usuario_id is not None else ("", [])
+    query = ("SELECT id, usuario_id, tipo, valor, categoria, frequencia, dia, data_fim, proxima FROM transacoes_recorrentes "
+             f"WHERE {filtro}proxima <= ? AND (data_fim IS NULL OR proxima <= data_fim)")
+    return query, params + [ate]
+
+def _consultas_a_verificar():
+    """Amostra de cada consulta de leitura, com parâmetros representativos."""
+    ano, mes = _mes_atual()
+    return {
+        'obter_historico': _sql_historico(1),
+        'obter_historico (com datas)': _sql_historico(1, '2025-01-01', '2025-12-31'),
+        'obter_pagina_historico': _sql_pesquisa(1, apos=('2025-06-01 12:00:00', 100)),
+        'pesquisar_transacoes': _sql_pesquisa(1, {'tipo': 'saque', 'categorias': ['Transporte', 'Lazer'], 'valor_min': 5000,
+                                                  'valor_max': 20000, 'data_inicio': '2025-01-01', 'data_fim': '2025-03-31'}),
+        'pesquisar_transacoes (só categorias, por valor)': _sql_pesquisa(1, {'categorias': ['Transporte']}, 'valor_desc', (5000, 100)),
+        'pesquisar_transacoes (contagem)': _sql_contagem_pesquisa(1, {'valor_min': 5000, 'data_inicio': '2025-01-01'}),
+        'obter_gastos_por_categoria': _sql_gastos_por_categoria(1, '2025-01-01', '2025-12-31'),
+        'obter_resumo_mensal': _sql_resumo_mensal(1, ano, mes),
+        'obter_top_categorias': _sql_top_categorias(1, ano, mes),
+        'obter_ultimas_transacoes': _sql_ultimas_transacoes(1),
+        'obter_gastos_vs_orcamentos': _sql_gastos_vs_orcamentos(1, mes, ano),
+        'obter_alertas_orcamento': _sql_alertas_orcamento(1),
+        'fluxo de caixa diário': _sql_fluxo_diario(1, '2024-01-01'),
+        'obter_transacoes_recorrentes': _sql_recorrentes(1),
+        'recorrentes vencidas': _sql_recorrentes_vencidas('2025-06-01'),
+        'recorrentes vencidas (1 utilizador)': _sql_recorrentes_vencidas('2025-06-01', 1),
+        'checkpoint de saldo anterior': _sql_checkpoint_anterior(1, ('2025-06-01 12:00:00', 100)),
+        'saldo corrido': _sql_saldo_corrido(1, 0, ('2025-01-01 00:00:00', 10), ('2025-06-01 12:00:00', 100)),
+        'variações de saldo': _sql_variacoes(1, ('2025-01-01 00:00:00', 10), ('2025-06-01 12:00:00', 100)),
+        'variação de saldo': _sql_variacao_saldo(1, ('2025-01-01 00:00:00', 10), ('2025-06-01 12:00:00', 100)),
+    }
+
+def verificar_planos_consulta():
+    """Corre EXPLAIN QUERY PLAN sobre cada consulta e devolve as que recorrem a um varrimento completo.
+
+    O resultado é um dicionário {nome da consulta: [linhas do plano]} contendo apenas as
+    consultas problemáticas; um dicionário vazio significa que todas usam índices.
+    """
+    conn = obter_conexao()
+    if conn is None: return None
+    problemas = {}
+    for nome, (query, params) in _consultas_a_verificar().items():
+        plano = [linha['detail'] for linha in conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+        # "SCAN (subquery-N)" percorre o resultado intermédio de uma função de janela, não uma tabela.
+        if any(detalhe.startswith('SCAN ') and 'CONSTANT ROW' not in detalhe and not detalhe.startswith('SCAN (subquery')
+               for detalhe in plano):
+            problemas[nome] = plano
+    return problemas
 
 
 # =================================================================
@@ -72,7 +1290,7 @@ def inicializar_banco():
 # =================================================================
 
 def adicionar_usuario(email, senha_hash):
-    conn = criar_conexao()
+    conn = obter_conexao()
     if conn is None: return False
     try:
         query = "INSERT INTO usuarios (email, senha_hash) VALUES (?, ?)"
@@ -82,229 +1300,428 @@ def adicionar_usuario(email, senha_hash):
     except sqlite3.Error as e:
         print(f"Erro ao adicionar utilizador: {e}")
         return False
-    finally:
-        if conn: conn.close()
 
 def buscar_usuario_por_email(email):
-    conn = criar_conexao()
+    conn = obter_conexao()
     if conn is None: return None
     try:
-        query = "SELECT * FROM usuarios WHERE email = ?"
+        query = 'SELECT id, email, senha_hash, saldo AS "saldo [centavos]", data_criacao FROM usuarios WHERE email = ?'
         cursor = conn.execute(query, (email,))
         return cursor.fetchone()
     except sqlite3.Error as e:
         print(f"Erro ao buscar utilizador: {e}")
         return None
-    finally:
-        if conn: conn.close()
+
+def listar_usuarios():
+    """Devolve (id, email) de todos os utilizadores, por id."""
+    conn = obter_conexao()
+    if conn is None: return []
+    try:
+        return conn.execute("SELECT id, email FROM usuarios ORDER BY id").fetchall()
+    except sqlite3.Error as e:
+        print(f"Erro ao listar utilizadores: {e}")
+        return []
+
+def _inserir_transacao(conn, usuario_id, tipo, centavos, categoria=None):
+    """Insere uma transação e atualiza o saldo e o agregado mensal, dentro da transação já aberta em `conn`.
+
+    `centavos` já vem validado (_centavos_positivos) por quem chama.
+    """
+    query_transacao = "INSERT INTO transacoes (usuario_id, tipo, valor, categoria) VALUES (?, ?, ?, ?)"
+    cursor = conn.execute(query_transacao, (usuario_id, tipo, centavos, categoria))
+    _aplicar_resumo(conn, "id = ?", (cursor.lastrowid,))
+    _invalidar_checkpoints(conn, "id = ?", (cursor.lastrowid,))
+    if tipo == 'saque' and categoria is not None:
+        _avaliar_alertas_orcamento(conn, _chaves_orcamento(conn, "id = ?", (cursor.lastrowid,)), so_aumentos=True)
+    sinal = "+" if tipo == 'deposito' else "-"
+    query_saldo = f"UPDATE usuarios SET saldo = saldo {sinal} ? WHERE id = ?"
+    conn.execute(query_saldo, (centavos, usuario_id))
 
 def registrar_transacao(usuario_id, tipo, valor, categoria=None):
-    conn = criar_conexao()
+    conn = obter_conexao()
     if conn is None: return False
     try:
-        conn.execute("BEGIN TRANSACTION")
-        query_transacao = "INSERT INTO transacoes (usuario_id, tipo, valor, categoria) VALUES (?, ?, ?, ?)"
-        conn.execute(query_transacao, (usuario_id, tipo, valor, categoria))
-        sinal = "+" if tipo == 'deposito' else "-"
-        query_saldo = f"UPDATE usuarios SET saldo = saldo {sinal} ? WHERE id = ?"
-        conn.execute(query_saldo, (valor, usuario_id))
+        centavos = _centavos_positivos(valor)
+        _iniciar_escrita(conn, "registrar_transacao")
+        _inserir_transacao(conn, usuario_id, tipo, centavos, categoria)
         conn.commit()
+        _dados_alterados(usuario_id)
         return True
-    except sqlite3.Error as e:
+    except (sqlite3.Error, ValueError) as e:
         print(f"Erro ao registar transação: {e}")
         conn.rollback()
         return False
-    finally:
-        if conn: conn.close()
 
 def registrar_transferencia(id_remetente, email_destinatario, valor):
-    conn = criar_conexao()
+    conn = obter_conexao()
     if conn is None: return {'sucesso': False, 'mensagem': 'Não foi possível ligar à base de dados.'}
     try:
-        conn.execute("BEGIN TRANSACTION")
-        
+        centavos = _para_centavos(valor)
+        if centavos <= 0:
+            return {'sucesso': False, 'mensagem': 'O valor da transferência deve ser positivo.'}
+        repeticoes = _iniciar_escrita(conn, "registrar_transferencia")
+
         cursor_remetente = conn.execute("SELECT saldo FROM usuarios WHERE id = ?", (id_remetente,))
         saldo_remetente = cursor_remetente.fetchone()['saldo']
-        if saldo_remetente < valor:
+        if saldo_remetente < centavos:
             conn.rollback()
-            return {'sucesso': False, 'mensagem': 'Saldo insuficiente.'}
+            return {'sucesso': False, 'mensagem': 'Saldo insuficiente.', 'repeticoes': repeticoes}
 
         cursor_dest = conn.execute("SELECT id FROM usuarios WHERE email = ?", (email_destinatario,))
         destinatario = cursor_dest.fetchone()
         if not destinatario:
             conn.rollback()
-            return {'sucesso': False, 'mensagem': 'Email do destinatário não encontrado.'}
+            return {'sucesso': False, 'mensagem': 'Email do destinatário não encontrado.', 'repeticoes': repeticoes}
         id_destinatario = destinatario['id']
         
         if id_remetente == id_destinatario:
             conn.rollback()
-            return {'sucesso': False, 'mensagem': 'Não pode transferir para si mesmo.'}
+            return {'sucesso': False, 'mensagem': 'Não pode transferir para si mesmo.', 'repeticoes': repeticoes}
 
-        conn.execute("UPDATE usuarios SET saldo = saldo - ? WHERE id = ?", (valor, id_remetente))
-        conn.execute("UPDATE usuarios SET saldo = saldo + ? WHERE id = ?", (valor, id_destinatario))
-        conn.execute("INSERT INTO transacoes (usuario_id, tipo, valor, categoria) VALUES (?, 'saque', ?, 'Transferência Enviada')", (id_remetente, valor))
-        conn.execute("INSERT INTO transacoes (usuario_id, tipo, valor, categoria) VALUES (?, 'deposito', ?, 'Transferência Recebida')", (id_destinatario, valor))
+        conn.execute("UPDATE usuarios SET saldo = saldo - ? WHERE id = ?", (centavos, id_remetente))
+        conn.execute("UPDATE usuarios SET saldo = saldo + ? WHERE id = ?", (centavos, id_destinatario))
+        cursor_envio = conn.execute("INSERT INTO transacoes (usuario_id, tipo, valor, categoria) VALUES (?, 'saque', ?, 'Transferência Enviada')", (id_remetente, centavos))
+        cursor_rececao = conn.execute("INSERT INTO transacoes (usuario_id, tipo, valor, categoria) VALUES (?, 'deposito', ?, 'Transferência Recebida')", (id_destinatario, centavos))
+        _aplicar_resumo(conn, "id IN (?, ?)", (cursor_envio.lastrowid, cursor_rececao.lastrowid))
+        _invalidar_checkpoints(conn, "id IN (?, ?)", (cursor_envio.lastrowid, cursor_rececao.lastrowid))
+        _avaliar_alertas_orcamento(conn, _chaves_orcamento(conn, "id = ?", (cursor_envio.lastrowid,)), so_aumentos=True)
         
         conn.commit()
-        return {'sucesso': True, 'mensagem': 'Transferência realizada com sucesso!'}
-    except sqlite3.Error as e:
+        _dados_alterados(id_remetente, id_destinatario)
+        return {'sucesso': True, 'mensagem': 'Transferência realizada com sucesso!', 'repeticoes': repeticoes}
+    except (sqlite3.Error, ValueError) as e:
         print(f"Erro na transferência: {e}")
         conn.rollback()
+        if _base_ocupada(e):
+            return {'sucesso': False, 'mensagem': 'A base de dados está ocupada. Tente novamente.'}
         return {'sucesso': False, 'mensagem': 'Ocorreu um erro interno. Tente novamente.'}
-    finally:
-        if conn: conn.close()
 
+def _inserir_em_lote(conn, transacoes):
+    """Insere as transações dentro da transação já aberta em `conn`.
+
+    As linhas são consumidas do iterável à medida que o executemany avança, sem as
+    materializar em memória. O saldo de cada utilizador é ajustado uma única vez, com
+    o efeito líquido das linhas inseridas. Devolve (lidas, inseridas, ids dos utilizadores afetados).
+    """
+    ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM transacoes").fetchone()[0]
+    lidas = 0
 
+    def linhas():
+        nonlocal lidas
+        for t in transacoes:
+            if t['tipo'] not in ('deposito', 'saque'):
+                raise ValueError(f"Tipo de transação inválido: {t['tipo']!r}")
+            centavos = _centavos_positivos(t['valor'])
+            lidas += 1
+            yield (t['usuario_id'], t['tipo'], centavos, t.get('categoria'),
+                   _texto_data_hora(t.get('data_transacao')), t.get('id_externo'))
+
+    # Só os duplicados de id_externo (o índice único parcial) são ignorados; outras
+    # violações de restrições (NOT NULL, CHECK) continuam a falhar o lote inteiro.
+    cursor = conn.executemany("""
+        INSERT INTO transacoes (usuario_id, tipo, valor, categoria, data_transacao, id_externo)
+        VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+        ON CONFLICT(usuario_id, id_externo) WHERE id_externo IS NOT NULL DO NOTHING
+    """, linhas())
+    inseridas = cursor.rowcount
+    variacoes = []
+    if inseridas > 0:
+        # As linhas novas ocupam o fim da árvore de rowid: basta percorrer id > ultimo_id.
+        variacoes = conn.execute("""
+            SELECT usuario_id, SUM(CASE WHEN tipo = 'deposito' THEN valor ELSE -valor END) as variacao
+            FROM transacoes WHERE id > ? GROUP BY usuario_id
+        """, (ultimo_id,)).fetchall()
+        conn.executemany("UPDATE usuarios SET saldo = saldo + ? WHERE id = ?",
+                         [(linha['variacao'], linha['usuario_id']) for linha in variacoes])
+        _aplicar_resumo(conn, "id > ?", (ultimo_id,))
+        _invalidar_checkpoints(conn, "id > ?", (ultimo_id,))
+        _avaliar_alertas_orcamento(conn, _chaves_orcamento(conn, "id > ?", (ultimo_id,)), so_aumentos=True)
+    return lidas, inseridas, [linha['usuario_id'] for linha in variacoes]
+
+def registrar_transacoes_em_lote(transacoes):
+    """Regista muitas transações numa única transação da base de dados.
+
+    `transacoes` é um iterável (pode ser um gerador) de dicionários com as chaves
+    usuario_id, tipo, valor (em reais) e, opcionalmente, categoria, data_transacao e id_externo.
+    Linhas cujo id_externo já exista para o utilizador são ignoradas. Se alguma linha
+    for inválida, nada é gravado.
+    """
+    conn = obter_conexao()
+    if conn is None: return {'sucesso': False, 'mensagem': 'Não foi possível ligar à base de dados.'}
+    try:
+        _iniciar_escrita(conn, "registrar_transacoes_em_lote")
+        lidas, inseridas, usuarios_afetados = _inserir_em_lote(conn, transacoes)
+        conn.commit()
+        _dados_alterados(*usuarios_afetados)
+        return {'sucesso': True, 'inseridas': inseridas, 'ignoradas': lidas - inseridas}
+    except (sqlite3.Error, ValueError, KeyError) as e:
+        print(f"Erro ao registar transações em lote: {e}")
+        conn.rollback()
+        return {'sucesso': False, 'mensagem': str(e)}
+
+@_em_cache
 def obter_saldo(usuario_id):
-    conn = criar_conexao()
-    if conn is None: return 0.0
+    conn = obter_conexao()
+    if conn is None: return _leitura_falhou(ZERO_REAIS)
     try:
-        cursor = conn.execute("SELECT saldo FROM usuarios WHERE id = ?", (usuario_id,))
+        cursor = conn.execute('SELECT saldo AS "saldo [centavos]" FROM usuarios WHERE id = ?', (usuario_id,))
         resultado = cursor.fetchone()
-        return resultado['saldo'] if resultado else 0.0
+        return resultado['saldo'] if resultado else ZERO_REAIS
     except sqlite3.Error as e:
         print(f"Erro ao obter saldo: {e}")
-        return 0.0
-    finally:
-        if conn: conn.close()
+        return _leitura_falhou(ZERO_REAIS)
+
+def _com_saldo_corrido(conn, usuario_id, linhas):
+    """Formata as linhas do histórico acrescentando a cada uma o saldo depois dela ('saldo_apos').
+
+    Cada transação traz também a sua 'posicao' no histórico, (data_transacao, id), para
+    quem precise de as ordenar cronologicamente (ex.: ao aplicar exclusões sem recarregar).
+    O saldo depois da linha mais antiga é o do checkpoint mais próximo antes dela mais a
+    soma das transações entre os dois; a partir daí, as variações são acumuladas em
+    Python até à linha mais recente (várias vezes mais rápido do que uma função de janela
+    do SQLite). Só são lidas as transações entre esse checkpoint e a linha mais recente,
+    que numa pesquisa ordenada por valor podem ser muitas mais do que as da página.
+    """
+    if not linhas:
+        return []
+    posicoes = [(linha['data_transacao'], linha['id']) for linha in linhas]
+    mais_antiga, mais_recente = min(posicoes), max(posicoes)
+    checkpoint = _ultimo_checkpoint(conn, usuario_id, mais_antiga)
+    desde = (checkpoint['data_transacao'], checkpoint['transacao_id']) if checkpoint else None
+    fonte = _fonte_transacoes(conn, desde[0] if desde else None, mais_recente[0])
+    query, params = _sql_variacao_saldo(usuario_id, desde, mais_antiga, fonte)
+    saldo_inicial = (checkpoint['saldo'] if checkpoint else 0) + conn.execute(query, params).fetchone()[0]
+    saldos = {mais_antiga[1]: saldo_inicial}
+    query, params = _sql_variacoes(usuario_id, mais_antiga, mais_recente, fonte)
+    cursor = conn.cursor()
+    cursor.row_factory = None  # tuplas: evita criar um sqlite3.Row por transação lida
+    saldo = saldo_inicial
+    for transacao_id, variacao in cursor.execute(query, params):
+        saldo += variacao
+        saldos[transacao_id] = saldo
+    transacoes = []
+    for linha in linhas:
+        transacao = _formatar_transacao(linha)
+        transacao['saldo_apos'] = _de_centavos(saldos[linha['id']])
+        transacao['posicao'] = (linha['data_transacao'], linha['id'])
+        transacoes.append(transacao)
+    return transacoes
 
 def obter_historico(usuario_id, data_inicio=None, data_fim=None):
-    conn = criar_conexao()
+    conn = obter_conexao()
     if conn is None: return []
     try:
-        query_base = "SELECT id, tipo, valor, categoria, data_transacao FROM transacoes WHERE usuario_id = ?"
-        params = [usuario_id]
-        if data_inicio:
-            query_base += " AND DATE(data_transacao) >= ?"
-            params.append(data_inicio)
-        if data_fim:
-            query_base += " AND DATE(data_transacao) <= ?"
-            params.append(data_fim)
-        query_base += " ORDER BY data_transacao DESC"
-        
-        cursor = conn.execute(query_base, tuple(params))
-        historico_bruto = cursor.fetchall()
-
-        historico_formatado = []
-        for transacao_row in historico_bruto:
-            transacao_dict = dict(transacao_row)
-            dt_obj = datetime.strptime(transacao_dict['data_transacao'], '%Y-%m-%d %H:%M:%S')
-            transacao_dict['data'] = dt_obj.strftime('%d/%m/%Y %H:%M:%S')
-            del transacao_dict['data_transacao']
-            historico_formatado.append(transacao_dict)
-            
-        return historico_formatado
+        inicio, fim = _limites_data(data_inicio, data_fim)
+        _iniciar_com_arquivos(conn, inicio=inicio, fim=fim, usuario_id=usuario_id)  # as linhas e o saldo corrido vêm do mesmo instantâneo
+        fonte = _fonte_transacoes(conn, inicio, fim)
+        query_base, params = _sql_historico(usuario_id, data_inicio, data_fim, fonte)
+        linhas = conn.execute(query_base, params).fetchall()
+        transacoes = _com_saldo_corrido(conn, usuario_id, linhas)
+        conn.commit()
+        return transacoes
     except sqlite3.Error as e:
         print(f"Erro ao obter histórico: {e}")
+        conn.rollback()
         return []
-    finally:
-        if conn: conn.close()
 
+def obter_pagina_historico(usuario_id, data_inicio=None, data_fim=None, apos=None, limite=200):
+    """Devolve uma página do histórico, da transação mais recente para a mais antiga.
+
+    Usa paginação por chave sobre (data_transacao, id): `apos` é o cursor devolvido pela
+    página anterior (None para a primeira). O resultado é {'transacoes': [...], 'cursor': ...},
+    com cursor None quando não há mais páginas. Cada transação traz em 'saldo_apos' o saldo depois dela.
+    """
+    pagina = pesquisar_transacoes(usuario_id, data_inicio=data_inicio, data_fim=data_fim, apos=apos,
+                                  limite=limite, contar=False)
+    return {'transacoes': pagina['transacoes'], 'cursor': pagina['cursor']}
+
+def pesquisar_transacoes(usuario_id, tipo=None, categorias=None, valor_min=None, valor_max=None,
+                         data_inicio=None, data_fim=None, ordem='data_desc', apos=None, limite=200, contar=True):
+    """Pesquisa as transações do utilizador por tipo, categorias, intervalo de valores e de datas.
+
+    Os filtros são opcionais e juntam-se numa única consulta parametrizada, servida pelos
+    índices de `transacoes`; os valores são em reais, inclusive. `ordem` é uma das chaves
+    de ORDENS_PESQUISA, com paginação por chave como em obter_pagina_historico. Devolve
+    {'transacoes': [...], 'cursor': ..., 'total': ...}, em que 'total' é o número de
+    transações que cumprem os filtros, contado só na primeira página (None nas seguintes
+    ou com contar=False). Cada transação traz em 'saldo_apos' o saldo depois dela.
+
+    A página é primeiro lida só da tabela quente; com ordem 'data_desc', os arquivos só
+    são consultados se puderem ter transações tão recentes como alguma da página.
+    """
+    if ordem not in ORDENS_PESQUISA:
+        raise ValueError(f"Ordem de pesquisa desconhecida: {ordem!r}")
+    if tipo is not None and tipo not in TIPOS_TRANSACAO:
+        raise ValueError(f"Tipo de transação desconhecido: {tipo!r}")
+    filtros = {
+        'tipo': tipo, 'categorias': list(categorias or ()), 'data_inicio': data_inicio, 'data_fim': data_fim,
+        'valor_min': None if valor_min is None else _para_centavos(valor_min),
+        'valor_max': None if valor_max is None else _para_centavos(valor_max),
+    }
+    coluna, sentido = ORDENS_PESQUISA[ordem]
+    conn = obter_conexao()
+    if conn is None: return {'transacoes': [], 'cursor': None, 'total': None}
+    try:
+        inicio, fim = _limites_data(data_inicio, data_fim)
+        # Página, contagem e saldo corrido vêm do mesmo instantâneo.
+        _iniciar_com_arquivos(conn, inicio=inicio, fim=fim, usuario_id=usuario_id)
+        query, params = _sql_pesquisa(usuario_id, filtros, ordem, apos, limite + 1)
+        linhas = conn.execute(query, params).fetchall()
+        if apos and coluna == 'data_transacao':
+            if sentido == 'DESC' and (fim is None or apos[0] < fim):
+                fim = apos[0]
+            elif sentido == 'ASC' and (inicio is None or apos[0] > inicio):
+                inicio = apos[0]
+        arquivados = _anos_arquivados(conn, inicio, fim)
+        if arquivados and not (ordem == 'data_desc' and len(linhas) > limite and
+                               linhas[-1]['data_transacao'] > max(a['data_max'] for a in arquivados)):
+            query, params = _sql_pesquisa(usuario_id, filtros, ordem, apos, limite + 1, _fonte_transacoes(conn, inicio, fim))
+            linhas = conn.execute(query, params).fetchall()
+
+        total = None
+        if contar and apos is None:
+            if len(linhas) <= limite:
+                total = len(linhas)
+            else:
+                query, params = _sql_contagem_pesquisa(usuario_id, filtros, _fonte_transacoes(conn, inicio, fim))
+                total = conn.execute(query, params).fetchone()[0]
+        proximo_cursor = None
+        if len(linhas) > limite:
+            linhas = linhas[:limite]
+            ultima = linhas[-1]
+            proximo_cursor = (_para_centavos(ultima['valor']) if coluna == 'valor' else ultima['data_transacao'], ultima['id'])
+        transacoes = _com_saldo_corrido(conn, usuario_id, linhas)
+        conn.commit()
+        return {'transacoes': transacoes, 'cursor': proximo_cursor, 'total': total}
+    except sqlite3.Error as e:
+        print(f"Erro ao pesquisar transações: {e}")
+        conn.rollback()
+        return {'transacoes': [], 'cursor': None, 'total': None}
+
+@_em_cache
 def obter_gastos_por_categoria(usuario_id, data_inicio=None, data_fim=None):
-    conn = criar_conexao()
-    if conn is None: return []
+    conn = obter_conexao()
+    if conn is None: return _leitura_falhou([])
     try:
-        params = [usuario_id]
-        query = "SELECT categoria, SUM(valor) as total FROM transacoes WHERE usuario_id = ? AND tipo = 'saque' AND categoria IS NOT NULL"
-        if data_inicio:
-            query += " AND DATE(data_transacao) >= ?"
-            params.append(data_inicio)
-        if data_fim:
-            query += " AND DATE(data_transacao) <= ?"
-            params.append(data_fim)
-        query += " GROUP BY categoria HAVING total > 0 ORDER BY total DESC"
-        cursor = conn.execute(query, tuple(params))
-        return cursor.fetchall()
+        inicio, fim = _limites_data(data_inicio, data_fim)
+        _iniciar_com_arquivos(conn, inicio=inicio, fim=fim)
+        query, params = _sql_gastos_por_categoria(usuario_id, data_inicio, data_fim, _fonte_transacoes(conn, inicio, fim))
+        resultado = conn.execute(query, params).fetchall()
+        conn.commit()
+        return resultado
     except sqlite3.Error as e:
         print(f"Erro ao obter gastos por categoria: {e}")
-        return []
-    finally:
-        if conn: conn.close()
+        conn.rollback()
+        return _leitura_falhou([])
 
+def _resumo_de_linha(resultado):
+    entradas = resultado['total_entradas'] if resultado['total_entradas'] else ZERO_REAIS
+    saidas = resultado['total_saidas'] if resultado['total_saidas'] else ZERO_REAIS
+    return {'entradas': entradas, 'saidas': saidas}
+
+@_em_cache
+def obter_categorias_usuario(usuario_id):
+    """Categorias que o utilizador já usou, por ordem alfabética (lidas do agregado mensal)."""
+    conn = obter_conexao()
+    if conn is None: return _leitura_falhou([])
+    try:
+        cursor = conn.execute("SELECT DISTINCT categoria FROM resumo_mensal WHERE usuario_id = ? AND categoria <> '' ORDER BY categoria",
+                              (usuario_id,))
+        return [linha['categoria'] for linha in cursor]
+    except sqlite3.Error as e:
+        print(f"Erro ao obter categorias: {e}")
+        return _leitura_falhou([])
+
+@_em_cache
 def obter_resumo_mensal(usuario_id):
-    conn = criar_conexao()
-    if conn is None: return {'entradas': 0, 'saidas': 0}
+    conn = obter_conexao()
+    if conn is None: return _leitura_falhou({'entradas': ZERO_REAIS, 'saidas': ZERO_REAIS})
     try:
-        # Funções de data do SQLite são diferentes
-        query = """
-            SELECT
-                SUM(CASE WHEN tipo = 'deposito' THEN valor ELSE 0 END) as total_entradas,
-                SUM(CASE WHEN tipo = 'saque' THEN valor ELSE 0 END) as total_saidas
-            FROM transacoes
-            WHERE
-                usuario_id = ? AND
-                strftime('%Y-%m', data_transacao) = strftime('%Y-%m', 'now', 'localtime')
-        """
-        cursor = conn.execute(query, (usuario_id,))
-        resultado = cursor.fetchone()
-        entradas = resultado['total_entradas'] if resultado['total_entradas'] else 0
-        saidas = resultado['total_saidas'] if resultado['total_saidas'] else 0
-        return {'entradas': entradas, 'saidas': saidas}
+        query, params = _sql_resumo_mensal(usuario_id, *_mes_atual())
+        cursor = conn.execute(query, params)
+        return _resumo_de_linha(cursor.fetchone())
     except sqlite3.Error as e:
         print(f"Erro ao obter resumo mensal: {e}")
-        return {'entradas': 0, 'saidas': 0}
-    finally:
-        if conn: conn.close()
+        return _leitura_falhou({'entradas': ZERO_REAIS, 'saidas': ZERO_REAIS})
 
+@_em_cache
 def obter_top_categorias(usuario_id, limite=5):
-    conn = criar_conexao()
-    if conn is None: return []
+    conn = obter_conexao()
+    if conn is None: return _leitura_falhou([])
     try:
-        query = """
-            SELECT categoria, SUM(valor) as total
-            FROM transacoes
-            WHERE usuario_id = ? AND tipo = 'saque' AND categoria IS NOT NULL
-              AND strftime('%Y-%m', data_transacao) = strftime('%Y-%m', 'now', 'localtime')
-            GROUP BY categoria ORDER BY total DESC LIMIT ?
-        """
-        cursor = conn.execute(query, (usuario_id, limite))
+        query, params = _sql_top_categorias(usuario_id, *_mes_atual(), limite)
+        cursor = conn.execute(query, params)
         return cursor.fetchall()
     except sqlite3.Error as e:
         print(f"Erro ao obter top categorias: {e}")
-        return []
-    finally:
-        if conn: conn.close()
+        return _leitura_falhou([])
 
 def obter_ultimas_transacoes(usuario_id, limite=4):
-    conn = criar_conexao()
+    conn = obter_conexao()
     if conn is None: return []
     try:
-        query = "SELECT tipo, valor, categoria, data_transacao FROM transacoes WHERE usuario_id = ? ORDER BY data_transacao DESC LIMIT ?"
-        cursor = conn.execute(query, (usuario_id, limite))
-        historico_bruto = cursor.fetchall()
-
-        historico_formatado = []
-        for transacao_row in historico_bruto:
-            transacao_dict = dict(transacao_row)
-            dt_obj = datetime.strptime(transacao_dict['data_transacao'], '%Y-%m-%d %H:%M:%S')
-            transacao_dict['data'] = dt_obj.strftime('%d/%m/%Y')
-            del transacao_dict['data_transacao']
-            historico_formatado.append(transacao_dict)
-        return historico_formatado
+        query, params = _sql_ultimas_transacoes(usuario_id, limite)
+        cursor = conn.execute(query, params)
+        return [_formatar_transacao(linha, com_hora=False) for linha in cursor]
     except sqlite3.Error as e:
         print(f"Erro ao obter últimas transações: {e}")
         return []
-    finally:
-        if conn: conn.close()
 
-def obter_transacao_por_id(transacao_id):
-    conn = criar_conexao()
+@_em_cache
+def obter_snapshot_dashboard(usuario_id, limite_top=5, limite_ultimas=4):
+    """Lê tudo o que o dashboard mostra numa única transação de leitura.
+
+    Devolve {'saldo', 'resumo', 'top_categorias', 'ultimas_transacoes', 'alertas'} com os
+    mesmos formatos de obter_saldo, obter_resumo_mensal, obter_top_categorias,
+    obter_ultimas_transacoes e obter_alertas_orcamento (só os por ver), todos coerentes entre si.
+    """
+    vazio = {'saldo': ZERO_REAIS, 'resumo': {'entradas': ZERO_REAIS, 'saidas': ZERO_REAIS}, 'top_categorias': [], 'ultimas_transacoes': [], 'alertas': []}
+    conn = obter_conexao()
+    if conn is None: return _leitura_falhou(vazio)
+    try:
+        ano, mes = _mes_atual()
+        conn.execute("BEGIN TRANSACTION")
+        linha_saldo = conn.execute('SELECT saldo AS "saldo [centavos]" FROM usuarios WHERE id = ?', (usuario_id,)).fetchone()
+        resumo = _resumo_de_linha(conn.execute(*_sql_resumo_mensal(usuario_id, ano, mes)).fetchone())
+        top_categorias = conn.execute(*_sql_top_categorias(usuario_id, ano, mes, limite_top)).fetchall()
+        ultimas = [_formatar_transacao(linha, com_hora=False)
+                   for linha in conn.execute(*_sql_ultimas_transacoes(usuario_id, limite_ultimas))]
+        alertas = conn.execute(*_sql_alertas_orcamento(usuario_id)).fetchall()
+        conn.commit()
+        return {
+            'saldo': linha_saldo['saldo'] if linha_saldo else ZERO_REAIS,
+            'resumo': resumo,
+            'top_categorias': top_categorias,
+            'ultimas_transacoes': ultimas,
+            'alertas': alertas,
+        }
+    except sqlite3.Error as e:
+        print(f"Erro ao obter dados do dashboard: {e}")
+        conn.rollback()
+        return _leitura_falhou(vazio)
+
+def obter_transacao_por_id(transacao_id, usuario_id=None):
+    """A transação com este id; com `usuario_id`, só se for desse utilizador."""
+    conn = obter_conexao()
     if conn is None: return None
+    filtro, params = ("AND usuario_id = ?", (transacao_id, usuario_id)) if usuario_id is not None else ("", (transacao_id,))
     try:
-        cursor = conn.execute("SELECT * FROM transacoes WHERE id = ?", (transacao_id,))
+        cursor = conn.execute(f"""
+            SELECT id, usuario_id, tipo, valor AS "valor [centavos]", categoria, data_transacao, id_externo
+            FROM transacoes WHERE id = ? {filtro}
+        """, params)
         return cursor.fetchone()
     except sqlite3.Error as e:
         print(f"Erro ao buscar transação por ID: {e}")
         return None
-    finally:
-        if conn: conn.close()
 
 def excluir_transacao(transacao_id, usuario_id):
-    conn = criar_conexao()
+    conn = obter_conexao()
     if conn is None: return False
     try:
-        conn.execute("BEGIN TRANSACTION")
-        transacao = obter_transacao_por_id(transacao_id)
+        _iniciar_escrita(conn, "excluir_transacao")
+        transacao = conn.execute("SELECT tipo, valor FROM transacoes WHERE id = ? AND usuario_id = ?",
+                                 (transacao_id, usuario_id)).fetchone()
         if not transacao:
             conn.rollback()
             return False
@@ -313,106 +1730,379 @@ def excluir_transacao(transacao_id, usuario_id):
         sinal_ajuste = "+" if tipo == 'saque' else "-"
         query_saldo = f"UPDATE usuarios SET saldo = saldo {sinal_ajuste} ? WHERE id = ?"
         conn.execute(query_saldo, (valor, usuario_id))
+        chaves = _chaves_orcamento(conn, "id = ?", (transacao_id,))
+        _aplicar_resumo(conn, "id = ?", (transacao_id,), sinal=-1, usuario_id=usuario_id)
+        _invalidar_checkpoints(conn, "id = ?", (transacao_id,))
         conn.execute("DELETE FROM transacoes WHERE id = ?", (transacao_id,))
+        _avaliar_alertas_orcamento(conn, chaves)
         conn.commit()
+        _dados_alterados(usuario_id)
         return True
     except sqlite3.Error as e:
         print(f"Erro ao excluir transação: {e}")
         conn.rollback()
         return False
-    finally:
-        if conn: conn.close()
 
 def editar_transacao(transacao_id, usuario_id, novo_valor, nova_categoria):
-    conn = criar_conexao()
+    conn = obter_conexao()
     if conn is None: return {'sucesso': False}
     try:
-        conn.execute("BEGIN TRANSACTION")
-        transacao_original = obter_transacao_por_id(transacao_id)
+        novo_valor = _centavos_positivos(novo_valor)
+        _iniciar_escrita(conn, "editar_transacao")
+        transacao_original = conn.execute("SELECT tipo, valor FROM transacoes WHERE id = ? AND usuario_id = ?",
+                                          (transacao_id, usuario_id)).fetchone()
         if not transacao_original:
             conn.rollback()
             return {'sucesso': False}
         valor_original = transacao_original['valor']
         diferenca = valor_original - novo_valor
+        if transacao_original['tipo'] == 'deposito':
+            diferenca = -diferenca
         query_saldo = "UPDATE usuarios SET saldo = saldo + ? WHERE id = ?"
         conn.execute(query_saldo, (diferenca, usuario_id))
+        chaves = _chaves_orcamento(conn, "id = ?", (transacao_id,))
+        _aplicar_resumo(conn, "id = ?", (transacao_id,), sinal=-1, usuario_id=usuario_id)
         query_update = "UPDATE transacoes SET valor = ?, categoria = ? WHERE id = ?"
         conn.execute(query_update, (novo_valor, nova_categoria, transacao_id))
+        _aplicar_resumo(conn, "id = ?", (transacao_id,))
+        _invalidar_checkpoints(conn, "id = ?", (transacao_id,))
+        _avaliar_alertas_orcamento(conn, chaves | _chaves_orcamento(conn, "id = ?", (transacao_id,)))
         conn.commit()
+        _dados_alterados(usuario_id)
         return {'sucesso': True}
-    except sqlite3.Error as e:
+    except (sqlite3.Error, ValueError) as e:
         print(f"Erro ao editar transação: {e}")
         conn.rollback()
         return {'sucesso': False}
-    finally:
-        if conn: conn.close()
+
+def _condicao_ids(usuario_id, ids):
+    """Condição e parâmetros para as transações `ids` do utilizador (um só parâmetro, qualquer número de ids)."""
+    return "usuario_id = ? AND id IN (SELECT value FROM json_each(?))", (usuario_id, json.dumps([int(i) for i in ids]))
+
+def excluir_transacoes(ids, usuario_id):
+    """Exclui várias transações do utilizador numa única transação.
+
+    O saldo é ajustado uma só vez pela variação líquida das transações excluídas; o
+    agregado mensal e os checkpoints são tratados como em excluir_transacao. Ids que não
+    existem, são de outro utilizador ou estão arquivados são ignorados. Devolve
+    {'sucesso', 'removidas': [{'id', 'posicao', 'variacao'}], 'saldo'}, com o saldo final.
+    """
+    conn = obter_conexao()
+    if conn is None: return {'sucesso': False, 'removidas': []}
+    condicao, params = _condicao_ids(usuario_id, ids)
+    try:
+        _iniciar_escrita(conn, "excluir_transacoes")
+        linhas = conn.execute(f"SELECT id, data_transacao, {VARIACAO_SALDO} AS variacao FROM transacoes WHERE {condicao}",
+                              params).fetchall()
+        if linhas:
+            conn.execute("UPDATE usuarios SET saldo = saldo - ? WHERE id = ?",
+                         (sum(linha['variacao'] for linha in linhas), usuario_id))
+            chaves = _chaves_orcamento(conn, condicao, params)
+            _aplicar_resumo(conn, condicao, params, sinal=-1, usuario_id=usuario_id)
+            _invalidar_checkpoints(conn, condicao, params)
+            conn.execute(f"DELETE FROM transacoes WHERE {condicao}", params)
+            _avaliar_alertas_orcamento(conn, chaves)
+        saldo = conn.execute('SELECT saldo AS "saldo [centavos]" FROM usuarios WHERE id = ?', (usuario_id,)).fetchone()
+        conn.commit()
+        if linhas:
+            _dados_alterados(usuario_id)
+        removidas = [{'id': linha['id'], 'posicao': (linha['data_transacao'], linha['id']),
+                      'variacao': _de_centavos(linha['variacao'])} for linha in linhas]
+        return {'sucesso': True, 'removidas': removidas, 'saldo': saldo['saldo'] if saldo else ZERO_REAIS}
+    except sqlite3.Error as e:
+        print(f"Erro ao excluir transações: {e}")
+        conn.rollback()
+        return {'sucesso': False, 'removidas': []}
+
+def recategorizar_transacoes(ids, usuario_id, nova_categoria):
+    """Muda a categoria de várias transações do utilizador numa única transação.
+
+    O saldo e os checkpoints não mudam; o agregado mensal é movido da categoria antiga
+    para a nova. Ids ignorados como em excluir_transacoes. Devolve {'sucesso', 'alteradas': [ids]}.
+    """
+    conn = obter_conexao()
+    if conn is None: return {'sucesso': False, 'alteradas': []}
+    condicao, params = _condicao_ids(usuario_id, ids)
+    try:
+        _iniciar_escrita(conn, "recategorizar_transacoes")
+        alteradas = [linha['id'] for linha in conn.execute(f"SELECT id FROM transacoes WHERE {condicao}", params)]
+        if alteradas:
+            chaves = _chaves_orcamento(conn, condicao, params)
+            _aplicar_resumo(conn, condicao, params, sinal=-1, usuario_id=usuario_id)
+            conn.execute(f"UPDATE transacoes SET categoria = ? WHERE {condicao}", (nova_categoria, *params))
+            _aplicar_resumo(conn, condicao, params)
+            _avaliar_alertas_orcamento(conn, chaves | _chaves_orcamento(conn, condicao, params))
+        conn.commit()
+        if alteradas:
+            _dados_alterados(usuario_id)
+        return {'sucesso': True, 'alteradas': alteradas}
+    except sqlite3.Error as e:
+        print(f"Erro ao alterar a categoria das transações: {e}")
+        conn.rollback()
+        return {'sucesso': False, 'alteradas': []}
 
 def definir_ou_atualizar_orcamento(usuario_id, categoria, valor, mes, ano):
-    conn = criar_conexao()
+    conn = obter_conexao()
     if conn is None: return False
     try:
+        centavos = _centavos_positivos(valor)
+        _iniciar_escrita(conn, "definir_ou_atualizar_orcamento")
         query = """
             INSERT INTO orcamentos (usuario_id, categoria, valor, mes, ano)
             VALUES (?, ?, ?, ?, ?)
             ON CONFLICT(usuario_id, categoria, mes, ano) DO UPDATE SET valor=excluded.valor
         """
-        conn.execute(query, (usuario_id, categoria, valor, mes, ano))
+        conn.execute(query, (usuario_id, categoria, centavos, mes, ano))
+        _avaliar_alertas_orcamento(conn, [(usuario_id, ano, mes, categoria)])
         conn.commit()
+        _dados_alterados(usuario_id)
         return True
-    except sqlite3.Error as e:
+    except (sqlite3.Error, ValueError) as e:
         print(f"Erro ao definir orçamento: {e}")
+        conn.rollback()
         return False
-    finally:
-        if conn: conn.close()
 
+@_em_cache
 def obter_orcamentos_do_mes(usuario_id, mes, ano):
-    conn = criar_conexao()
-    if conn is None: return []
+    conn = obter_conexao()
+    if conn is None: return _leitura_falhou([])
     try:
-        query = "SELECT categoria, valor FROM orcamentos WHERE usuario_id = ? AND mes = ? AND ano = ?"
+        query = 'SELECT categoria, valor AS "valor [centavos]" FROM orcamentos WHERE usuario_id = ? AND mes = ? AND ano = ?'
         cursor = conn.execute(query, (usuario_id, mes, ano))
         return cursor.fetchall()
     except sqlite3.Error as e:
         print(f"Erro ao obter orçamentos: {e}")
-        return []
-    finally:
-        if conn: conn.close()
+        return _leitura_falhou([])
 
 def obter_gastos_vs_orcamentos(usuario_id, mes, ano):
-    conn = criar_conexao()
+    conn = obter_conexao()
     if conn is None: return []
     try:
-        query = """
-            SELECT
-                o.categoria, o.valor as orcamento, COALESCE(SUM(t.valor), 0) as gasto
-            FROM orcamentos o
-            LEFT JOIN transacoes t ON o.usuario_id = t.usuario_id
-                            AND o.categoria = t.categoria
-                            AND t.tipo = 'saque'
-                            AND CAST(strftime('%m', t.data_transacao) as integer) = o.mes
-                            AND CAST(strftime('%Y', t.data_transacao) as integer) = o.ano
-            WHERE o.usuario_id = ? AND o.mes = ? AND o.ano = ?
-            GROUP BY o.categoria, o.valor ORDER BY o.categoria
-        """
-        cursor = conn.execute(query, (usuario_id, mes, ano))
+        query, params = _sql_gastos_vs_orcamentos(usuario_id, mes, ano)
+        cursor = conn.execute(query, params)
         return cursor.fetchall()
     except sqlite3.Error as e:
         print(f"Erro ao comparar gastos vs orçamentos: {e}")
         return []
-    finally:
-        if conn: conn.close()
+
+def transportar_orcamentos(ano, mes=None, usuario_id=None, ajuste_percentual=0, substituir=False):
+    """Copia os orçamentos para o período seguinte numa única instrução.
+
+    Com `mes`, os orçamentos desse mês passam para o mês seguinte; sem `mes`, todos os
+    do ano passam para os mesmos meses do ano seguinte. Sem `usuario_id`, transporta os
+    de todos os utilizadores. `ajuste_percentual` (ex.: 5 ou -10, até duas casas decimais)
+    ajusta os valores copiados. Orçamentos que já existam no destino só são
+    substituídos com `substituir`. Devolve o número de orçamentos escritos, ou None em caso de erro.
+    """
+    conn = obter_conexao()
+    if conn is None: return None
+    if mes is None:
+        filtro, origem, periodo_destino = "ano = ?", [ano], [ano + 1]
+        destino, params_destino = "mes, ano + 1", ()
+    else:
+        ano_destino, mes_destino = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+        filtro, origem, periodo_destino = "ano = ? AND mes = ?", [ano, mes], [ano_destino, mes_destino]
+        destino, params_destino = "?, ?", (mes_destino, ano_destino)
+    if usuario_id is not None:
+        filtro += " AND usuario_id = ?"
+        origem.append(usuario_id)
+        periodo_destino.append(usuario_id)
+    conflito = "DO UPDATE SET valor = excluded.valor" if substituir else "DO NOTHING"
+    try:
+        # Fator em décimas de milésima: 10000 + ajuste em centésimas de ponto percentual.
+        fator = 10000 + _para_centavos(ajuste_percentual)
+        if fator <= 0:
+            raise ValueError(f"Ajuste percentual inválido: {ajuste_percentual!r}")
+        _iniciar_escrita(conn, "transportar_orcamentos")
+        cursor = conn.execute(f"""
+            INSERT INTO orcamentos (usuario_id, categoria, valor, mes, ano)
+            SELECT usuario_id, categoria, (valor * ? + 5000) / 10000, {destino}
+            FROM orcamentos WHERE {filtro}
+            ON CONFLICT(usuario_id, categoria, mes, ano) {conflito}
+        """, (fator, *params_destino, *origem))
+        escritos = cursor.rowcount
+        chaves = conn.execute(f"SELECT usuario_id, ano, mes, categoria FROM orcamentos WHERE {filtro}",
+                              periodo_destino).fetchall()
+        _avaliar_alertas_orcamento(conn, chaves)
+        conn.commit()
+        _dados_alterados(*{chave['usuario_id'] for chave in chaves})
+        return escritos
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Erro ao transportar orçamentos: {e}")
+        conn.rollback()
+        return None
+
+@_em_cache
+def obter_alertas_orcamento(usuario_id, apenas_novos=True):
+    """Alertas de orçamento do utilizador (ver SQL_TABELA_ALERTAS_ORCAMENTO), do mês mais recente para o mais antigo.
+
+    Com `apenas_novos`, só os que ainda não foram marcados como vistos.
+    """
+    conn = obter_conexao()
+    if conn is None: return _leitura_falhou([])
+    try:
+        return conn.execute(*_sql_alertas_orcamento(usuario_id, apenas_novos)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Erro ao obter alertas de orçamento: {e}")
+        return _leitura_falhou([])
+
+def marcar_alertas_vistos(usuario_id, alertas):
+    """Marca como vistos os `alertas` do utilizador, como devolvidos por obter_alertas_orcamento.
+
+    Só esses: um alerta registado depois de terem sido lidos (ou apagado e registado de
+    novo, com outra data_alerta) continua por ver.
+    """
+    chaves = json.dumps([[alerta['ano'], alerta['mes'], alerta['categoria'], alerta['limiar'], alerta['data_alerta']]
+                         for alerta in alertas])
+    conn = obter_conexao()
+    if conn is None: return False
+    try:
+        _iniciar_escrita(conn, "marcar_alertas_vistos")
+        conn.execute("""
+            UPDATE alertas_orcamento SET visto = 1
+            WHERE usuario_id = ? AND visto = 0 AND (ano, mes, categoria, limiar, data_alerta) IN (
+                SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]'),
+                       json_extract(value, '$[3]'), json_extract(value, '$[4]')
+                FROM json_each(?))""", (usuario_id, chaves))
+        conn.commit()
+        _dados_alterados(usuario_id)
+        return True
+    except sqlite3.Error as e:
+        print(f"Erro ao marcar alertas como vistos: {e}")
+        conn.rollback()
+        return False
 
 def excluir_orcamento(usuario_id, categoria, mes, ano):
-    conn = criar_conexao()
+    conn = obter_conexao()
     if conn is None: return False
     try:
+        _iniciar_escrita(conn, "excluir_orcamento")
         query = "DELETE FROM orcamentos WHERE usuario_id = ? AND categoria = ? AND mes = ? AND ano = ?"
         conn.execute(query, (usuario_id, categoria, mes, ano))
+        _avaliar_alertas_orcamento(conn, [(usuario_id, ano, mes, categoria)])
         conn.commit()
+        _dados_alterados(usuario_id)
         return True
     except sqlite3.Error as e:
         print(f"Erro ao excluir orçamento: {e}")
+        conn.rollback()
         return False
-    finally:
-        if conn: conn.close()
 
+
+
+# =================================================================
+# 3. FUNÇÕES DE TRANSAÇÕES RECORRENTES
+# =================================================================
+
+def _ocorrencia_mensal(ano, mes, dia):
+    """Dia `dia` do mês, ou o último dia se o mês for mais curto."""
+    return date(ano, mes, min(dia, calendar.monthrange(ano, mes)[1]))
+
+def _ocorrencia_seguinte(frequencia, dia, ocorrencia):
+    if frequencia == 'semanal':
+        return ocorrencia + timedelta(days=7)
+    ano, mes = (ocorrencia.year + 1, 1) if ocorrencia.month == 12 else (ocorrencia.year, ocorrencia.month + 1)
+    return _ocorrencia_mensal(ano, mes, dia)
+
+def _primeira_ocorrencia(frequencia, dia, desde):
+    """Primeira ocorrência no dia `desde` ou depois dele."""
+    if frequencia == 'semanal':
+        return desde + timedelta(days=(dia - desde.weekday()) % 7)
+    ocorrencia = _ocorrencia_mensal(desde.year, desde.month, dia)
+    return ocorrencia if ocorrencia >= desde else _ocorrencia_seguinte(frequencia, dia, ocorrencia)
+
+def adicionar_transacao_recorrente(usuario_id, tipo, valor, categoria, frequencia, dia, data_inicio=None, data_fim=None):
+    """Cria uma transação recorrente e devolve o seu id, ou None em caso de erro.
+
+    `frequencia` é 'mensal' (dia 1-31) ou 'semanal' (dia 0-6, 0 = segunda-feira). Sem
+    `data_inicio`, começa hoje; as ocorrências são lançadas por materializar_transacoes_recorrentes.
+    """
+    conn = obter_conexao()
+    if conn is None: return None
+    try:
+        if tipo not in TIPOS_TRANSACAO:
+            raise ValueError(f"Tipo de transação inválido: {tipo!r}")
+        if frequencia not in FREQUENCIAS_RECORRENCIA:
+            raise ValueError(f"Frequência inválida: {frequencia!r}")
+        if not (0 <= dia <= 6 if frequencia == 'semanal' else 1 <= dia <= 31):
+            raise ValueError(f"Dia inválido para a frequência {frequencia}: {dia!r}")
+        centavos = _centavos_positivos(valor)
+        inicio = date.fromisoformat(_texto_data(data_inicio or date.today()))
+        fim = _texto_data(data_fim) if data_fim else None
+        proxima = _primeira_ocorrencia(frequencia, dia, inicio)
+        _iniciar_escrita(conn, "adicionar_transacao_recorrente")
+        cursor = conn.execute("""
+            INSERT INTO transacoes_recorrentes (usuario_id, tipo, valor, categoria, frequencia, dia, data_inicio, data_fim, proxima)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (usuario_id, tipo, centavos, categoria, frequencia, dia, inicio.isoformat(), fim, proxima.isoformat()))
+        conn.commit()
+        _dados_alterados(usuario_id)
+        return cursor.lastrowid
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Erro ao adicionar transação recorrente: {e}")
+        if conn.in_transaction:
+            conn.rollback()
+        return None
+
+@_em_cache
+def obter_transacoes_recorrentes(usuario_id):
+    conn = obter_conexao()
+    if conn is None: return _leitura_falhou([])
+    try:
+        return conn.execute(*_sql_recorrentes(usuario_id)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Erro ao obter transações recorrentes: {e}")
+        return _leitura_falhou([])
+
+def excluir_transacao_recorrente(recorrente_id, usuario_id):
+    """Apaga a recorrência; as ocorrências já lançadas ficam no histórico."""
+    conn = obter_conexao()
+    if conn is None: return False
+    try:
+        _iniciar_escrita(conn, "excluir_transacao_recorrente")
+        cursor = conn.execute("DELETE FROM transacoes_recorrentes WHERE id = ? AND usuario_id = ?", (recorrente_id, usuario_id))
+        conn.commit()
+        _dados_alterados(usuario_id)
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        print(f"Erro ao excluir transação recorrente: {e}")
+        conn.rollback()
+        return False
+
+def materializar_transacoes_recorrentes(usuario_id=None, ate=None):
+    """Lança todas as ocorrências vencidas até `ate` (por omissão, hoje), de um utilizador ou de todos.
+
+    Depois de meses sem abrir a aplicação, todas as ocorrências em atraso entram numa só
+    transação da base de dados, por _inserir_em_lote (um único ajuste de saldo por
+    utilizador), e a `proxima` de cada recorrência avança na mesma transação. Cada
+    ocorrência leva o id_externo 'recorrente:<id>:<data>', pelo que nunca é lançada
+    duas vezes, mesmo que a recorrência seja lida por outro processo a meio.
+    """
+    conn = obter_conexao()
+    if conn is None: return {'sucesso': False, 'mensagem': 'Não foi possível ligar à base de dados.'}
+    limite = date.fromisoformat(_texto_data(ate or date.today()))
+    proximas = []
+
+    def ocorrencias(recorrentes):
+        for r in recorrentes:
+            fim = min(limite, date.fromisoformat(r['data_fim'])) if r['data_fim'] else limite
+            ocorrencia = date.fromisoformat(r['proxima'])
+            while ocorrencia <= fim:
+                yield {'usuario_id': r['usuario_id'], 'tipo': r['tipo'], 'valor': _de_centavos(r['valor']),
+                       'categoria': r['categoria'], 'data_transacao': ocorrencia,
+                       'id_externo': f"recorrente:{r['id']}:{ocorrencia.isoformat()}"}
+                ocorrencia = _ocorrencia_seguinte(r['frequencia'], r['dia'], ocorrencia)
+            proximas.append((ocorrencia.isoformat(), r['id']))
+
+    try:
+        _iniciar_escrita(conn, "materializar_transacoes_recorrentes")
+        recorrentes = conn.execute(*_sql_recorrentes_vencidas(limite.isoformat(), usuario_id)).fetchall()
+        lidas, inseridas, _ = _inserir_em_lote(conn, ocorrencias(recorrentes))
+        conn.executemany("UPDATE transacoes_recorrentes SET proxima = ? WHERE id = ?", proximas)
+        conn.commit()
+        _dados_alterados(*{r['usuario_id'] for r in recorrentes})
+        return {'sucesso': True, 'inseridas': inseridas, 'ignoradas': lidas - inseridas, 'recorrencias': len(recorrentes)}
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Erro ao lançar transações recorrentes: {e}")
+        conn.rollback()
+        return {'sucesso': False, 'mensagem': str(e)}
@@ -0,0 +1,142 @@
+"""Escrita agrupada (group commit) de transações.
+
+Cada chamada a db_manager.registrar_transacao confirma a sua própria transação, e com
+synchronous=FULL cada confirmação custa um fsync. Com EscritorAgrupado, as escritas
+entram numa fila e uma única thread escritora confirma-as em lotes, cada um com um só
+fsync. Um lote leva o que estiver na fila, até `max_lote` pedidos; com `espera_max_ms`
+> 0, espera ainda até esse tempo depois do primeiro pedido para o encher. Por omissão
+não espera: os pedidos que chegam enquanto um lote é confirmado formam o seguinte.
+Cada pedido devolve um Future que só fica concluído depois de o seu lote estar confirmado.
+
+Uso:
+    escritor = EscritorAgrupado(sincronizacao="FULL")
+    futuro = escritor.registrar_transacao(usuario_id, 'saque', 12.5, "Lazer")
+    futuro.result()  # True quando a escrita está no disco; exceção se falhou
+    escritor.encerrar()
+"""
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import db_manager
+
+# synchronous da conexão da thread escritora: FULL garante que um lote confirmado
+# sobrevive a uma falha de energia; NORMAL (o do resto da aplicação, em modo WAL) só
+# garante que a base de dados não se corrompe, podendo perder os últimos lotes.
+NIVEIS_SINCRONIZACAO = ("OFF", "NORMAL", "FULL", "EXTRA")
+_FIM = object()
+
+
+class EscritorAgrupado:
+    """Fila de escritas confirmadas em lotes por uma thread escritora dedicada."""
+
+    def __init__(self, max_lote=256, espera_max_ms=0, sincronizacao="FULL"):
+        if sincronizacao not in NIVEIS_SINCRONIZACAO:
+            raise ValueError(f"Nível de sincronização inválido: {sincronizacao!r}")
+        self.max_lote = max_lote
+        self.espera_max_s = espera_max_ms / 1000
+        self.sincronizacao = sincronizacao
+        self.lotes = 0
+        self.escritas = 0
+        self._conn = None
+        self._fila = queue.SimpleQueue()
+        self._encerrado = False
+        self._lock_fila = threading.Lock()  # torna atómicos "verificar _encerrado + pôr na fila" e o _FIM
+        self._thread = threading.Thread(target=self._escrever, name="escrita-agrupada", daemon=True)
+        self._thread.start()
+
+    def registrar_transacao(self, usuario_id, tipo, valor, categoria=None):
+        """Põe a transação na fila; devolve um Future com True depois de confirmada.
+
+        Depois de encerrar, lança RuntimeError: nenhum pedido entra na fila depois do _FIM.
+        """
+        futuro = Future()
+        try:
+            centavos = db_manager._centavos_positivos(valor)
+        except ValueError as e:
+            futuro.set_exception(e)  # valor inválido: falha já, sem entrar num lote
+            return futuro
+        with self._lock_fila:
+            if self._encerrado:
+                raise RuntimeError("O escritor agrupado já foi encerrado.")
+            self._fila.put((futuro, (usuario_id, tipo, centavos, categoria)))
+        return futuro
+
+    def encerrar(self):
+        """Confirma o que está na fila e termina a thread escritora."""
+        with self._lock_fila:
+            if self._encerrado:
+                return
+            self._encerrado = True
+            self._fila.put(_FIM)
+        self._thread.join()
+
+    def _escrever(self):
+        while True:
+            pedido = self._fila.get()
+            if pedido is _FIM:
+                return
+            lote, fim = [pedido], False
+            limite = time.monotonic() + self.espera_max_s
+            while len(lote) < self.max_lote:
+                try:
+                    pedido = self._fila.get(timeout=max(0, limite - time.monotonic()))
+                except queue.Empty:
+                    break
+                if pedido is _FIM:
+                    fim = True
+                    break
+                lote.append(pedido)
+            try:
+                self._confirmar(lote)
+            except Exception as e:
+                # A thread escritora não pode morrer: os pedidos seguintes ficariam à espera para sempre.
+                print(f"Erro inesperado na escrita agrupada: {e}")
+                for futuro, _ in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+            if fim:
+                return
+
+    def _obter_conexao(self):
+        conn = db_manager.obter_conexao()
+        if conn is not None and conn is not self._conn:
+            conn.execute(f"PRAGMA synchronous = {self.sincronizacao}")
+            self._conn = conn
+        return conn
+
+    def _confirmar(self, lote):
+        """Grava o lote numa única transação; um pedido inválido só falha o seu próprio Future."""
+        aceites = []
+        conn = None
+        try:
+            conn = self._obter_conexao()  # o PRAGMA synchronous de uma conexão nova também pode falhar
+            if conn is None:
+                raise sqlite3.OperationalError("Não foi possível ligar à base de dados.")
+            db_manager._iniciar_escrita(conn, "escrita_agrupada")
+            for futuro, (usuario_id, tipo, centavos, categoria) in lote:
+                conn.execute("SAVEPOINT pedido")
+                try:
+                    db_manager._inserir_transacao(conn, usuario_id, tipo, centavos, categoria)
+                    conn.execute("RELEASE pedido")
+                    aceites.append((futuro, usuario_id))
+                except (sqlite3.Error, ValueError) as e:
+                    conn.execute("ROLLBACK TO pedido")
+                    conn.execute("RELEASE pedido")
+                    futuro.set_exception(e)
+            conn.commit()
+        except Exception as e:
+            print(f"Erro na escrita agrupada: {e}")
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+            for futuro, _ in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        self.lotes += 1
+        self.escritas += len(aceites)
+        db_manager._dados_alterados(*{usuario_id for _, usuario_id in aceites})
+        for futuro, _ in aceites:
+            futuro.set_result(True)
@@ -0,0 +1,94 @@
+"""Execução das chamadas ao db_manager fora da thread do Tk.
+
+O Tk só pode ser manipulado pela thread que criou os widgets, por isso as funções
+correm num pequeno conjunto de threads de trabalho e os resultados são entregues de
+volta ao mainloop através de uma fila consultada com after().
+"""
+import queue
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorDB:
+    """Corre funções em threads de trabalho e chama os callbacks na thread do Tk.
+
+    Pedidos submetidos com a mesma `chave` substituem-se uns aos outros: ao submeter
+    um novo, o anterior é cancelado se ainda não começou e, se já estiver a correr, o
+    seu resultado é descartado quando chegar. Assim, mudar um filtro várias vezes
+    seguidas só mostra o resultado do último pedido.
+    """
+
+    def __init__(self, raiz, max_threads=2, intervalo_ms=15):
+        self._raiz = raiz
+        self._intervalo_ms = intervalo_ms
+        self._pool = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="db")
+        self._resultados = queue.SimpleQueue()
+        self._geracoes = {}
+        self._futuros = {}
+        self._pendentes = 0
+        self._agendado = False
+
+    def submeter(self, funcao, *args, ao_concluir=None, ao_falhar=None, chave=None, **kwargs):
+        """Agenda funcao(*args, **kwargs) e devolve o Future correspondente.
+
+        ao_concluir(resultado) e ao_falhar(excecao) são chamados na thread do Tk.
+        """
+        geracao = None
+        if chave is not None:
+            geracao = self._geracoes.get(chave, 0) + 1
+            self._geracoes[chave] = geracao
+            anterior = self._futuros.get(chave)
+            if anterior is not None:
+                anterior.cancel()
+        futuro = self._pool.submit(funcao, *args, **kwargs)
+        if chave is not None:
+            self._futuros[chave] = futuro
+        self._pendentes += 1
+        futuro.add_done_callback(lambda f: self._resultados.put((f, chave, geracao, ao_concluir, ao_falhar)))
+        self._agendar_entrega()
+        return futuro
+
+    def cancelar(self, chave):
+        """Descarta o pedido pendente com esta chave (por exemplo, ao fechar a janela que o pediu)."""
+        self._geracoes[chave] = self._geracoes.get(chave, 0) + 1
+        futuro = self._futuros.pop(chave, None)
+        if futuro is not None:
+            futuro.cancel()
+
+    def encerrar(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _agendar_entrega(self):
+        if not self._agendado:
+            self._agendado = True
+            self._raiz.after(self._intervalo_ms, self._entregar)
+
+    def _entregar(self):
+        self._agendado = False
+        while True:
+            try:
+                futuro, chave, geracao, ao_concluir, ao_falhar = self._resultados.get_nowait()
+            except queue.Empty:
+                break
+            self._pendentes -= 1
+            if chave is not None:
+                if self._futuros.get(chave) is futuro:
+                    del self._futuros[chave]
+                if self._geracoes.get(chave) != geracao:
+                    continue  # pedido substituído entretanto
+            if futuro.cancelled():
+                continue
+            try:
+                erro = futuro.exception()
+                if erro is None:
+                    if ao_concluir is not None:
+                        ao_concluir(futuro.result())
+                elif ao_falhar is not None:
+                    ao_falhar(erro)
+                else:
+                    traceback.print_exception(type(erro), erro, erro.__traceback__)
+            except Exception:
+                # Um callback com erro (ex.: janela já fechada) não pode parar as entregas seguintes.
+                traceback.print_exc()
+        if self._pendentes > 0:
+            self._agendar_entrega()
@@ -0,0 +1,184 @@
+"""Estatísticas e previsão do fluxo de caixa de um utilizador, sobre séries diárias em NumPy.
+
+obter_fluxo_caixa lê numa só consulta o total de cada dia por tipo e categoria (também
+das transações arquivadas) e calcula tudo com operações vetorizadas, sem ciclos por
+linha em Python:
+
+    - séries diárias de entradas, saídas e saldo no fim de cada dia;
+    - médias móveis das entradas e saídas em `janela` dias;
+    - totais por mês, com a variação percentual face ao mês anterior;
+    - volatilidade dos gastos de cada categoria (desvio-padrão mensal e coeficiente de
+      variação), nos meses completos do período;
+    - previsão do saldo para os próximos `dias_previsao` dias: tendência linear do saldo
+      nos últimos `janela_tendencia` dias, com uma faixa de um desvio-padrão que cresce
+      com a raiz do número de dias (passeio aleatório dos movimentos diários).
+
+As séries diárias vêm em reais como float, prontas para gráficos; os totais e médias
+vêm como Decimal, como no resto da aplicação.
+
+Uso:
+    fluxo = fluxo_caixa.obter_fluxo_caixa(usuario_id, meses=12)
+    fluxo['meses'][-1]['variacao_saidas'], fluxo['previsao']['saldo_final']
+"""
+import sqlite3
+from datetime import date
+
+import numpy as np
+
+import db_manager
+
+JANELA_MEDIA = 30
+JANELA_TENDENCIA = 90
+DIAS_PREVISAO = 90
+
+
+def _reais(centavos):
+    return db_manager._de_centavos(round(centavos))
+
+
+def _media_movel(valores, janela):
+    """Média dos últimos `janela` valores em cada posição (dos que existirem, no início da série)."""
+    acumulado = np.concatenate(([0.0], np.cumsum(valores)))
+    posicoes = np.arange(1, len(valores) + 1)
+    inicios = np.maximum(posicoes - janela, 0)
+    return (acumulado[posicoes] - acumulado[inicios]) / (posicoes - inicios)
+
+
+def _variacao_percentual(totais):
+    """Variação de cada mês face ao anterior, em %; None no primeiro mês e quando o anterior é zero."""
+    anteriores = totais[:-1]
+    variacoes = np.full(len(totais), np.nan)
+    com_base = anteriores != 0
+    variacoes[1:][com_base] = (totais[1:][com_base] - anteriores[com_base]) / anteriores[com_base] * 100
+    return [None if np.isnan(variacao) else round(variacao, 1) for variacao in variacoes.tolist()]
+
+
+def _volatilidade(meses_linhas, categorias_linhas, totais_linhas, nomes, meses_completos):
+    """Média, desvio-padrão e coeficiente de variação dos gastos mensais de cada categoria."""
+    if meses_completos < 2:
+        return []
+    dentro = meses_linhas < meses_completos
+    matriz = np.bincount(meses_linhas[dentro] * len(nomes) + categorias_linhas[dentro], weights=totais_linhas[dentro],
+                         minlength=meses_completos * len(nomes)).reshape(meses_completos, len(nomes))
+    medias = matriz.mean(axis=0)
+    desvios = matriz.std(axis=0)
+    com_gastos = np.flatnonzero(medias > 0)
+    coeficientes = desvios[com_gastos] / medias[com_gastos]
+    ordem = com_gastos[np.argsort(-coeficientes, kind='stable')]
+    return [{'categoria': nomes[codigo], 'media': _reais(media), 'desvio': _reais(desvio), 'coeficiente': round(desvio / media, 3)}
+            for codigo, media, desvio in zip(ordem.tolist(), medias[ordem].tolist(), desvios[ordem].tolist())]
+
+
+def _previsao(saldos, janela_tendencia, dias_previsao):
+    """Tendência linear do saldo nos últimos `janela_tendencia` dias, prolongada `dias_previsao` dias."""
+    recentes = saldos[-janela_tendencia:]
+    if len(recentes) >= 2:
+        tendencia = np.polyfit(np.arange(len(recentes)), recentes, 1)[0]
+        desvio = np.diff(recentes).std()
+    else:
+        tendencia = desvio = 0.0
+    passos = np.arange(1, dias_previsao + 1)
+    previsto = saldos[-1] + tendencia * passos
+    return {
+        'saldo': (previsto / 100).tolist(),
+        'desvio': (desvio * np.sqrt(passos) / 100).tolist(),
+        'tendencia_diaria': _reais(tendencia),
+        'saldo_final': _reais(previsto[-1]) if dias_previsao else _reais(saldos[-1]),
+    }
+
+
+def _ler_linhas(conn, usuario_id, inicio, fonte="transacoes"):
+    """Linhas de db_manager._sql_fluxo_diario como tuplos simples, bem mais rápidos de desempacotar do que sqlite3.Row."""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor.execute(*db_manager._sql_fluxo_diario(usuario_id, inicio, fonte)).fetchall()
+
+
+def _calcular(linhas, saldo_atual, inicio, hoje, meses, janela, dias_previsao, janela_tendencia):
+    """As estatísticas de obter_fluxo_caixa a partir das linhas de db_manager._sql_fluxo_diario e do saldo atual (centavos)."""
+    # Eixo diário de `inicio` até ao último dia com transações (hoje, salvo datas futuras).
+    dias_texto, saques, categorias, totais = zip(*linhas) if linhas else ((), (), (), ())
+    dia_inicio = np.datetime64(inicio, 'D').astype(np.int64)
+    dias = np.array(dias_texto, dtype='datetime64[D]').astype(np.int64) - dia_inicio
+    saques = np.array(saques, dtype=bool)
+    totais = np.array(totais, dtype=np.float64)
+    ultimo = max(int(dias.max()) if len(dias) else 0, (hoje - inicio).days)
+    entradas = np.bincount(dias[~saques], weights=totais[~saques], minlength=ultimo + 1)
+    saidas = np.bincount(dias[saques], weights=totais[saques], minlength=ultimo + 1)
+    # Saldo no fim de cada dia: o atual menos os movimentos dos dias seguintes.
+    liquido = entradas - saidas
+    saldos = saldo_atual - (liquido.sum() - np.cumsum(liquido))
+    # Até hoje: os dias futuros só contam para o saldo.
+    fim_serie = (hoje - inicio).days + 1
+    entradas, saidas, saldos = entradas[:fim_serie], saidas[:fim_serie], saldos[:fim_serie]
+
+    media_entradas, media_saidas = _media_movel(entradas, janela), _media_movel(saidas, janela)
+
+    # Mês de cada dia (0 = mês de `inicio`), por tabela, sem contas de calendário por dia.
+    mes_do_dia = (np.arange(dia_inicio, dia_inicio + len(entradas)).astype('datetime64[D]').astype('datetime64[M]')
+                  .astype(np.int64) - np.datetime64(inicio, 'M').astype(np.int64))
+    entradas_mes = np.bincount(mes_do_dia, weights=entradas, minlength=meses)
+    saidas_mes = np.bincount(mes_do_dia, weights=saidas, minlength=meses)
+    nomes_meses = np.arange(np.datetime64(inicio, 'M'), np.datetime64(inicio, 'M') + meses).astype(str).tolist()
+    meses_resultado = [{
+        'mes': nome, 'entradas': _reais(entrada), 'saidas': _reais(saida), 'liquido': _reais(entrada - saida),
+        'variacao_entradas': variacao_entrada, 'variacao_saidas': variacao_saida,
+    } for nome, entrada, saida, variacao_entrada, variacao_saida in zip(
+        nomes_meses, entradas_mes.tolist(), saidas_mes.tolist(),
+        _variacao_percentual(entradas_mes), _variacao_percentual(saidas_mes))]
+
+    # As linhas vêm ordenadas por tipo e categoria: cada mudança abre um grupo, sem ordenar os nomes.
+    categorias = np.array(categorias, dtype=object)
+    novo_grupo = np.ones(len(categorias), dtype=bool)
+    novo_grupo[1:] = (saques[1:] != saques[:-1]) | (categorias[1:] != categorias[:-1])
+    codigos = np.cumsum(novo_grupo) - 1
+    nomes = categorias[novo_grupo]
+    gastos = saques & (nomes != '')[codigos] & (dias < len(mes_do_dia))
+    volatilidade = _volatilidade(mes_do_dia[dias[gastos]], codigos[gastos], totais[gastos], nomes.tolist(), meses - 1)
+
+    return {
+        'inicio': inicio.isoformat(),
+        'fim': hoje.isoformat(),
+        'saldo_atual': db_manager._de_centavos(saldo_atual),
+        'entradas': (entradas / 100).tolist(),
+        'saidas': (saidas / 100).tolist(),
+        'saldo': (saldos / 100).tolist(),
+        'media_entradas': (media_entradas / 100).tolist(),
+        'media_saidas': (media_saidas / 100).tolist(),
+        'medias': {'entradas': _reais(media_entradas[-1]), 'saidas': _reais(media_saidas[-1]),
+                   'liquido': _reais(media_entradas[-1] - media_saidas[-1])},
+        'meses': meses_resultado,
+        'volatilidade': volatilidade,
+        'previsao': _previsao(saldos, janela_tendencia, dias_previsao),
+    }
+
+
+@db_manager._em_cache
+def obter_fluxo_caixa(usuario_id, meses=12, janela=JANELA_MEDIA, dias_previsao=DIAS_PREVISAO,
+                      janela_tendencia=JANELA_TENDENCIA):
+    """Estatísticas do fluxo de caixa dos últimos `meses` meses (incluindo o atual) e previsão do saldo.
+
+    Devolve um dicionário com 'inicio' e 'fim' ('AAAA-MM-DD'), 'saldo_atual', as séries
+    diárias 'entradas', 'saidas', 'saldo', 'media_entradas' e 'media_saidas', 'medias'
+    (médias diárias na última janela), 'meses', 'volatilidade' e 'previsao'; None em
+    caso de erro.
+    """
+    if meses < 1 or janela < 1:
+        raise ValueError("meses e janela devem ser positivos")
+    conn = db_manager.obter_conexao()
+    if conn is None: return db_manager._leitura_falhou(None)
+    hoje = date.today()
+    ano, mes = divmod(hoje.year * 12 + hoje.month - 1 - (meses - 1), 12)
+    inicio = date(ano, mes + 1, 1)
+    try:
+        db_manager._iniciar_com_arquivos(conn, inicio=inicio.isoformat())  # linhas e saldo do mesmo instantâneo
+        fonte = db_manager._fonte_transacoes(conn, inicio.isoformat())
+        linhas = _ler_linhas(conn, usuario_id, inicio.isoformat(), fonte)
+        saldo = conn.execute("SELECT saldo FROM usuarios WHERE id = ?", (usuario_id,)).fetchone()
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"Erro ao obter o fluxo de caixa: {e}")
+        conn.rollback()
+        return db_manager._leitura_falhou(None)
+    return _calcular(linhas, saldo[0] if saldo else 0, inicio, hoje, meses, janela, dias_previsao, janela_tendencia)
+
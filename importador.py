@@ -0,0 +1,213 @@
+"""Importação de extratos bancários (CSV e OFX) para o FinancialManager.
+
+Os ficheiros são lidos linha a linha e cada transação válida segue diretamente para
+db_manager.registrar_transacoes_em_lote, pelo que a memória usada não depende do
+tamanho do extrato. Transações repetidas (no próprio ficheiro ou já importadas antes)
+são descartadas pela base de dados através do id_externo de cada linha. Num CSV sem
+coluna id, o id_externo vem do conteúdo da linha e do número da repetição: linhas
+iguais seguidas (ex.: dois cafés iguais no mesmo dia) são transações distintas.
+
+Uso:
+    python importador.py extrato.csv --email utilizador@exemplo.com
+    python importador.py extrato.ofx --email utilizador@exemplo.com
+"""
+import argparse
+import csv
+import hashlib
+import re
+import sys
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+import db_manager
+
+CATEGORIA_PADRAO_SAQUE = "Outros"
+MAX_ERROS_GUARDADOS = 20
+
+FORMATOS_DATA = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+                 '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y')
+
+_REGEX_TAG_OFX = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+class _Estatisticas:
+    """Contadores de uma importação; guarda apenas os primeiros erros encontrados."""
+
+    def __init__(self):
+        self.lidas = 0
+        self.invalidas = 0
+        self.erros = []
+
+    def registar_erro(self, linha, mensagem):
+        self.invalidas += 1
+        if len(self.erros) < MAX_ERROS_GUARDADOS:
+            self.erros.append(f"linha {linha}: {mensagem}")
+
+
+def converter_valor(texto):
+    """Converte '1.234,56', '1,234.56', '-50.00' ou 'R$ 10,00' num Decimal exato."""
+    limpo = texto.strip().replace("R$", "").replace(" ", "")
+    if "," in limpo and limpo.rfind(",") > limpo.rfind("."):
+        limpo = limpo.replace(".", "").replace(",", ".")
+    else:
+        limpo = limpo.replace(",", "")
+    try:
+        valor = Decimal(limpo)
+    except InvalidOperation:
+        raise ValueError(f"valor inválido: {texto!r}") from None
+    if not valor.is_finite():
+        raise ValueError(f"valor inválido: {texto!r}")
+    return valor
+
+
+def converter_data(texto):
+    texto = texto.strip()
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            continue
+    raise ValueError(f"data inválida: {texto!r}")
+
+
+def _converter_data_ofx(texto):
+    """Converte DTPOSTED (AAAAMMDD[HHMMSS[.XXX]][[-3:BRT]]) num datetime."""
+    digitos = re.match(r"\d+", texto.strip())
+    if not digitos or len(digitos.group()) < 8:
+        raise ValueError(f"data inválida: {texto!r}")
+    numeros = digitos.group()
+    return datetime.strptime(numeros[:14].ljust(14, "0"), '%Y%m%d%H%M%S')
+
+
+def _montar_transacao(usuario_id, data, valor, tipo, categoria, id_externo):
+    if tipo is None:
+        tipo = 'deposito' if valor >= 0 else 'saque'
+    if tipo not in ('deposito', 'saque'):
+        raise ValueError(f"tipo inválido: {tipo!r}")
+    valor = abs(valor)
+    if valor == 0:
+        raise ValueError("valor nulo")
+    if tipo == 'saque' and not categoria:
+        categoria = CATEGORIA_PADRAO_SAQUE
+    return {
+        'usuario_id': usuario_id,
+        'tipo': tipo,
+        'valor': valor,
+        'categoria': categoria or None,
+        'data_transacao': data,
+        'id_externo': id_externo,
+    }
+
+
+def _ler_csv(caminho, usuario_id, estatisticas, delimitador, encoding):
+    """Gera as transações válidas de um CSV com colunas data, valor e, opcionalmente,
+    tipo, categoria, descricao e id."""
+    anterior, repeticao = None, 0  # conteúdo da linha anterior sem id e quantas vezes se repetiu seguida
+    with open(caminho, newline="", encoding=encoding) as ficheiro:
+        leitor = csv.DictReader(ficheiro, delimiter=delimitador)
+        leitor.fieldnames = [nome.strip().lower() for nome in (leitor.fieldnames or [])]
+        for registo in leitor:
+            estatisticas.lidas += 1
+            try:
+                data = converter_data(registo.get('data') or "")
+                valor = converter_valor(registo.get('valor') or "")
+                tipo = (registo.get('tipo') or "").strip().lower() or None
+                categoria = (registo.get('categoria') or "").strip() or None
+                if registo.get('id'):
+                    id_externo = "csv:" + registo['id'].strip()
+                else:
+                    # repr(float) mantém os ids iguais aos de importações feitas antes dos valores em Decimal.
+                    conteudo = "|".join((data.isoformat(), repr(float(valor)), tipo or "", categoria or "",
+                                         (registo.get('descricao') or "").strip()))
+                    repeticao = repeticao + 1 if conteudo == anterior else 0
+                    anterior = conteudo
+                    # A primeira ocorrência fica sem número, como nas importações anteriores.
+                    chave = f"{conteudo}|#{repeticao}" if repeticao else conteudo
+                    id_externo = "csv:" + hashlib.sha1(chave.encode("utf-8")).hexdigest()
+                yield _montar_transacao(usuario_id, data, valor, tipo, categoria, id_externo)
+            except ValueError as e:
+                estatisticas.registar_erro(leitor.line_num, e)
+
+
+def _ler_ofx(caminho, usuario_id, estatisticas, encoding):
+    """Gera as transações válidas dos blocos <STMTTRN> de um extrato OFX (SGML ou XML)."""
+    campos = None
+    with open(caminho, encoding=encoding, errors="replace") as ficheiro:
+        for numero_linha, linha in enumerate(ficheiro, start=1):
+            for fecho, tag, valor in _REGEX_TAG_OFX.findall(linha):
+                tag = tag.upper()
+                if tag == 'STMTTRN' and not fecho:
+                    campos = {}
+                elif tag == 'STMTTRN' and fecho and campos is not None:
+                    estatisticas.lidas += 1
+                    try:
+                        if 'FITID' not in campos:
+                            raise ValueError("transação sem FITID")
+                        data = _converter_data_ofx(campos.get('DTPOSTED', ""))
+                        valor = converter_valor(campos.get('TRNAMT', ""))
+                        yield _montar_transacao(usuario_id, data, valor, None, None, "ofx:" + campos['FITID'])
+                    except ValueError as e:
+                        estatisticas.registar_erro(numero_linha, e)
+                    campos = None
+                elif campos is not None and not fecho and valor.strip():
+                    campos[tag] = valor.strip()
+
+
+def _importar(transacoes, estatisticas):
+    resultado = db_manager.registrar_transacoes_em_lote(transacoes)
+    if not resultado['sucesso']:
+        return {'sucesso': False, 'mensagem': resultado['mensagem']}
+    return {
+        'sucesso': True,
+        'lidas': estatisticas.lidas,
+        'inseridas': resultado['inseridas'],
+        'duplicadas': resultado['ignoradas'],
+        'invalidas': estatisticas.invalidas,
+        'erros': estatisticas.erros,
+    }
+
+
+def importar_csv(caminho, usuario_id, delimitador=",", encoding="utf-8-sig"):
+    """Importa um extrato CSV numa única transação. Devolve um dicionário de contadores."""
+    estatisticas = _Estatisticas()
+    return _importar(_ler_csv(caminho, usuario_id, estatisticas, delimitador, encoding), estatisticas)
+
+
+def importar_ofx(caminho, usuario_id, encoding="latin-1"):
+    """Importa um extrato OFX numa única transação. Devolve um dicionário de contadores."""
+    estatisticas = _Estatisticas()
+    return _importar(_ler_ofx(caminho, usuario_id, estatisticas, encoding), estatisticas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa um extrato CSV ou OFX para o FinancialManager.")
+    parser.add_argument("ficheiro", help="caminho do extrato (.csv ou .ofx)")
+    parser.add_argument("--email", required=True, help="email do utilizador que recebe as transações")
+    parser.add_argument("--db", default=db_manager.DB_FILE, help="caminho do ficheiro SQLite")
+    parser.add_argument("--delimitador", default=",", help="separador de colunas do CSV")
+    args = parser.parse_args(argv)
+
+    db_manager.DB_FILE = args.db
+    db_manager.inicializar_banco()
+    usuario = db_manager.buscar_usuario_por_email(args.email)
+    if not usuario:
+        print(f"Utilizador não encontrado: {args.email}")
+        return 1
+
+    if args.ficheiro.lower().endswith(".ofx"):
+        resultado = importar_ofx(args.ficheiro, usuario['id'])
+    else:
+        resultado = importar_csv(args.ficheiro, usuario['id'], args.delimitador)
+
+    if not resultado['sucesso']:
+        print(f"Importação cancelada: {resultado['mensagem']}")
+        return 1
+    print(f"Lidas: {resultado['lidas']}  Inseridas: {resultado['inseridas']}  "
+          f"Duplicadas: {resultado['duplicadas']}  Inválidas: {resultado['invalidas']}")
+    for erro in resultado['erros']:
+        print(f"  {erro}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
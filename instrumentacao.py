@@ -0,0 +1,211 @@
+"""Instrumentação opcional do db_manager: tempos por função, instruções SQL e consultas lentas.
+
+Desligada por omissão e sem qualquer custo enquanto desligada. ativar() substitui cada
+função pública do db_manager por uma versão que conta chamadas, tempo e linhas
+devolvidas, e liga o trace callback do sqlite3 em todas as conexões para registar cada
+instrução executada. O tempo de uma instrução vai do seu início até ao início da
+instrução seguinte (ou ao fim da função), pelo que inclui a leitura das linhas. As
+instruções acima de `limite_ms` são gravadas, com o EXPLAIN QUERY PLAN, num ficheiro de
+log rotativo. desativar() repõe as funções originais.
+
+Uso:
+    import instrumentacao
+    instrumentacao.ativar(limite_ms=50)
+    ...
+    instrumentacao.despejar_estatisticas("estatisticas_db.json")
+
+Na aplicação: FM_INSTRUMENTAR=1 python app.py
+"""
+import copy
+import functools
+import json
+import logging
+import logging.handlers
+import re
+import sqlite3
+import threading
+import time
+
+import db_manager
+
+LIMITE_LENTA_MS = 50
+FICHEIRO_LOG = "consultas_lentas.log"
+TAMANHO_MAX_LOG = 1_000_000  # bytes por ficheiro antes de rodar
+COPIAS_LOG = 3
+# Funções de infraestrutura que não faz sentido medir.
+NAO_INSTRUMENTADAS = {'criar_conexao', 'obter_conexao', 'fechar_conexoes', 'definir_rastreio_sql',
+                      'estatisticas_cache', 'limpar_cache_resultados'}
+INSTRUCOES_COM_PLANO = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_REGEX_LITERAIS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+_log = logging.getLogger("financial_manager.consultas_lentas")
+_lock = threading.Lock()
+_local = threading.local()
+_originais = {}
+_handler = None
+_limite_ms = LIMITE_LENTA_MS
+_funcoes = {}
+_instrucoes = {}
+
+
+def ativa():
+    return bool(_originais)
+
+
+def _pilha():
+    pilha = getattr(_local, 'pilha', None)
+    if pilha is None:
+        pilha = _local.pilha = []
+    return pilha
+
+
+def _normalizar(instrucao):
+    """Substitui os literais por '?' para agrupar execuções da mesma instrução."""
+    return " ".join(_REGEX_LITERAIS.sub("?", instrucao).split())
+
+
+def _linhas(resultado):
+    if isinstance(resultado, list):
+        return len(resultado)
+    if isinstance(resultado, dict) and isinstance(resultado.get('transacoes'), list):
+        return len(resultado['transacoes'])
+    return 0 if resultado is None else 1
+
+
+def _rastrear(instrucao):
+    """Trace callback do sqlite3: regista o início de cada instrução na chamada em curso."""
+    if getattr(_local, 'a_explicar', False) or instrucao.startswith("--"):
+        return
+    pilha = _pilha()
+    if pilha:
+        pilha[-1].append((time.perf_counter(), instrucao))
+    else:
+        _acumular_instrucoes("(fora do db_manager)", [(instrucao, 0.0)])
+
+
+def _plano(instrucao):
+    if not instrucao.lstrip().upper().startswith(INSTRUCOES_COM_PLANO):
+        return []
+    conn = db_manager.obter_conexao()
+    if conn is None: return []
+    _local.a_explicar = True
+    try:
+        return [linha['detail'] for linha in conn.execute("EXPLAIN QUERY PLAN " + instrucao)]
+    except sqlite3.Error as e:
+        return [f"(sem plano: {e})"]
+    finally:
+        _local.a_explicar = False
+
+
+def _acumular_instrucoes(funcao, medidas):
+    with _lock:
+        for instrucao, duracao_ms in medidas:
+            estatistica = _instrucoes.setdefault(_normalizar(instrucao), {
+                'execucoes': 0, 'tempo_total_ms': 0.0, 'tempo_max_ms': 0.0, 'funcoes': []})
+            estatistica['execucoes'] += 1
+            estatistica['tempo_total_ms'] += duracao_ms
+            estatistica['tempo_max_ms'] = max(estatistica['tempo_max_ms'], duracao_ms)
+            if funcao not in estatistica['funcoes']:
+                estatistica['funcoes'].append(funcao)
+
+
+def _concluir_chamada(nome, instrucoes, inicio, fim, resultado):
+    duracao_ms = (fim - inicio) * 1000
+    medidas = [(instrucao, ((instrucoes[i + 1][0] if i + 1 < len(instrucoes) else fim) - momento) * 1000)
+               for i, (momento, instrucao) in enumerate(instrucoes)]
+    with _lock:
+        estatistica = _funcoes.setdefault(nome, {'chamadas': 0, 'tempo_total_ms': 0.0, 'tempo_max_ms': 0.0, 'linhas': 0})
+        estatistica['chamadas'] += 1
+        estatistica['tempo_total_ms'] += duracao_ms
+        estatistica['tempo_max_ms'] = max(estatistica['tempo_max_ms'], duracao_ms)
+        estatistica['linhas'] += _linhas(resultado)
+    _acumular_instrucoes(nome, medidas)
+    for instrucao, duracao_instrucao_ms in medidas:
+        if duracao_instrucao_ms >= _limite_ms:
+            plano = "\n".join(f"    {detalhe}" for detalhe in _plano(instrucao))
+            _log.warning("%s: %.1f ms (função %.1f ms)\n  %s\n%s", nome, duracao_instrucao_ms, duracao_ms, instrucao, plano)
+
+
+def _instrumentar(nome, funcao):
+    @functools.wraps(funcao)
+    def medida(*args, **kwargs):
+        pilha = _pilha()
+        instrucoes = []
+        pilha.append(instrucoes)
+        resultado = None
+        inicio = time.perf_counter()
+        try:
+            resultado = funcao(*args, **kwargs)
+            return resultado
+        finally:
+            fim = time.perf_counter()
+            pilha.pop()
+            _concluir_chamada(nome, instrucoes, inicio, fim, resultado)
+    return medida
+
+
+def ativar(limite_ms=LIMITE_LENTA_MS, ficheiro_log=FICHEIRO_LOG):
+    """Liga a instrumentação. Instruções com `limite_ms` ou mais vão para `ficheiro_log`."""
+    global _handler, _limite_ms
+    if ativa():
+        return
+    _limite_ms = limite_ms
+    _handler = logging.handlers.RotatingFileHandler(ficheiro_log, maxBytes=TAMANHO_MAX_LOG,
+                                                    backupCount=COPIAS_LOG, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    _log.addHandler(_handler)
+    _log.setLevel(logging.WARNING)
+    _log.propagate = False
+    for nome, valor in list(vars(db_manager).items()):
+        if (callable(valor) and not nome.startswith('_') and nome not in NAO_INSTRUMENTADAS
+                and getattr(valor, '__module__', None) == db_manager.__name__):
+            _originais[nome] = valor
+            setattr(db_manager, nome, _instrumentar(nome, valor))
+    db_manager.definir_rastreio_sql(_rastrear)
+
+
+def desativar():
+    """Desliga a instrumentação e repõe as funções originais; as estatísticas mantêm-se."""
+    global _handler
+    db_manager.definir_rastreio_sql(None)
+    for nome, funcao in _originais.items():
+        setattr(db_manager, nome, funcao)
+    _originais.clear()
+    if _handler is not None:
+        _log.removeHandler(_handler)
+        _handler.close()
+        _handler = None
+
+
+def estatisticas():
+    """Cópia das estatísticas acumuladas: {'funcoes': {...}, 'instrucoes': {...}}, por tempo total."""
+    with _lock:
+        funcoes = copy.deepcopy(_funcoes)
+        instrucoes = copy.deepcopy(_instrucoes)
+    por_tempo = lambda item: -item[1]['tempo_total_ms']
+    return {
+        'funcoes': dict(sorted(funcoes.items(), key=por_tempo)),
+        'instrucoes': dict(sorted(instrucoes.items(), key=por_tempo)),
+    }
+
+
+def repor_estatisticas():
+    with _lock:
+        _funcoes.clear()
+        _instrucoes.clear()
+
+
+def despejar_estatisticas(caminho=None):
+    """Grava as estatísticas em JSON em `caminho`, ou imprime um resumo se caminho for None."""
+    dados = estatisticas()
+    if caminho is not None:
+        with open(caminho, "w", encoding="utf-8") as ficheiro:
+            json.dump(dados, ficheiro, indent=2, ensure_ascii=False)
+        return
+    print(f"{'função':<34} {'chamadas':>9} {'total ms':>10} {'máx ms':>9} {'linhas':>9}")
+    for nome, e in dados['funcoes'].items():
+        print(f"{nome:<34} {e['chamadas']:>9} {e['tempo_total_ms']:>10.1f} {e['tempo_max_ms']:>9.1f} {e['linhas']:>9}")
+    print(f"\n{'execuções':>9} {'total ms':>10} {'máx ms':>9}  instrução")
+    for instrucao, e in list(dados['instrucoes'].items())[:20]:
+        print(f"{e['execucoes']:>9} {e['tempo_total_ms']:>10.1f} {e['tempo_max_ms']:>9.1f}  {instrucao[:100]}")
@@ -0,0 +1,195 @@
+"""Tarefas de manutenção da base de dados do FinancialManager.
+
+Uso:
+    python manutencao.py verificar-planos
+    python manutencao.py reconstruir-resumo [--usuario ID]
+    python manutencao.py verificar-resumo [--usuario ID]
+    python manutencao.py migrar-centavos [--lote N]
+    python manutencao.py atualizar-checkpoints [--usuario ID] [--intervalo N]
+    python manutencao.py verificar-saldos [--usuario ID]
+    python manutencao.py arquivar [--dias N] [--lote N] [--compactar]
+    python manutencao.py snapshot-colunar [--pasta P] [--reconstruir]
+    python manutencao.py transportar-orcamentos --ano A [--mes M] [--usuario ID] [--ajuste P] [--substituir]
+    python manutencao.py lancar-recorrentes [--usuario ID] [--ate AAAA-MM-DD]
+"""
+import argparse
+import sys
+
+import db_manager
+
+
+def comando_verificar_planos(args):
+    problemas = db_manager.verificar_planos_consulta()
+    if problemas is None:
+        print("Não foi possível ligar à base de dados.")
+        return 1
+    if not problemas:
+        print("Todas as consultas usam índices.")
+        return 0
+    for nome, plano in problemas.items():
+        print(f"{nome}:")
+        for detalhe in plano:
+            print(f"    {detalhe}")
+    return 1
+
+
+def comando_reconstruir_resumo(args):
+    if not db_manager.reconstruir_resumo_mensal(args.usuario):
+        return 1
+    print("Resumo mensal reconstruído.")
+    return 0
+
+
+def comando_verificar_resumo(args):
+    divergencias = db_manager.verificar_resumo_mensal(args.usuario)
+    if divergencias is None:
+        return 1
+    if not divergencias:
+        print("Resumo mensal consistente com as transações.")
+        return 0
+    for d in divergencias:
+        print(f"utilizador {d['usuario_id']} {d['ano']}-{d['mes']:02d} {d['tipo']} '{d['categoria']}': "
+              f"esperado {d['esperado']}, registado {d['registado']}")
+    print(f"{len(divergencias)} divergência(s). Corrija com: python manutencao.py reconstruir-resumo")
+    return 1
+
+
+def comando_migrar_centavos(args):
+    if db_manager.dinheiro_em_centavos():
+        print("A base de dados já guarda os valores em centavos.")
+        return 0
+
+    def progresso(copiadas, total):
+        print(f"\r  {copiadas}/{total} transações copiadas", end="", flush=True)
+
+    sucesso = db_manager.migrar_para_centavos(args.lote, progresso)
+    print()
+    if not sucesso:
+        return 1
+    db_manager.inicializar_banco()
+    print("Migração para centavos concluída.")
+    return 0
+
+
+def comando_atualizar_checkpoints(args):
+    criados = db_manager.atualizar_checkpoints_saldo(args.usuario, args.intervalo)
+    if criados is None:
+        return 1
+    print(f"{criados} checkpoint(s) de saldo criados.")
+    return 0
+
+
+def comando_verificar_saldos(args):
+    divergencias = db_manager.verificar_saldos(args.usuario)
+    if divergencias is None:
+        return 1
+    if not divergencias:
+        print("Saldos consistentes com as transações.")
+        return 0
+    for d in divergencias:
+        print(f"utilizador {d['usuario_id']}: registado {d['registado']}, calculado {d['calculado']} "
+              f"({d['linhas_lidas']} transações depois do último checkpoint)")
+    print(f"{len(divergencias)} divergência(s).")
+    return 1
+
+
+def comando_arquivar(args):
+    def progresso(movidas):
+        print(f"\r  {movidas} transações arquivadas", end="", flush=True)
+
+    movidas = db_manager.arquivar_transacoes(args.dias, args.lote, progresso)
+    print()
+    if movidas is None:
+        return 1
+    print(f"{movidas} transação(ões) com mais de {args.dias} dias movidas para os ficheiros de arquivo.")
+    if args.compactar and movidas:
+        if not db_manager.compactar_banco():
+            return 1
+        print("Base de dados compactada.")
+    return 0
+
+
+def comando_snapshot_colunar(args):
+    import snapshot_colunar  # importa o NumPy: só aqui, para não atrasar os outros comandos
+
+    resultado = snapshot_colunar.atualizar_snapshot(args.pasta, args.reconstruir)
+    if resultado is None:
+        return 1
+    acao = "reconstruído" if resultado['reconstruido'] else "atualizado"
+    print(f"Snapshot colunar {acao}: {resultado['novas']} transação(ões) novas, {resultado['linhas']} no total.")
+    return 0
+
+
+def comando_transportar_orcamentos(args):
+    escritos = db_manager.transportar_orcamentos(args.ano, args.mes, args.usuario, args.ajuste, args.substituir)
+    if escritos is None:
+        return 1
+    origem = f"{args.mes:02d}/{args.ano}" if args.mes else str(args.ano)
+    print(f"{escritos} orçamento(s) de {origem} transportados para o período seguinte.")
+    return 0
+
+
+def comando_lancar_recorrentes(args):
+    resultado = db_manager.materializar_transacoes_recorrentes(args.usuario, args.ate)
+    if not resultado['sucesso']:
+        return 1
+    print(f"{resultado['inseridas']} ocorrência(s) lançada(s) de {resultado['recorrencias']} transação(ões) recorrente(s)"
+          f" ({resultado['ignoradas']} já lançada(s)).")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutenção da base de dados do FinancialManager.")
+    parser.add_argument("--db", default=db_manager.DB_FILE, help="caminho do ficheiro SQLite")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    subparsers.add_parser("verificar-planos", help="falha se alguma consulta fizer um varrimento completo de tabela")
+    for nome, ajuda in (("reconstruir-resumo", "recalcula o resumo mensal a partir das transações"),
+                        ("verificar-resumo", "compara o resumo mensal com as transações")):
+        sub = subparsers.add_parser(nome, help=ajuda)
+        sub.add_argument("--usuario", type=int, default=None, help="limita a um utilizador (id)")
+    sub = subparsers.add_parser("migrar-centavos", help="converte os valores REAL em centavos, por lotes, com a aplicação a correr")
+    sub.add_argument("--lote", type=int, default=5000, help="transações copiadas por transação curta")
+    sub = subparsers.add_parser("atualizar-checkpoints", help="acrescenta checkpoints de saldo depois do último de cada utilizador")
+    sub.add_argument("--usuario", type=int, default=None, help="limita a um utilizador (id)")
+    sub.add_argument("--intervalo", type=int, default=db_manager.INTERVALO_CHECKPOINT, help="transações entre checkpoints")
+    sub = subparsers.add_parser("verificar-saldos", help="confere os saldos com o último checkpoint e as transações posteriores")
+    sub.add_argument("--usuario", type=int, default=None, help="limita a um utilizador (id)")
+    sub = subparsers.add_parser("arquivar", help="move as transações antigas para um ficheiro SQLite por ano")
+    sub.add_argument("--dias", type=int, default=db_manager.ARQUIVAR_APOS_DIAS, help="arquiva as transações com mais destes dias")
+    sub.add_argument("--lote", type=int, default=5000, help="transações movidas por transação curta")
+    sub.add_argument("--compactar", action="store_true", help="no fim, executa VACUUM para reduzir o ficheiro principal")
+    sub = subparsers.add_parser("snapshot-colunar", help="exporta as transações novas para o snapshot colunar (NumPy)")
+    sub.add_argument("--pasta", default=None, help="pasta do snapshot (por omissão, ao lado da base de dados)")
+    sub.add_argument("--reconstruir", action="store_true", help="exporta tudo de novo")
+    sub = subparsers.add_parser("transportar-orcamentos", help="copia os orçamentos de um mês (ou ano) para o seguinte")
+    sub.add_argument("--ano", type=int, required=True)
+    sub.add_argument("--mes", type=int, default=None, help="sem --mes, transporta o ano inteiro para o ano seguinte")
+    sub.add_argument("--usuario", type=int, default=None, help="limita a um utilizador (id)")
+    sub.add_argument("--ajuste", default="0", help="ajuste percentual dos valores (ex.: 5 ou -10)")
+    sub.add_argument("--substituir", action="store_true", help="substitui os orçamentos que já existam no destino")
+    sub = subparsers.add_parser("lancar-recorrentes", help="lança as ocorrências vencidas das transações recorrentes")
+    sub.add_argument("--usuario", type=int, default=None, help="limita a um utilizador (id)")
+    sub.add_argument("--ate", default=None, help="lança as ocorrências até esta data, inclusive (por omissão, hoje)")
+
+    args = parser.parse_args(argv)
+    db_manager.DB_FILE = args.db
+    if args.comando != "migrar-centavos":  # inicializar_banco migraria de uma só vez, sem progresso
+        db_manager.inicializar_banco()
+    comandos = {
+        "verificar-planos": comando_verificar_planos,
+        "reconstruir-resumo": comando_reconstruir_resumo,
+        "verificar-resumo": comando_verificar_resumo,
+        "migrar-centavos": comando_migrar_centavos,
+        "atualizar-checkpoints": comando_atualizar_checkpoints,
+        "verificar-saldos": comando_verificar_saldos,
+        "arquivar": comando_arquivar,
+        "snapshot-colunar": comando_snapshot_colunar,
+        "transportar-orcamentos": comando_transportar_orcamentos,
+        "lancar-recorrentes": comando_lancar_recorrentes,
+    }
+    return comandos[args.comando](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
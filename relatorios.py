@@ -0,0 +1,195 @@
+"""Relatórios mensais de gastos por categoria, sem interface gráfica.
+
+Para cada utilizador gera um gráfico (PNG e/ou PDF, desenhado com o backend Agg do
+matplotlib) e uma tabela CSV dos gastos do mês. Os dados vêm de
+db_manager.obter_gastos_por_categoria, que percorre uma única vez o intervalo do índice
+com os saques do utilizador nesse mês. Os utilizadores são processados em paralelo por
+um conjunto de processos.
+
+GraficoCategorias é partilhada com a janela de relatório da aplicação.
+
+Uso:
+    python relatorios.py [--mes 2025-09] [--pasta relatorios] [--formatos png,pdf,csv] [--processos 4] [--email X]
+"""
+import argparse
+import calendar
+import csv
+import os
+import sys
+from datetime import date
+
+import db_manager
+
+CORES_PADRAO = {'fundo': "#1e1e2f", 'eixos': "#2e2e3f", 'texto': "#ffffff", 'barras': "#00b894"}
+FORMATOS = ('png', 'pdf', 'csv')
+TITULO = 'Gastos Totais por Categoria'
+
+
+class GraficoCategorias:
+    """Gráfico de barras horizontais dos gastos por categoria, criado uma vez e atualizado no lugar.
+
+    Eixos, estilo, barras e rótulos persistem entre atualizações: atualizar() só muda
+    larguras, textos, visibilidade e limites, sem recriar artistas nem recalcular o layout.
+    """
+
+    def __init__(self, fig, cores=CORES_PADRAO, titulo=TITULO):
+        self.fig = fig
+        self.cores = cores
+        self.ax = ax = fig.add_subplot(111)
+        ax.set_facecolor(cores['eixos'])
+        ax.spines['bottom'].set_color(cores['texto']); ax.spines['top'].set_color(cores['eixos'])
+        ax.spines['right'].set_color(cores['eixos']); ax.spines['left'].set_color(cores['texto'])
+        ax.set_xlabel('Valor Gasto (R$)', color=cores['texto'], fontsize=12)
+        ax.grid(axis='x', color='gray', linestyle='--', linewidth=0.5, alpha=0.5)
+        ax.set_axisbelow(True)
+        ax.set_title(titulo, color=cores['texto'], fontsize=16, pad=20)
+        fig.subplots_adjust(left=0.25, right=0.95, top=0.85, bottom=0.1)
+        self.sem_dados = ax.text(0.5, 0.5, "Sem dados para o período selecionado.", transform=ax.transAxes,
+                                 color=cores['texto'], ha='center', va='center', fontsize=14, visible=False)
+        self.barras = []
+        self.rotulos = []
+
+    def _garantir_barras(self, quantidade):
+        while len(self.barras) < quantidade:
+            posicao = len(self.barras)
+            self.barras.append(self.ax.barh(posicao, 0, color=self.cores['barras'], height=0.6)[0])
+            self.rotulos.append(self.ax.text(0, posicao, "", va='center', ha='left',
+                                             color=self.cores['texto'], fontweight='bold'))
+
+    def atualizar(self, dados_categorias):
+        """Mostra os totais de `dados_categorias` (linhas com 'categoria' e 'total'). Não redesenha o canvas."""
+        labels = [item['categoria'] for item in dados_categorias]
+        sizes = [float(item['total']) for item in dados_categorias]
+        labels.reverse(); sizes.reverse()
+        self._garantir_barras(len(sizes))
+        for posicao, (barra, rotulo) in enumerate(zip(self.barras, self.rotulos)):
+            visivel = posicao < len(sizes)
+            barra.set_visible(visivel); rotulo.set_visible(visivel)
+            if visivel:
+                barra.set_width(sizes[posicao])
+                rotulo.set_position((sizes[posicao], posicao))
+                rotulo.set_text(f" R$ {sizes[posicao]:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
+
+        cor_eixos = self.cores['texto'] if sizes else self.cores['eixos']
+        self.ax.tick_params(axis='x', colors=cor_eixos); self.ax.tick_params(axis='y', colors=cor_eixos)
+        self.sem_dados.set_visible(not sizes)
+        self.ax.set_yticks(range(len(labels)), labels)
+        self.ax.set_ylim(-0.5, max(len(labels), 1) - 0.5)
+        # Margem à direita para os rótulos de valor caberem dentro dos eixos.
+        self.ax.set_xlim(0, max(sizes) * 1.3 if sizes else 1)
+
+
+def escrever_csv(caminho, dados_categorias):
+    """Grava a tabela categoria/total/percentagem; os totais são escritos com valor exato."""
+    total_geral = sum(item['total'] for item in dados_categorias)
+    with open(caminho, "w", newline="", encoding="utf-8") as ficheiro:
+        escritor = csv.writer(ficheiro)
+        escritor.writerow(["categoria", "total", "percentagem"])
+        for item in dados_categorias:
+            escritor.writerow([item['categoria'], item['total'], f"{item['total'] * 100 / total_geral:.1f}"])
+
+
+def _mes_anterior(hoje=None):
+    hoje = hoje or date.today()
+    return (hoje.year - 1, 12) if hoje.month == 1 else (hoje.year, hoje.month - 1)
+
+
+def _gerar_relatorio_usuario(usuario, ano, mes, pasta, formatos):
+    """Gera os ficheiros de um utilizador. Corre num processo do conjunto."""
+    ultimo_dia = calendar.monthrange(ano, mes)[1]
+    dados = db_manager.obter_gastos_por_categoria(usuario['id'], date(ano, mes, 1), date(ano, mes, ultimo_dia))
+    base = os.path.join(pasta, f"utilizador_{usuario['id']}")
+    ficheiros = []
+    if 'csv' in formatos:
+        escrever_csv(base + ".csv", dados)
+        ficheiros.append(base + ".csv")
+    imagens = [formato for formato in formatos if formato != 'csv']
+    if imagens:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        fig = Figure(figsize=(8, 6), dpi=100, facecolor=CORES_PADRAO['fundo'])
+        FigureCanvasAgg(fig)
+        GraficoCategorias(fig, titulo=f"{TITULO} — {mes:02d}/{ano}\n{usuario['email']}").atualizar(dados)
+        for formato in imagens:
+            fig.savefig(f"{base}.{formato}", format=formato, facecolor=fig.get_facecolor())
+            ficheiros.append(f"{base}.{formato}")
+    return ficheiros
+
+
+def _iniciar_processo(db_file):
+    db_manager.DB_FILE = db_file
+
+
+def gerar_relatorios(ano, mes, pasta, formatos=('png', 'csv'), processos=None, usuarios=None):
+    """Gera os relatórios de `ano`/`mes` em `pasta`/AAAA-MM para todos os utilizadores (ou os indicados).
+
+    Devolve {'gerados': [(usuario_id, [ficheiros])], 'erros': [(usuario_id, mensagem)]}.
+    Com processos=1 tudo corre no processo atual.
+    """
+    pasta_mes = os.path.join(pasta, f"{ano:04d}-{mes:02d}")
+    os.makedirs(pasta_mes, exist_ok=True)
+    usuarios = usuarios if usuarios is not None else db_manager.listar_usuarios()
+    resultado = {'gerados': [], 'erros': []}
+
+    if processos == 1:
+        for usuario in usuarios:
+            try:
+                resultado['gerados'].append((usuario['id'], _gerar_relatorio_usuario(usuario, ano, mes, pasta_mes, formatos)))
+            except Exception as e:
+                resultado['erros'].append((usuario['id'], str(e)))
+        return resultado
+
+    # Importados só aqui: a aplicação importa este módulo e não precisa deles no arranque.
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    # "spawn" para que nenhum processo herde as conexões SQLite abertas neste.
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto,
+                             initializer=_iniciar_processo, initargs=(db_manager.DB_FILE,)) as conjunto:
+        futuros = {conjunto.submit(_gerar_relatorio_usuario, dict(usuario), ano, mes, pasta_mes, formatos): usuario['id']
+                   for usuario in usuarios}
+        for futuro in as_completed(futuros):
+            try:
+                resultado['gerados'].append((futuros[futuro], futuro.result()))
+            except Exception as e:
+                resultado['erros'].append((futuros[futuro], str(e)))
+    return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera os relatórios mensais de gastos de todos os utilizadores.")
+    parser.add_argument("--db", default=db_manager.DB_FILE, help="caminho do ficheiro SQLite")
+    parser.add_argument("--mes", default=None, help="mês do relatório (AAAA-MM); por omissão, o mês anterior")
+    parser.add_argument("--pasta", default="relatorios", help="pasta de destino")
+    parser.add_argument("--formatos", default="png,csv", help=f"separados por vírgulas: {', '.join(FORMATOS)}")
+    parser.add_argument("--processos", type=int, default=None, help="processos em paralelo (por omissão, um por CPU)")
+    parser.add_argument("--email", default=None, help="gera apenas o relatório deste utilizador")
+    args = parser.parse_args(argv)
+
+    formatos = tuple(formato.strip().lower() for formato in args.formatos.split(","))
+    invalidos = [formato for formato in formatos if formato not in FORMATOS]
+    if invalidos:
+        print(f"Formato desconhecido: {', '.join(invalidos)}")
+        return 1
+    ano, mes = map(int, args.mes.split("-")) if args.mes else _mes_anterior()
+
+    db_manager.DB_FILE = args.db
+    db_manager.inicializar_banco()
+    usuarios = None
+    if args.email:
+        usuario = db_manager.buscar_usuario_por_email(args.email)
+        if not usuario:
+            print(f"Utilizador não encontrado: {args.email}")
+            return 1
+        usuarios = [{'id': usuario['id'], 'email': usuario['email']}]
+
+    resultado = gerar_relatorios(ano, mes, args.pasta, formatos, args.processos, usuarios)
+    print(f"Relatórios de {mes:02d}/{ano}: {len(resultado['gerados'])} gerados, {len(resultado['erros'])} com erro.")
+    for usuario_id, erro in resultado['erros']:
+        print(f"  utilizador {usuario_id}: {erro}")
+    return 1 if resultado['erros'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
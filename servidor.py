@@ -0,0 +1,302 @@
+"""Servidor de API local: as operações do db_manager em JSON sobre HTTP, para vários clientes.
+
+Em vez de cada instância da aplicação abrir financial_manager.db, um único processo
+serve todas (ver cliente_api.ClienteAPI e FM_SERVIDOR em app.py). As leituras correm
+num conjunto limitado de threads, cada uma com a sua conexão persistente do db_manager;
+as escritas correm todas numa única thread escritora, pela ordem de chegada, e nunca
+disputam o bloqueio de escrita do SQLite. A cache de resultados e versao_dados passam a
+ser partilhadas por todos os clientes.
+
+Cada ligação aceita pedidos em pipeline (enviados sem esperar pelas respostas): são
+tratados em simultâneo, até `max_pendentes` por ligação, e as respostas saem pela ordem
+dos pedidos. Uma leitura espera pelas escritas anteriores da mesma ligação, para ver o
+que elas escreveram.
+
+Protocolo: POST /<operação> com {"args": [...], "kwargs": {...}} (ver cliente_api);
+GET /operacoes lista as operações disponíveis. Só iniciar_sessao e cadastrar_usuario
+dispensam sessão: iniciar_sessao confere a senha no servidor e devolve um token, que os
+pedidos seguintes enviam em "Authorization: Bearer <token>". O utilizador de cada
+operação (usuario_id, ou id_remetente numa transferência) vem sempre da sessão; um
+pedido que indique outro é recusado. O hash da senha nunca sai do servidor. Por
+omissão, o servidor só escuta em 127.0.0.1.
+
+Uso:
+    python servidor.py [--db financial_manager.db] [--host 127.0.0.1] [--porta 8765] [--unix CAMINHO]
+                       [--leitores 4] [--max-pendentes 64]
+"""
+import argparse
+import asyncio
+import functools
+import hmac
+import inspect
+import json
+import os
+import secrets
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import db_manager
+import fluxo_caixa
+from cliente_api import OPERACOES_ESCRITA, OPERACOES_LEITURA, codificar, descodificar
+
+MODULOS_OPERACOES = {"obter_fluxo_caixa": fluxo_caixa}  # as restantes operações vêm do db_manager
+OPERACOES_PUBLICAS = frozenset({"iniciar_sessao", "cadastrar_usuario"})  # as únicas sem sessão
+# Parâmetro que recebe o utilizador da sessão, quando não se chama usuario_id.
+PARAMETRO_UTILIZADOR = {"registrar_transferencia": "id_remetente"}
+MAX_CORPO = 16 * 1024 * 1024
+MAX_CABECALHOS = 100
+MOTIVOS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class _PedidoInvalido(Exception):
+    def __init__(self, estado, mensagem):
+        super().__init__(mensagem)
+        self.estado = estado
+
+
+def _resposta(estado, conteudo, manter=True):
+    """Bytes de uma resposta HTTP/1.1 com `conteudo` em JSON."""
+    corpo = json.dumps(conteudo, ensure_ascii=False).encode("utf-8")
+    fechar = "" if manter else "Connection: close\r\n"
+    cabecalho = (f"HTTP/1.1 {estado} {MOTIVOS[estado]}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                 f"Content-Length: {len(corpo)}\r\n{fechar}\r\n")
+    return cabecalho.encode("latin-1") + corpo
+
+
+def _cadastrar_usuario(email, senha_hash):
+    """'criado', 'existente' (email já registado) ou 'erro'."""
+    if db_manager.buscar_usuario_por_email(email):
+        return 'existente'
+    return 'criado' if db_manager.adicionar_usuario(email, senha_hash) else 'erro'
+
+
+def _registrar_transacoes_em_lote(usuario_id, transacoes):
+    """db_manager.registrar_transacoes_em_lote, só com transações do utilizador da sessão."""
+    if any(t.get('usuario_id', usuario_id) != usuario_id for t in transacoes):
+        raise PermissionError("As transações só podem ser do utilizador da sessão.")
+    return db_manager.registrar_transacoes_em_lote([{**t, 'usuario_id': usuario_id} for t in transacoes])
+
+
+FUNCOES_SERVIDOR = {"cadastrar_usuario": _cadastrar_usuario, "registrar_transacoes_em_lote": _registrar_transacoes_em_lote}
+
+
+def _funcao(nome):
+    return FUNCOES_SERVIDOR.get(nome) or getattr(MODULOS_OPERACOES.get(nome, db_manager), nome)
+
+
+_assinatura = functools.lru_cache(maxsize=None)(inspect.signature)
+
+
+def _fixar_utilizador(funcao, parametro, usuario_id, args, kwargs):
+    """Os argumentos com `parametro` igual ao utilizador da sessão; PermissionError se o pedido indicar outro."""
+    argumentos = _assinatura(funcao).bind_partial(*args, **kwargs)
+    indicado = argumentos.arguments.get(parametro)
+    if indicado is not None and indicado != usuario_id:
+        raise PermissionError("A operação só pode ser feita sobre o utilizador da sessão.")
+    argumentos.arguments[parametro] = usuario_id
+    return argumentos.args, argumentos.kwargs
+
+
+def _executar(funcao, corpo, manter, usuario_id=None, parametro=None):
+    """Corre numa thread do servidor: descodifica os argumentos, chama a função e codifica a resposta.
+
+    Com `parametro`, esse argumento da função passa a ser `usuario_id`, o utilizador da sessão.
+    """
+    try:
+        pedido = json.loads(corpo or b"{}")
+        args, kwargs = descodificar(pedido.get("args", [])), descodificar(pedido.get("kwargs", {}))
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise ValueError("'args' deve ser uma lista e 'kwargs' um objeto")
+    except (ValueError, AttributeError) as e:
+        return _resposta(400, {"erro": f"Pedido inválido: {e}", "tipo": "ValueError"}, manter)
+    try:
+        if parametro is not None:
+            args, kwargs = _fixar_utilizador(funcao, parametro, usuario_id, args, kwargs)
+        return _resposta(200, {"resultado": codificar(funcao(*args, **kwargs))}, manter)
+    except PermissionError as e:
+        return _resposta(403, {"erro": str(e), "tipo": "PermissionError"}, manter)
+    except (ValueError, TypeError) as e:
+        return _resposta(400, {"erro": str(e), "tipo": type(e).__name__}, manter)
+    except Exception as e:
+        print(f"Erro em {funcao.__name__}: {e!r}")
+        return _resposta(500, {"erro": str(e), "tipo": type(e).__name__}, manter)
+
+
+async def _ler_pedido(leitor):
+    """(método, caminho, corpo, manter a ligação, token da sessão) do próximo pedido, ou None no fim da ligação."""
+    linha = await leitor.readline()
+    if not linha:
+        return None
+    partes = linha.decode("latin-1").split()
+    if len(partes) != 3 or not partes[2].startswith("HTTP/1."):
+        raise _PedidoInvalido(400, "Linha de pedido inválida.")
+    metodo, caminho, versao = partes
+    cabecalhos = {}
+    while True:
+        linha = await leitor.readline()
+        if linha in (b"\r\n", b"\n", b""):
+            break
+        nome, _, valor = linha.decode("latin-1").partition(":")
+        cabecalhos[nome.strip().lower()] = valor.strip()
+        if len(cabecalhos) > MAX_CABECALHOS:
+            raise _PedidoInvalido(400, "Demasiados cabeçalhos.")
+    try:
+        tamanho = int(cabecalhos.get("content-length", 0))
+    except ValueError:
+        raise _PedidoInvalido(400, "Content-Length inválido.") from None
+    if tamanho > MAX_CORPO:
+        raise _PedidoInvalido(413, "Pedido demasiado grande.")
+    corpo = await leitor.readexactly(tamanho) if tamanho > 0 else b""
+    ligacao = cabecalhos.get("connection", "").lower()
+    manter = ligacao != "close" if versao == "HTTP/1.1" else ligacao == "keep-alive"
+    esquema, _, token = cabecalhos.get("authorization", "").partition(" ")
+    return metodo, caminho, corpo, manter, token.strip() if esquema.lower() == "bearer" else None
+
+
+class ServidorAPI:
+    """Trata as ligações: leituras num conjunto de `leitores` threads, escritas numa só thread."""
+
+    def __init__(self, leitores=4, max_pendentes=64):
+        self.max_pendentes = max_pendentes
+        self._leitura = ThreadPoolExecutor(leitores, thread_name_prefix="api-leitura")
+        self._escrita = ThreadPoolExecutor(1, thread_name_prefix="api-escrita")
+        self._sessoes = {}  # token -> usuario_id; as sessões terminam com encerrar_sessao ou ao reiniciar
+        self._lock_sessoes = threading.Lock()
+
+    def iniciar_sessao(self, email, senha_hash):
+        """Corre numa thread de leitura: confere a senha e devolve {'token', 'usuario': {'id', 'email'}}, ou None."""
+        usuario = db_manager.buscar_usuario_por_email(email)
+        if usuario is None or not hmac.compare_digest(usuario['senha_hash'], str(senha_hash)):
+            return None
+        token = secrets.token_urlsafe(32)
+        with self._lock_sessoes:
+            self._sessoes[token] = usuario['id']
+        return {'token': token, 'usuario': {'id': usuario['id'], 'email': usuario['email']}}
+
+    async def tratar_ligacao(self, leitor, escritor):
+        respostas = asyncio.Queue(self.max_pendentes)
+        envio = asyncio.create_task(self._enviar(respostas, escritor))
+        ultima_escrita = None
+        try:
+            while True:
+                try:
+                    pedido = await _ler_pedido(leitor)
+                except _PedidoInvalido as e:
+                    resposta = asyncio.get_running_loop().create_future()
+                    resposta.set_result(_resposta(e.estado, {"erro": str(e)}, manter=False))
+                    await respostas.put(resposta)
+                    break
+                if pedido is None:
+                    break
+                metodo, caminho, corpo, manter, token = pedido
+                tarefa = asyncio.ensure_future(self._responder(metodo, caminho, corpo, manter, token, ultima_escrita))
+                if caminho.lstrip("/") in OPERACOES_ESCRITA:
+                    ultima_escrita = tarefa
+                await respostas.put(tarefa)  # com max_pendentes respostas por enviar, deixa de ler pedidos
+                if not manter:
+                    break
+        except (asyncio.IncompleteReadError, ValueError, ConnectionError):
+            pass  # ligação cortada a meio de um pedido, ou linha maior do que o limite do leitor
+        finally:
+            await respostas.put(None)
+            await envio
+            escritor.close()
+
+    async def _responder(self, metodo, caminho, corpo, manter, token, depois_de):
+        nome = caminho.lstrip("/")
+        if metodo == "GET" and nome == "operacoes":
+            return _resposta(200, {"leitura": sorted(OPERACOES_LEITURA), "escrita": sorted(OPERACOES_ESCRITA)}, manter)
+        if nome not in OPERACOES_LEITURA and nome not in OPERACOES_ESCRITA:
+            return _resposta(404, {"erro": f"Operação desconhecida: {nome}"}, manter)
+        if metodo != "POST":
+            return _resposta(405, {"erro": "Use POST."}, manter)
+        usuario_id, parametro = None, None
+        if nome == "iniciar_sessao":
+            funcao = self.iniciar_sessao
+        elif nome in OPERACOES_PUBLICAS:
+            funcao = _funcao(nome)
+        else:
+            with self._lock_sessoes:
+                usuario_id = self._sessoes.get(token) if token else None
+                if nome == "encerrar_sessao" and usuario_id is not None:
+                    del self._sessoes[token]
+            if usuario_id is None:
+                return _resposta(401, {"erro": "Sessão inválida ou terminada: inicie sessão.", "tipo": "PermissionError"}, manter)
+            if nome == "encerrar_sessao":
+                return _resposta(200, {"resultado": True}, manter)
+            funcao, parametro = _funcao(nome), PARAMETRO_UTILIZADOR.get(nome, "usuario_id")
+        if nome in OPERACOES_ESCRITA:
+            executor = self._escrita
+        else:
+            executor = self._leitura
+            if depois_de is not None:
+                await asyncio.wait([depois_de])
+        return await asyncio.get_running_loop().run_in_executor(executor, _executar, funcao, corpo, manter, usuario_id, parametro)
+
+    @staticmethod
+    async def _enviar(respostas, escritor):
+        """Escreve as respostas pela ordem dos pedidos; se o cliente desligar, descarta as restantes."""
+        ligado = True
+        while True:
+            tarefa = await respostas.get()
+            if tarefa is None:
+                return
+            dados = await tarefa
+            if not ligado:
+                continue
+            try:
+                escritor.write(dados)
+                if respostas.empty():  # junta as respostas já prontas numa só escrita no socket
+                    await escritor.drain()
+            except ConnectionError:
+                ligado = False
+
+    def encerrar(self):
+        """Espera pelas escritas em curso e fecha as conexões à base de dados."""
+        self._leitura.shutdown(wait=True, cancel_futures=True)
+        self._escrita.shutdown(wait=True)
+        db_manager.fechar_conexoes()
+
+
+async def servir(servidor, host="127.0.0.1", porta=8765, unix=None, pronto=None):
+    """Aceita ligações até ser cancelado; chama pronto(endereço) quando estiver à escuta."""
+    if unix:
+        if os.path.exists(unix) and stat.S_ISSOCK(os.stat(unix).st_mode):
+            os.remove(unix)  # socket de uma execução anterior
+        aceitador = await asyncio.start_unix_server(servidor.tratar_ligacao, path=unix)
+        endereco = f"unix:{unix}"
+    else:
+        aceitador = await asyncio.start_server(servidor.tratar_ligacao, host, porta)
+        endereco = f"http://{host}:{aceitador.sockets[0].getsockname()[1]}"
+    if pronto is not None:
+        pronto(endereco)
+    async with aceitador:
+        await aceitador.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=db_manager.DB_FILE, help="caminho do ficheiro SQLite")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765, help="0 escolhe uma porta livre")
+    parser.add_argument("--unix", default=None, help="escuta neste socket Unix em vez de TCP")
+    parser.add_argument("--leitores", type=int, default=4, help="threads (e conexões) de leitura")
+    parser.add_argument("--max-pendentes", type=int, default=64, help="pedidos em pipeline por ligação")
+    args = parser.parse_args(argv)
+
+    db_manager.DB_FILE = args.db
+    db_manager.inicializar_banco()
+    servidor = ServidorAPI(args.leitores, args.max_pendentes)
+    try:
+        asyncio.run(servir(servidor, args.host, args.porta, args.unix,
+                           pronto=lambda endereco: print(f"A servir {args.db} em {endereco}", flush=True)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.encerrar()
+
+
+if __name__ == "__main__":
+    main()
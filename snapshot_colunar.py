@@ -0,0 +1,354 @@
+"""Snapshot colunar (NumPy) das transações, para análises sobre vários anos sem tocar na base de dados.
+
+atualizar_snapshot exporta `transacoes` (incluindo os arquivos anuais) para um ficheiro
+binário por coluna, numa pasta ao lado da base de dados; cada atualização só lê as
+transações com id acima do último exportado e acrescenta-as ao fim dos ficheiros.
+SnapshotColunar abre os ficheiros com np.memmap, pelo que só as páginas das colunas
+usadas são lidas do disco, e responde às consultas com operações vetorizadas.
+
+Colunas, uma linha por transação, pela ordem do id:
+    id          int64
+    usuario_id  int32
+    momento     int64   segundos desde 1970-01-01 (data_transacao, sem fuso horário)
+    tipo        int8    posição em TIPOS
+    categoria   int16   posição em metadados['categorias']; SEM_CATEGORIA se não tiver
+    valor       int64   centavos
+
+metadados.json indica quantas linhas são válidas, o último id exportado e a geração dos
+ficheiros. Uma atualização escreve para além das linhas válidas e só no fim substitui os
+metadados, de forma atómica; só então os leitores que abram o snapshot veem as linhas
+novas. Uma reconstrução escreve uma geração nova de ficheiros, sem mexer nos que
+estejam mapeados por leitores.
+
+Editar ou excluir uma transação já exportada não muda o id máximo. Por isso, cada
+atualização compara os totais do snapshot por utilizador, tipo e categoria com o
+agregado mensal (`resumo_mensal`) e, se divergirem, reconstrói o snapshot.
+
+Uso:
+    snapshot_colunar.atualizar_snapshot()
+    snapshot = snapshot_colunar.abrir_snapshot()
+    snapshot.gastos_por_categoria(usuario_id=3, inicio='2024-01-01', fim='2024-12-31')
+    snapshot.totais_por_periodo('mes', usuario_id=3)
+"""
+import glob
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+import db_manager
+
+TIPOS = ('deposito', 'saque')
+COLUNAS = {
+    'id': np.int64,
+    'usuario_id': np.int32,
+    'momento': np.int64,
+    'tipo': np.int8,
+    'categoria': np.int16,
+    'valor': np.int64,
+}
+SEM_CATEGORIA = -1
+PERIODOS = {'dia': 'datetime64[D]', 'mes': 'datetime64[M]', 'ano': 'datetime64[Y]'}
+FICHEIRO_METADADOS = "metadados.json"
+VERSAO_FORMATO = 1
+LOTE_EXPORTACAO = 50000
+
+
+def pasta_padrao():
+    """Pasta do snapshot da base de dados atual, ao lado de DB_FILE."""
+    return os.path.splitext(os.path.abspath(db_manager.DB_FILE))[0] + "_colunar"
+
+
+def _caminho_coluna(pasta, coluna, geracao):
+    return os.path.join(pasta, f"{coluna}.{geracao}.bin")
+
+
+def _ler_metadados(pasta):
+    try:
+        with open(os.path.join(pasta, FICHEIRO_METADADOS), encoding="utf-8") as ficheiro:
+            metadados = json.load(ficheiro)
+    except FileNotFoundError:
+        return None
+    return metadados if metadados.get('versao') == VERSAO_FORMATO else None
+
+
+def _gravar_metadados(pasta, metadados):
+    temporario = os.path.join(pasta, FICHEIRO_METADADOS + ".tmp")
+    with open(temporario, "w", encoding="utf-8") as ficheiro:
+        json.dump(metadados, ficheiro, ensure_ascii=False)
+        ficheiro.flush()
+        os.fsync(ficheiro.fileno())
+    os.replace(temporario, os.path.join(pasta, FICHEIRO_METADADOS))
+
+
+def _segundos(texto):
+    """Texto de data ('AAAA-MM-DD[ HH:MM:SS[.ffffff]]') em segundos desde 1970-01-01."""
+    return int(np.datetime64(texto, 's').astype(np.int64))
+
+
+def _colunas_do_lote(linhas, categorias, codigos):
+    """Converte linhas (id, usuario_id, tipo, valor, categoria, data_transacao) nas colunas do snapshot.
+
+    As categorias ainda desconhecidas são acrescentadas a `categorias` e `codigos`.
+    """
+    ids, usuarios, tipos, valores, nomes, datas = zip(*linhas)
+    for nome in set(nomes):
+        if nome is not None and nome not in codigos:
+            codigos[nome] = len(categorias)
+            categorias.append(nome)
+    return {
+        'id': np.array(ids, dtype=np.int64),
+        'usuario_id': np.array(usuarios, dtype=np.int32),
+        'momento': np.array(datas, dtype='datetime64[us]').astype('datetime64[s]').astype(np.int64),
+        'tipo': (np.array(tipos) == TIPOS[1]).astype(np.int8),
+        'categoria': np.array([codigos.get(nome, SEM_CATEGORIA) for nome in nomes], dtype=np.int16),
+        'valor': np.array(valores, dtype=np.int64),
+    }
+
+
+def _exportar(conn, fonte, pasta, metadados, tamanho_lote):
+    """Acrescenta aos ficheiros da geração de `metadados` as transações com id acima de metadados['ultimo_id'].
+
+    Atualiza `metadados` sem os gravar e devolve o número de linhas acrescentadas.
+    """
+    ficheiros = {}
+    try:
+        for coluna, tipo in COLUNAS.items():
+            caminho = _caminho_coluna(pasta, coluna, metadados['geracao'])
+            ficheiro = open(caminho, "r+b" if os.path.exists(caminho) else "w+b")
+            ficheiros[coluna] = ficheiro
+            tamanho_valido = metadados['linhas'] * np.dtype(tipo).itemsize
+            if os.path.getsize(caminho) > tamanho_valido:
+                ficheiro.truncate(tamanho_valido)  # resto de uma atualização interrompida
+            ficheiro.seek(tamanho_valido)
+
+        codigos = {nome: codigo for codigo, nome in enumerate(metadados['categorias'])}
+        cursor = conn.cursor()
+        cursor.row_factory = None  # tuplas: evita criar um sqlite3.Row por transação
+        cursor.execute(f"SELECT id, usuario_id, tipo, valor, categoria, data_transacao FROM {fonte} WHERE id > ? ORDER BY id",
+                       (metadados['ultimo_id'],))
+        novas = 0
+        while True:
+            linhas = cursor.fetchmany(tamanho_lote)
+            if not linhas:
+                break
+            for coluna, valores in _colunas_do_lote(linhas, metadados['categorias'], codigos).items():
+                ficheiros[coluna].write(valores.tobytes())
+            novas += len(linhas)
+            metadados['ultimo_id'] = linhas[-1][0]
+        for ficheiro in ficheiros.values():
+            ficheiro.flush()
+            os.fsync(ficheiro.fileno())
+        metadados['linhas'] += novas
+        return novas
+    finally:
+        for ficheiro in ficheiros.values():
+            ficheiro.close()
+
+
+def _confere_com_resumo(conn, snapshot):
+    """True se o snapshot tiver as quantidades e totais de `resumo_mensal` por utilizador, tipo e categoria."""
+    esperado = {(linha[0], linha[1], linha[2]): (linha[3], linha[4]) for linha in conn.execute("""
+        SELECT usuario_id, tipo, categoria, SUM(total), SUM(quantidade) FROM resumo_mensal
+        GROUP BY usuario_id, tipo, categoria HAVING SUM(quantidade) > 0""")}
+    return snapshot._totais_de_controlo() == esperado
+
+
+def _apagar_geracoes_antigas(pasta, geracao):
+    for caminho in glob.glob(os.path.join(pasta, "*.bin")):
+        if not caminho.endswith(f".{geracao}.bin"):
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass  # ainda mapeado por um leitor (Windows); sai na próxima reconstrução
+
+
+def atualizar_snapshot(pasta=None, reconstruir=False, tamanho_lote=LOTE_EXPORTACAO):
+    """Acrescenta ao snapshot as transações com id acima do último exportado, ou reconstrói-o.
+
+    Tudo é lido num único instantâneo da base de dados. Devolve
+    {'novas', 'linhas', 'reconstruido'}, ou None em caso de erro.
+    """
+    pasta = pasta or pasta_padrao()
+    conn = db_manager.obter_conexao()
+    if conn is None: return None
+    try:
+        os.makedirs(pasta, exist_ok=True)
+        anterior = _ler_metadados(pasta)
+        db_manager._iniciar_com_arquivos(conn)
+        fonte = db_manager._fonte_transacoes(conn)
+        if anterior is not None and not reconstruir:
+            metadados = dict(anterior, categorias=list(anterior['categorias']))
+            novas = _exportar(conn, fonte, pasta, metadados, tamanho_lote)
+            if _confere_com_resumo(conn, SnapshotColunar(pasta, metadados)):
+                conn.commit()
+                _gravar_metadados(pasta, metadados)
+                return {'novas': novas, 'linhas': metadados['linhas'], 'reconstruido': False}
+
+        geracao = anterior['geracao'] + 1 if anterior else 1
+        metadados = {'versao': VERSAO_FORMATO, 'geracao': geracao, 'linhas': 0, 'ultimo_id': 0, 'categorias': []}
+        for coluna in COLUNAS:
+            if os.path.exists(_caminho_coluna(pasta, coluna, geracao)):
+                os.remove(_caminho_coluna(pasta, coluna, geracao))  # resto de uma reconstrução interrompida
+        novas = _exportar(conn, fonte, pasta, metadados, tamanho_lote)
+        conn.commit()
+        _gravar_metadados(pasta, metadados)
+        _apagar_geracoes_antigas(pasta, geracao)
+        return {'novas': novas, 'linhas': metadados['linhas'], 'reconstruido': True}
+    except (sqlite3.Error, OSError) as e:
+        print(f"Erro ao atualizar o snapshot colunar: {e}")
+        conn.rollback()
+        return None
+
+
+def abrir_snapshot(pasta=None):
+    """Abre o snapshot com as linhas válidas neste momento; None se ainda não existir."""
+    pasta = pasta or pasta_padrao()
+    metadados = _ler_metadados(pasta)
+    if metadados is None:
+        return None
+    return SnapshotColunar(pasta, metadados)
+
+
+def _agrupar(chaves):
+    """Como np.unique(chaves, return_inverse=True), mas sem ordenar quando as chaves ocupam um intervalo pequeno."""
+    if len(chaves) == 0:
+        return np.unique(chaves, return_inverse=True)
+    minimo = int(chaves.min())
+    amplitude = int(chaves.max()) - minimo + 1
+    if amplitude > 4 * len(chaves) + 1024:
+        return np.unique(chaves, return_inverse=True)
+    deslocadas = chaves - minimo
+    presentes = np.bincount(deslocadas, minlength=amplitude) > 0
+    return np.flatnonzero(presentes) + minimo, (np.cumsum(presentes) - 1)[deslocadas]
+
+
+def _periodos(momentos, periodo):
+    """Número do período ('dia', 'mes' ou 'ano') de cada momento, nas unidades de np.datetime64.
+
+    Converte cada dia distinto uma só vez (por tabela), em vez de fazer as contas de
+    calendário linha a linha.
+    """
+    dias = momentos // 86400
+    if periodo == 'dia' or len(dias) == 0:
+        return dias
+    primeiro = int(dias.min())
+    tabela = np.arange(primeiro, int(dias.max()) + 1).astype('datetime64[D]').astype(PERIODOS[periodo]).astype(np.int64)
+    return tabela[dias - primeiro]
+
+
+def _mapear(caminho, tipo, linhas):
+    if linhas == 0:
+        return np.empty(0, dtype=tipo)  # np.memmap não aceita ficheiros vazios
+    return np.memmap(caminho, dtype=tipo, mode='r', shape=(linhas,))
+
+
+class SnapshotColunar:
+    """Colunas do snapshot mapeadas em memória (só leitura) e consultas vetorizadas sobre elas.
+
+    Os totais são somados em float64 por np.bincount: são exatos enquanto cada total
+    ficar abaixo de 2**53 centavos.
+    """
+
+    def __init__(self, pasta, metadados):
+        self.pasta = pasta
+        self.linhas = metadados['linhas']
+        self.ultimo_id = metadados['ultimo_id']
+        self.categorias = list(metadados['categorias'])
+        for coluna, tipo in COLUNAS.items():
+            setattr(self, coluna, _mapear(_caminho_coluna(pasta, coluna, metadados['geracao']), tipo, self.linhas))
+
+    def _filtro(self, usuario_id=None, inicio=None, fim=None, tipo=None):
+        """Máscara das linhas do utilizador e do tipo, com data no intervalo de dias [inicio, fim]."""
+        mascara = np.ones(self.linhas, dtype=bool)
+        if usuario_id is not None:
+            mascara &= self.usuario_id == usuario_id
+        inicio, fim = db_manager._limites_data(inicio, fim)
+        if inicio:
+            mascara &= self.momento >= _segundos(inicio)
+        if fim:
+            mascara &= self.momento < _segundos(fim)
+        if tipo is not None:
+            mascara &= self.tipo == TIPOS.index(tipo)
+        return mascara
+
+    def _nome_categoria(self, codigo):
+        return None if codigo == SEM_CATEGORIA else self.categorias[codigo]
+
+    def gastos_por_categoria(self, usuario_id=None, inicio=None, fim=None):
+        """Como db_manager.obter_gastos_por_categoria, mas também para todos os utilizadores (usuario_id=None)."""
+        mascara = self._filtro(usuario_id, inicio, fim, 'saque') & (self.categoria != SEM_CATEGORIA)
+        totais = np.bincount(self.categoria[mascara], weights=self.valor[mascara], minlength=len(self.categorias))
+        gastos = [{'categoria': self.categorias[codigo], 'total': db_manager._de_centavos(round(total))}
+                  for codigo, total in enumerate(totais.tolist()) if total]
+        gastos.sort(key=lambda item: item['total'], reverse=True)
+        return gastos
+
+    def totais_por_periodo(self, periodo='mes', usuario_id=None, inicio=None, fim=None, tipo='saque', por_categoria=True):
+        """Total e quantidade por período ('dia', 'mes' ou 'ano') e, se `por_categoria`, por categoria.
+
+        Devolve [{'periodo', 'categoria', 'total', 'quantidade'}] por ordem de período; o
+        período vem como texto ('AAAA-MM-DD', 'AAAA-MM' ou 'AAAA') e a categoria é None
+        sem `por_categoria`. Com tipo=None entram depósitos e saques.
+        """
+        mascara = self._filtro(usuario_id, inicio, fim, tipo)
+        periodos = _periodos(self.momento[mascara], periodo)
+        categorias = self.categoria[mascara].astype(np.int64) if por_categoria else np.full(len(periodos), SEM_CATEGORIA)
+        chaves, grupos = _agrupar(periodos * (len(self.categorias) + 1) + (categorias + 1))
+        totais = np.bincount(grupos, weights=self.valor[mascara], minlength=len(chaves))
+        quantidades = np.bincount(grupos, minlength=len(chaves))
+        unidade = PERIODOS[periodo][len('datetime64['):-1]
+        resultado = []
+        for chave, total, quantidade in zip(chaves.tolist(), totais.tolist(), quantidades.tolist()):
+            codigo_periodo, codigo_categoria = divmod(chave, len(self.categorias) + 1)
+            resultado.append({
+                'periodo': str(np.datetime64(codigo_periodo, unidade)),
+                'categoria': self._nome_categoria(codigo_categoria - 1),
+                'total': db_manager._de_centavos(round(total)),
+                'quantidade': quantidade,
+            })
+        return resultado
+
+    def estatisticas_por_usuario(self, inicio=None, fim=None, tipo='saque'):
+        """Quantidade, total, média, mediana e máximo das transações de cada utilizador.
+
+        Devolve [{'usuario_id', 'quantidade', 'total', 'media', 'mediana', 'maximo'}] por ordem de utilizador.
+        """
+        mascara = self._filtro(None, inicio, fim, tipo)
+        valores = self.valor[mascara]
+        usuarios, grupos = _agrupar(self.usuario_id[mascara])
+        quantidades = np.bincount(grupos, minlength=len(usuarios))
+        totais = np.bincount(grupos, weights=valores, minlength=len(usuarios))
+        # Uma só ordenação por (utilizador, valor) dá a mediana e o máximo de cada grupo;
+        # ordenar o par como um único inteiro é várias vezes mais rápido do que np.lexsort.
+        if len(valores) and valores.min() >= 0 and valores.max() < 2 ** 40:
+            ordenados = np.sort((grupos.astype(np.int64) << 40) | valores) & (2 ** 40 - 1)
+        else:
+            ordenados = valores[np.lexsort((valores, grupos))]
+        inicios = np.cumsum(quantidades) - quantidades
+        medianas = (ordenados[inicios + (quantidades - 1) // 2] + ordenados[inicios + quantidades // 2]) / 2
+        maximos = ordenados[inicios + quantidades - 1]
+        return [{
+            'usuario_id': usuario_id,
+            'quantidade': quantidade,
+            'total': db_manager._de_centavos(round(total)),
+            'media': db_manager._de_centavos(round(total / quantidade)),
+            'mediana': db_manager._de_centavos(round(mediana)),
+            'maximo': db_manager._de_centavos(maximo),
+        } for usuario_id, quantidade, total, mediana, maximo
+            in zip(usuarios.tolist(), quantidades.tolist(), totais.tolist(), medianas.tolist(), maximos.tolist())]
+
+    def _totais_de_controlo(self):
+        """{(usuario_id, tipo, categoria): (total, quantidade)} de todas as linhas, agrupadas como em resumo_mensal."""
+        largura = len(self.categorias) + 1
+        chaves, grupos = _agrupar((self.usuario_id.astype(np.int64) * 2 + self.tipo) * largura + (self.categoria + 1))
+        totais = np.bincount(grupos, weights=self.valor, minlength=len(chaves))
+        quantidades = np.bincount(grupos, minlength=len(chaves))
+        controlo = {}
+        for chave, total, quantidade in zip(chaves.tolist(), totais.tolist(), quantidades.tolist()):
+            usuario_tipo, codigo_categoria = divmod(chave, largura)
+            usuario_id, tipo = divmod(usuario_tipo, 2)
+            categoria = self._nome_categoria(codigo_categoria - 1)
+            controlo[(usuario_id, TIPOS[tipo], '' if categoria is None else categoria)] = (round(total), quantidade)
+        return controlo
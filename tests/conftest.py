@@ -0,0 +1,75 @@
+"""Fixtures partilhadas: bases de dados temporárias para os testes do db_manager."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_manager  # noqa: E402
+from benchmarks import gerador  # noqa: E402
+
+
+def _usar_base(caminho):
+    db_manager.fechar_conexoes()
+    db_manager.DB_FILE = caminho
+
+
+@pytest.fixture
+def banco_vazio(tmp_path):
+    """Base de dados nova e vazia; devolve a conexão da thread do teste."""
+    original = db_manager.DB_FILE
+    _usar_base(str(tmp_path / "teste.db"))
+    db_manager.inicializar_banco()
+    yield db_manager.obter_conexao()
+    _usar_base(original)
+
+
+@pytest.fixture(scope="module")
+def banco_gerado(tmp_path_factory):
+    """Base de dados sintética (benchmarks.gerador) com recorrentes e estatísticas do ANALYZE, partilhada pelo módulo."""
+    original = db_manager.DB_FILE
+    caminho = str(tmp_path_factory.mktemp("dados") / "gerada.db")
+    _usar_base(caminho)
+    ids_usuarios = gerador.gerar_base(caminho, usuarios=20, transacoes_por_usuario=300)
+    for usuario_id in ids_usuarios:
+        for dia in range(1, 8):
+            db_manager.adicionar_transacao_recorrente(usuario_id, 'saque', 10, "Moradia", 'mensal', dia)
+    conn = db_manager.obter_conexao()
+    conn.execute("ANALYZE")
+    yield conn
+    _usar_base(original)
+
+
+@pytest.fixture
+def servidor_api(banco_vazio):
+    """Servidor de API (servidor.py) sobre a base vazia, numa porta livre; devolve o endereço."""
+    import asyncio
+    import threading
+
+    import servidor
+
+    api = servidor.ServidorAPI(leitores=2)
+    ciclo = asyncio.new_event_loop()
+    pronto, endereco, tarefa = threading.Event(), [], []
+
+    def correr():
+        tarefa.append(ciclo.create_task(servidor.servir(api, porta=0, pronto=lambda e: (endereco.append(e), pronto.set()))))
+        try:
+            ciclo.run_until_complete(tarefa[0])
+        except asyncio.CancelledError:
+            pass
+        ligacoes = asyncio.all_tasks(ciclo)  # ligações ainda abertas pelos clientes do teste
+        for ligacao in ligacoes:
+            ligacao.cancel()
+        if ligacoes:
+            ciclo.run_until_complete(asyncio.gather(*ligacoes, return_exceptions=True))
+
+    thread = threading.Thread(target=correr, daemon=True)
+    thread.start()
+    assert pronto.wait(5), "o servidor não arrancou"
+    yield endereco[0]
+    ciclo.call_soon_threadsafe(tarefa[0].cancel)
+    thread.join(5)
+    api.encerrar()
+    ciclo.close()
@@ -0,0 +1,33 @@
+"""marcar_alertas_vistos: só os alertas mostrados ficam vistos."""
+from datetime import date
+
+import cliente_api
+import db_manager
+
+
+def test_so_marca_os_alertas_mostrados(banco_vazio):
+    db_manager.adicionar_usuario("a@exemplo.com", "x")
+    hoje = date.today()
+    db_manager.definir_ou_atualizar_orcamento(1, "Lazer", 100, hoje.month, hoje.year)
+    db_manager.registrar_transacao(1, 'saque', 85, "Lazer")
+    mostrados = db_manager.obter_alertas_orcamento(1)
+    assert [alerta['limiar'] for alerta in mostrados] == [80]
+    # Registado depois de os alertas terem sido lidos: não foi mostrado.
+    db_manager.registrar_transacao(1, 'saque', 20, "Lazer")
+    assert db_manager.marcar_alertas_vistos(1, mostrados)
+    assert [alerta['limiar'] for alerta in db_manager.obter_alertas_orcamento(1)] == [100]
+    assert [alerta['limiar'] for alerta in db_manager.obter_alertas_orcamento(1, apenas_novos=False)] == [80, 100]
+
+
+def test_marca_pelo_servidor(servidor_api):
+    db_manager.adicionar_usuario("a@exemplo.com", "x")
+    hoje = date.today()
+    db_manager.definir_ou_atualizar_orcamento(1, "Lazer", 100, hoje.month, hoje.year)
+    db_manager.registrar_transacao(1, 'saque', 100, "Lazer")
+    cliente = cliente_api.ClienteAPI(servidor_api)
+    cliente.iniciar_sessao("a@exemplo.com", "x")
+    mostrados = cliente.obter_snapshot_dashboard(1)['alertas']
+    assert len(mostrados) == 2
+    assert cliente.marcar_alertas_vistos(1, mostrados[:1])
+    assert len(cliente.obter_alertas_orcamento(1)) == 1
+    cliente.fechar()
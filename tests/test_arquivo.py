@@ -0,0 +1,78 @@
+"""arquivar_transacoes: mais anos do que ficheiros anexáveis, e consultas que só anexam o que o intervalo pede."""
+import glob
+import os
+from datetime import date
+
+import db_manager
+
+PRIMEIRO_ANO, ULTIMO_ANO = 2010, 2025
+
+
+def _gerar(usuario_id):
+    """10 transações por mês de PRIMEIRO_ANO a ULTIMO_ANO (um checkpoint de saldo a cada 10 meses)."""
+    linhas = [{'usuario_id': usuario_id, 'tipo': 'deposito' if dia % 3 == 0 else 'saque',
+               'valor': f"{dia}.{mes:02d}", 'categoria': "Lazer", 'data_transacao': f"{ano}-{mes:02d}-{dia:02d} 12:00:00"}
+              for ano in range(PRIMEIRO_ANO, ULTIMO_ANO + 1) for mes in range(1, 13) for dia in range(1, 11)]
+    assert db_manager.registrar_transacoes_em_lote(linhas)['sucesso']
+    return len(linhas)
+
+
+def _arquivar_ate(ano):
+    """Arquiva as transações anteriores a 1 de janeiro de `ano`."""
+    return db_manager.arquivar_transacoes(dias=(date.today() - date(ano, 1, 1)).days)
+
+
+def _anexados():
+    return [linha['name'] for linha in db_manager.obter_conexao().execute("PRAGMA database_list")
+            if linha['name'].startswith("arquivo_")]
+
+
+def test_arquiva_mais_anos_do_que_ficheiros(banco_vazio):
+    db_manager.adicionar_usuario("a@exemplo.com", "x")
+    total = _gerar(1)
+    saldo = db_manager.obter_saldo(1)
+    gastos_2014 = db_manager.obter_gastos_por_categoria(1, "2014-01-01", "2014-12-31")
+    assert _arquivar_ate(2019) == 9 * 1200 // 10  # 2010-2018: um ficheiro por ano
+    assert _arquivar_ate(2024) == 5 * 1200 // 10  # 2019-2023: os anos mais antigos são fundidos
+    ficheiros = {linha['ficheiro'] for linha in banco_vazio.execute("SELECT ficheiro FROM arquivos")}
+    assert len(ficheiros) == db_manager.MAX_FICHEIROS_ARQUIVO
+    assert banco_vazio.execute("SELECT COUNT(*) FROM arquivos").fetchone()[0] == 14
+    pasta = os.path.dirname(db_manager.DB_FILE)
+    assert {os.path.basename(f) for f in glob.glob(os.path.join(pasta, "*_arquivo_*.db"))} == ficheiros
+    assert banco_vazio.execute("SELECT COUNT(*) FROM transacoes").fetchone()[0] == 2 * 120
+
+    historico = db_manager.obter_historico(1)
+    assert len(historico) == total
+    assert historico[0]['saldo_apos'] == saldo
+    assert db_manager.obter_gastos_por_categoria(1, "2014-01-01", "2014-12-31") == gastos_2014
+    assert db_manager.verificar_saldos() == []
+    assert db_manager.verificar_resumo_mensal() == []
+    # Anos mais antigos do que todos os arquivados juntam-se ao ficheiro mais antigo.
+    db_manager.registrar_transacoes_em_lote([{'usuario_id': 1, 'tipo': 'deposito', 'valor': 5, 'categoria': "Outros",
+                                              'data_transacao': "2005-06-01 12:00:00"}])
+    assert _arquivar_ate(2024) == 1
+    assert len({linha['ficheiro'] for linha in banco_vazio.execute("SELECT ficheiro FROM arquivos")}) == len(ficheiros)
+    assert len(db_manager.obter_historico(1)) == total + 1
+    assert db_manager.verificar_resumo_mensal() == []
+
+
+def test_intervalo_recente_nao_anexa_arquivos(banco_vazio):
+    db_manager.adicionar_usuario("a@exemplo.com", "x")
+    _gerar(1)
+    _arquivar_ate(2024)
+    assert db_manager.verificar_resumo_mensal() == []
+    assert len(_anexados()) == db_manager.MAX_FICHEIROS_ARQUIVO  # a conexão é persistente: ficam anexados
+
+    historico = db_manager.obter_historico(1, "2025-03-01", "2025-03-31")
+    assert _anexados() == []
+    assert len(historico) == 10
+    assert historico[0]['saldo_apos'] == db_manager.obter_saldo(1) - sum(
+        linha['valor'] if linha['tipo'] == 'deposito' else -linha['valor']
+        for linha in db_manager.obter_historico(1, "2025-04-01"))
+    assert db_manager.obter_gastos_por_categoria(1, "2024-01-01", "2025-12-31")
+    assert _anexados() == []
+
+    # Um intervalo que chega aos arquivos anexa só o ficheiro desse ano e o do checkpoint
+    # de saldo anterior (em 2022), de onde parte o saldo corrido.
+    assert len(db_manager.obter_historico(1, "2023-01-01", "2023-12-31")) == 120
+    assert sorted(_anexados()) == ["arquivo_teste_arquivo_2022", "arquivo_teste_arquivo_2023"]
@@ -0,0 +1,99 @@
+"""ClienteAPI: ligações estragadas são descartadas e só se repete o que é seguro repetir."""
+import time
+
+import pytest
+
+import cliente_api
+import db_manager
+
+
+def test_tempo_esgotado_descarta_a_ligacao(servidor_api, monkeypatch):
+    db_manager.adicionar_usuario("a@exemplo.com", "x")
+    original, chamadas = db_manager.obter_saldo, []
+
+    def obter_saldo_lento(usuario_id):
+        chamadas.append(usuario_id)
+        if len(chamadas) == 1:
+            time.sleep(0.5)  # só o primeiro pedido passa do tempo limite do cliente
+        return original(usuario_id)
+
+    monkeypatch.setattr(db_manager, "obter_saldo", obter_saldo_lento)
+    cliente = cliente_api.ClienteAPI(servidor_api, tempo_limite=0.2)
+    assert cliente.iniciar_sessao("a@exemplo.com", "x") == {"id": 1, "email": "a@exemplo.com"}
+    with pytest.raises(TimeoutError):
+        cliente.obter_saldo(1)
+    # Sem descartar a ligação, este pedido falharia com CannotSendRequest/ResponseNotReady.
+    assert cliente.obter_saldo(1) == 0
+    assert cliente.obter_saldo(1) == 0
+    cliente.fechar()
+
+
+class _Resposta:
+    status = 200
+
+    def read(self):
+        return b'{"resultado": true}'
+
+
+class _Ligacao:
+    """HTTPConnection falsa: cada pedido consome o próximo elemento de `passos` (resposta ou exceção)."""
+
+    def __init__(self, *passos, falha_no_envio=None):
+        self.passos = list(passos)
+        self.falha_no_envio = falha_no_envio
+        self.pedidos = 0
+
+    def request(self, metodo, caminho, corpo, cabecalhos):
+        self.pedidos += 1
+        if self.falha_no_envio is not None and self.pedidos == 2:
+            raise self.falha_no_envio
+
+    def getresponse(self):
+        passo = self.passos.pop(0)
+        if isinstance(passo, Exception):
+            raise passo
+        return passo
+
+    def close(self):
+        pass
+
+
+def _cliente(*ligacoes):
+    cliente = cliente_api.ClienteAPI("http://127.0.0.1:1")
+    fila = list(ligacoes)
+    cliente._nova_ligacao = lambda: fila.pop(0)
+    return cliente, fila
+
+
+def test_leitura_e_repetida_se_a_ligacao_cair():
+    cliente, fila = _cliente(_Ligacao(_Resposta(), ConnectionResetError()), _Ligacao(_Resposta()))
+    assert cliente.obter_saldo(1) is True
+    assert cliente.obter_saldo(1) is True
+    assert not fila
+
+
+def test_escrita_enviada_nao_e_repetida():
+    cliente, fila = _cliente(_Ligacao(_Resposta(), ConnectionResetError()), _Ligacao(_Resposta()))
+    assert cliente.registrar_transacao(1, 'deposito', 1) is True
+    with pytest.raises(ConnectionResetError):
+        cliente.registrar_transacao(1, 'deposito', 1)
+    assert len(fila) == 1  # não abriu uma ligação nova para repetir o depósito
+
+
+def test_escrita_que_nao_saiu_e_repetida():
+    cliente, fila = _cliente(_Ligacao(_Resposta(), falha_no_envio=BrokenPipeError()), _Ligacao(_Resposta()))
+    assert cliente.registrar_transacao(1, 'deposito', 1) is True
+    assert cliente.registrar_transacao(1, 'deposito', 1) is True
+    assert not fila
+
+
+def test_resposta_ilegivel_descarta_a_ligacao():
+    class _RespostaIlegivel(_Resposta):
+        def read(self):
+            return b"<html>"
+
+    cliente, fila = _cliente(_Ligacao(_RespostaIlegivel()), _Ligacao(_Resposta()))
+    with pytest.raises(ValueError):
+        cliente.obter_saldo(1)
+    assert cliente.obter_saldo(1) is True
+    assert not fila
@@ -0,0 +1,78 @@
+"""EscritorAgrupado: cada pedido aceite é confirmado, mesmo com encerrar a correr ao mesmo tempo."""
+import sqlite3
+import threading
+
+import pytest
+
+import db_manager
+from escrita_agrupada import EscritorAgrupado
+
+
+def test_pedidos_aceites_sao_confirmados(banco_vazio):
+    db_manager.adicionar_usuario("a@exemplo.com", "x")
+    escritor = EscritorAgrupado(sincronizacao="NORMAL")
+    futuros = [escritor.registrar_transacao(1, 'deposito', 1) for _ in range(50)]
+    escritor.encerrar()
+    assert all(futuro.result(timeout=5) for futuro in futuros)
+    assert db_manager.obter_saldo(1) == 50
+    with pytest.raises(RuntimeError):
+        escritor.registrar_transacao(1, 'deposito', 1)
+
+
+def test_valor_invalido_falha_so_o_seu_futuro(banco_vazio):
+    db_manager.adicionar_usuario("a@exemplo.com", "x")
+    escritor = EscritorAgrupado(sincronizacao="NORMAL")
+    invalido = escritor.registrar_transacao(1, 'deposito', -1)
+    valido = escritor.registrar_transacao(1, 'deposito', 2)
+    escritor.encerrar()
+    with pytest.raises(ValueError):
+        invalido.result(timeout=5)
+    assert valido.result(timeout=5) is True
+
+
+def test_encerrar_durante_registos(banco_vazio):
+    db_manager.adicionar_usuario("a@exemplo.com", "x")
+    escritor = EscritorAgrupado(sincronizacao="NORMAL")
+    aceites, recusados = [], []
+
+    def registar():
+        for _ in range(200):
+            try:
+                aceites.append(escritor.registrar_transacao(1, 'deposito', 1))
+            except RuntimeError:
+                recusados.append(1)
+
+    threads = [threading.Thread(target=registar) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    escritor.encerrar()
+    for thread in threads:
+        thread.join()
+    # Nenhum Future fica por resolver: ou foi confirmado, ou o pedido foi recusado.
+    assert all(futuro.result(timeout=5) for futuro in aceites)
+    assert len(aceites) + len(recusados) == 800
+    assert db_manager.obter_saldo(1) == len(aceites)
+
+
+def test_erro_inesperado_falha_o_lote_e_a_thread_continua(banco_vazio, monkeypatch):
+    db_manager.adicionar_usuario("a@exemplo.com", "x")
+    escritor = EscritorAgrupado(sincronizacao="NORMAL")
+    obter_conexao, inserir = escritor._obter_conexao, db_manager._inserir_transacao
+
+    def conexao_bloqueada():
+        raise sqlite3.OperationalError("database is locked")  # ex.: o PRAGMA synchronous de uma conexão nova
+
+    def inserir_com_erro(*args):
+        raise RuntimeError("erro inesperado")
+
+    monkeypatch.setattr(escritor, "_obter_conexao", conexao_bloqueada)
+    with pytest.raises(sqlite3.OperationalError):
+        escritor.registrar_transacao(1, 'deposito', 1).result(timeout=5)
+    monkeypatch.setattr(escritor, "_obter_conexao", obter_conexao)
+    monkeypatch.setattr(db_manager, "_inserir_transacao", inserir_com_erro)
+    with pytest.raises(RuntimeError):
+        escritor.registrar_transacao(1, 'deposito', 1).result(timeout=5)
+    monkeypatch.setattr(db_manager, "_inserir_transacao", inserir)
+    assert escritor.registrar_transacao(1, 'deposito', 2).result(timeout=5) is True
+    escritor.encerrar()
+    assert db_manager.obter_saldo(1) == 2
@@ -0,0 +1,29 @@
+"""importador: linhas iguais seguidas de um CSV sem id são transações distintas."""
+import db_manager
+import importador
+
+CSV = """data,valor,categoria,descricao
+2025-03-01,-4.50,Alimentação,Café
+2025-03-01,-4.50,Alimentação,Café
+2025-03-01,-4.50,Alimentação,Café
+2025-03-02,-4.50,Alimentação,Café
+2025-03-01,-4.50,Alimentação,Café
+"""
+
+
+def test_repeticoes_seguidas_nao_se_perdem(banco_vazio, tmp_path):
+    db_manager.adicionar_usuario("a@exemplo.com", "x")
+    caminho = tmp_path / "extrato.csv"
+    caminho.write_text(CSV, encoding="utf-8")
+    resultado = importador.importar_csv(str(caminho), 1)
+    # A última linha repete a primeira, mas não logo a seguir: conta como a mesma transação.
+    assert (resultado['inseridas'], resultado['duplicadas']) == (4, 1)
+    assert db_manager.obter_saldo(1) == -18
+    # Reimportar o mesmo extrato não acrescenta nada.
+    resultado = importador.importar_csv(str(caminho), 1)
+    assert (resultado['inseridas'], resultado['duplicadas']) == (0, 5)
+    # Um extrato com mais uma repetição só acrescenta essa.
+    linhas = CSV.splitlines(keepends=True)
+    caminho.write_text("".join(linhas[:4] + linhas[1:2] + linhas[4:]), encoding="utf-8")
+    resultado = importador.importar_csv(str(caminho), 1)
+    assert (resultado['inseridas'], resultado['duplicadas']) == (1, 5)
@@ -0,0 +1,24 @@
+"""registrar_transacoes_em_lote: só os id_externo repetidos são ignorados."""
+import db_manager
+
+
+def _linha(id_externo, **extra):
+    return {'usuario_id': 1, 'tipo': 'saque', 'valor': 10, 'categoria': "Lazer",
+            'data_transacao': "2025-01-15 10:00:00", 'id_externo': id_externo, **extra}
+
+
+def test_reimportacao_ignora_duplicados(banco_vazio):
+    db_manager.adicionar_usuario("a@exemplo.com", "x")
+    primeira = db_manager.registrar_transacoes_em_lote([_linha("A"), _linha("B"), _linha(None)])
+    segunda = db_manager.registrar_transacoes_em_lote([_linha("A"), _linha("B"), _linha("C"), _linha(None)])
+    assert (primeira['inseridas'], primeira['ignoradas']) == (3, 0)
+    assert (segunda['inseridas'], segunda['ignoradas']) == (2, 2)
+    assert db_manager.obter_saldo(1) == -50
+
+
+def test_violacao_de_restricao_falha_o_lote(banco_vazio):
+    db_manager.adicionar_usuario("a@exemplo.com", "x")
+    resultado = db_manager.registrar_transacoes_em_lote([_linha("A"), _linha("B", usuario_id=None)])
+    assert not resultado['sucesso']
+    assert "NOT NULL" in resultado['mensagem']
+    assert db_manager.obter_saldo(1) == 0
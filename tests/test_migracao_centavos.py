@@ -0,0 +1,112 @@
+"""migrar_para_centavos: uma base de dados com valores REAL passa a centavos sem perder um centavo."""
+import sqlite3
+from decimal import Decimal
+
+import db_manager
+
+# Esquema das versões com valores REAL.
+ESQUEMA_REAL = """
+    CREATE TABLE usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT NOT NULL UNIQUE,
+        senha_hash TEXT NOT NULL,
+        saldo REAL NOT NULL DEFAULT 0.00,
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE transacoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        tipo TEXT NOT NULL CHECK(tipo IN ('deposito', 'saque')),
+        valor REAL NOT NULL,
+        categoria TEXT,
+        data_transacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+    );
+    CREATE TABLE orcamentos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        categoria TEXT NOT NULL,
+        valor REAL NOT NULL,
+        mes INTEGER NOT NULL,
+        ano INTEGER NOT NULL,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE,
+        UNIQUE (usuario_id, categoria, mes, ano)
+    );
+"""
+# 0.1 + 0.2 e 0.29 * 100 não são exatos em vírgula flutuante.
+TRANSACOES = [('deposito', 0.1, None), ('deposito', 0.2, None), ('saque', 0.3, "Lazer"),
+              ('deposito', 10.1, None), ('saque', 1.15, "Lazer"), ('deposito', 19.99, None), ('saque', 0.29, "Lazer")]
+
+
+class _AppAntiga:
+    """Escreve como as versões com valores REAL: saldo acumulado em vírgula flutuante."""
+
+    def __init__(self, caminho):
+        self.conn = sqlite3.connect(caminho, isolation_level=None)
+
+    def registar(self, tipo, valor, categoria=None):
+        self.conn.execute("INSERT INTO transacoes (usuario_id, tipo, valor, categoria, data_transacao) "
+                          "VALUES (1, ?, ?, ?, '2025-01-10 12:00:00')", (tipo, valor, categoria))
+        self._ajustar_saldo(valor if tipo == 'deposito' else -valor)
+
+    def editar(self, transacao_id, novo_valor):
+        tipo, valor = self.conn.execute("SELECT tipo, valor FROM transacoes WHERE id = ?", (transacao_id,)).fetchone()
+        self.conn.execute("UPDATE transacoes SET valor = ? WHERE id = ?", (novo_valor, transacao_id))
+        self._ajustar_saldo((novo_valor - valor) * (1 if tipo == 'deposito' else -1))
+
+    def excluir(self, transacao_id):
+        tipo, valor = self.conn.execute("SELECT tipo, valor FROM transacoes WHERE id = ?", (transacao_id,)).fetchone()
+        self.conn.execute("DELETE FROM transacoes WHERE id = ?", (transacao_id,))
+        self._ajustar_saldo(-valor if tipo == 'deposito' else valor)
+
+    def _ajustar_saldo(self, variacao):
+        self.conn.execute("UPDATE usuarios SET saldo = saldo + ? WHERE id = 1", (variacao,))
+
+
+def _usar_base(caminho):
+    db_manager.fechar_conexoes()
+    db_manager.DB_FILE = caminho
+
+
+def test_migracao_com_escritas_a_meio(tmp_path):
+    original = db_manager.DB_FILE
+    caminho = str(tmp_path / "antiga.db")
+    app = _AppAntiga(caminho)
+    app.conn.executescript(ESQUEMA_REAL)
+    app.conn.execute("INSERT INTO usuarios (email, senha_hash) VALUES ('a@exemplo.com', 'x')")
+    for tipo, valor, categoria in TRANSACOES[:2]:
+        app.registar(tipo, valor, categoria)
+    assert app.conn.execute("SELECT saldo FROM usuarios").fetchone()[0] == 0.30000000000000004
+    for tipo, valor, categoria in TRANSACOES[2:]:
+        app.registar(tipo, valor, categoria)
+    app.conn.execute("INSERT INTO orcamentos (usuario_id, categoria, valor, mes, ano) VALUES (1, 'Lazer', 0.3, 1, 2025)")
+
+    def escritas_a_meio(copiadas, total):
+        if copiadas == 2:  # só as transações 1 e 2 estão na tabela nova
+            app.editar(1, 0.15)      # já copiada: repetida pelo gatilho de UPDATE
+            app.excluir(2)           # já copiada: apagada pelo gatilho de DELETE
+            app.editar(5, 1.1)       # ainda por copiar: o lote seguinte leva o valor novo
+            app.registar('deposito', 0.2)  # id novo: apanhada pelos lotes seguintes
+            app.conn.execute("UPDATE orcamentos SET valor = 0.35 WHERE id = 1")
+
+    try:
+        _usar_base(caminho)
+        assert not db_manager.dinheiro_em_centavos()
+        assert db_manager.migrar_para_centavos(tamanho_lote=2, progresso=escritas_a_meio)
+        db_manager.inicializar_banco()  # cria as tabelas novas e o agregado mensal a partir do histórico
+        conn = db_manager.obter_conexao()
+        assert db_manager.dinheiro_em_centavos()
+
+        assert [tuple(linha) for linha in conn.execute("SELECT id, valor FROM transacoes ORDER BY id")] == [
+            (1, 15), (3, 30), (4, 1010), (5, 110), (6, 1999), (7, 29), (8, 20)]
+        assert db_manager.obter_saldo(1) == Decimal("0.15") - Decimal("0.30") + Decimal("10.10") - Decimal("1.10") \
+            + Decimal("19.99") - Decimal("0.29") + Decimal("0.20")
+        assert conn.execute("SELECT saldo FROM usuarios").fetchone()[0] == 2875
+        assert conn.execute("SELECT valor FROM orcamentos").fetchone()[0] == 35
+        assert db_manager.obter_gastos_por_categoria(1, "2025-01-01", "2025-01-31")[0]['total'] == Decimal("1.69")
+        assert db_manager.verificar_saldos() == []
+        assert db_manager.verificar_resumo_mensal() == []
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '%centavos%'").fetchall() == []
+    finally:
+        app.conn.close()
+        _usar_base(original)
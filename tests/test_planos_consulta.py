@@ -0,0 +1,24 @@
+"""As consultas de leitura do db_manager usam os índices: nenhum plano percorre uma tabela inteira."""
+import pytest
+
+import db_manager
+
+CONSULTAS = db_manager._consultas_a_verificar()
+
+
+def _varrimentos(plano):
+    """Linhas do plano que percorrem uma tabela (um "SCAN (subquery-N)" percorre um resultado intermédio)."""
+    return [detalhe for detalhe in plano
+            if detalhe.startswith('SCAN ') and 'CONSTANT ROW' not in detalhe and not detalhe.startswith('SCAN (subquery')]
+
+
+@pytest.mark.parametrize("nome", sorted(CONSULTAS))
+def test_consulta_usa_indices(banco_gerado, nome):
+    query, params = CONSULTAS[nome]
+    plano = [linha['detail'] for linha in banco_gerado.execute("EXPLAIN QUERY PLAN " + query, params)]
+    assert not _varrimentos(plano), plano
+
+
+def test_verificar_planos_consulta_sem_problemas(banco_gerado):
+    assert db_manager.verificar_planos_consulta() == {}
+
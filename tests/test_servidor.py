@@ -0,0 +1,78 @@
+"""Servidor de API: a senha é conferida no servidor e cada operação fica no utilizador da sessão."""
+import inspect
+from decimal import Decimal
+
+import pytest
+
+import cliente_api
+import db_manager
+import servidor
+
+
+@pytest.fixture
+def clientes(servidor_api):
+    """Dois utilizadores com sessão iniciada, cada um com uma transação; devolve [(cliente, id, transacao_id)]."""
+    resultado = []
+    for email in ("a@exemplo.com", "b@exemplo.com"):
+        db_manager.adicionar_usuario(email, f"hash-{email}")
+        cliente = cliente_api.ClienteAPI(servidor_api)
+        usuario = cliente.iniciar_sessao(email, f"hash-{email}")
+        assert cliente.registrar_transacao(usuario["id"], "deposito", Decimal("10"), "Salário")
+        transacao_id = cliente.pesquisar_transacoes(usuario["id"])["transacoes"][0]["id"]
+        resultado.append((cliente, usuario["id"], transacao_id))
+    yield resultado
+    for cliente, _, _ in resultado:
+        cliente.fechar()
+
+
+def test_todas_as_operacoes_recebem_o_utilizador_da_sessao():
+    for nome in (cliente_api.OPERACOES_LEITURA | cliente_api.OPERACOES_ESCRITA) - servidor.OPERACOES_PUBLICAS:
+        if nome == "encerrar_sessao":
+            continue
+        parametro = servidor.PARAMETRO_UTILIZADOR.get(nome, "usuario_id")
+        assert parametro in inspect.signature(servidor._funcao(nome)).parameters, nome
+
+
+def test_login_no_servidor_sem_expor_a_senha(servidor_api):
+    cliente = cliente_api.ClienteAPI(servidor_api)
+    assert cliente.cadastrar_usuario("a@exemplo.com", "certa") == "criado"
+    assert cliente.cadastrar_usuario("a@exemplo.com", "outra") == "existente"
+    assert cliente.iniciar_sessao("a@exemplo.com", "errada") is None
+    assert cliente.iniciar_sessao("b@exemplo.com", "certa") is None
+    assert cliente.iniciar_sessao("a@exemplo.com", "certa") == {"id": 1, "email": "a@exemplo.com"}
+    with pytest.raises(cliente_api.ErroAPI):
+        cliente.buscar_usuario_por_email("a@exemplo.com")  # não é exposta: devolveria o hash da senha
+    cliente.fechar()
+
+
+def test_sem_sessao_recusa(servidor_api):
+    db_manager.adicionar_usuario("a@exemplo.com", "x")
+    cliente = cliente_api.ClienteAPI(servidor_api)
+    with pytest.raises(PermissionError):
+        cliente.obter_saldo(1)
+    cliente.iniciar_sessao("a@exemplo.com", "x")
+    assert cliente.obter_saldo(1) == 0
+    cliente.encerrar_sessao()
+    with pytest.raises(PermissionError):
+        cliente.obter_saldo(1)
+    cliente.fechar()
+
+
+def test_nao_opera_sobre_outro_utilizador(clientes):
+    (cliente_a, id_a, transacao_a), (_, id_b, transacao_b) = clientes
+    with pytest.raises(PermissionError):
+        cliente_a.obter_saldo(id_b)
+    with pytest.raises(PermissionError):
+        cliente_a.registrar_transacao(id_b, "saque", Decimal("1"), "Lazer")
+    with pytest.raises(PermissionError):
+        cliente_a.registrar_transacoes_em_lote([{"usuario_id": id_b, "tipo": "deposito", "valor": Decimal("1"),
+                                                 "categoria": "Outros"}])
+    # Sem indicar o utilizador, a operação fica no da sessão.
+    assert cliente_a.obter_saldo(usuario_id=None) == Decimal("10")
+    # Transações de outro utilizador não se leem, editam nem excluem, mesmo pelo id.
+    assert cliente_a.obter_transacao_por_id(transacao_b, id_a) is None
+    assert not cliente_a.editar_transacao(transacao_b, id_a, Decimal("5"), "Lazer")["sucesso"]
+    assert not cliente_a.excluir_transacao(transacao_b, id_a)
+    assert db_manager.obter_saldo(id_b) == Decimal("10")
+    assert cliente_a.excluir_transacao(transacao_a, id_a)
+    assert db_manager.obter_saldo(id_a) == 0